@@ -0,0 +1,381 @@
+import os
+import sys
+import glob
+import fnmatch
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from slide_ir import read_slides
+from marp_markdown import CSS_STYLES, slides_to_marp
+from marp_export import export_batch
+from text_input import list_archive_members, output_base
+from image_assets import ImageResolver
+import theme_registry
+import slide_index
+
+# 通配符中的特殊字符
+_GLOB_CHARS = frozenset('*?[')
+
+class FileResult:
+    """單個文件的轉換結果"""
+    __slots__ = ('input_file', 'outputs', 'error', 'elapsed', 'index_entry')
+
+    def __init__(self, input_file, outputs=(), error=None, elapsed=0.0, index_entry=None):
+        self.input_file = input_file
+        self.outputs = list(outputs)
+        self.error = error
+        self.elapsed = elapsed
+        self.index_entry = index_entry  # 需要更新索引時為 (內容哈希, slide_index.slide_records())
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        return {
+            'input_file': self.input_file,
+            'outputs': self.outputs,
+            'error': self.error,
+            'elapsed': round(self.elapsed, 6),
+        }
+
+class BatchReport:
+    """批量轉換的匯總報告"""
+
+    def __init__(self, results, elapsed, workers, export_elapsed=0.0, export_error=None, indexed=None):
+        self.results = results
+        self.elapsed = elapsed
+        self.workers = workers
+        self.export_elapsed = export_elapsed
+        self.export_error = export_error
+        self.indexed = indexed  # 寫入全文索引的文件數，沒有使用索引時為None
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def files_per_sec(self):
+        return len(self.results) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        """返回可讀的匯總文本"""
+        lines = [f"失敗: {r.input_file}: {r.error}" for r in self.failed]
+        if self.export_error:
+            lines.append(f"Marp導出失敗: {self.export_error}")
+        elif self.export_elapsed:
+            lines.append(f"Marp導出耗時 {self.export_elapsed:.2f} 秒")
+        if self.indexed is not None:
+            lines.append(f"全文索引更新 {self.indexed} 個文件，其餘 {len(self.succeeded) - self.indexed} 個未改變")
+        lines.append(
+            f"共 {len(self.results)} 個文件，成功 {len(self.succeeded)}，失敗 {len(self.failed)}，"
+            f"{self.workers} 個進程，耗時 {self.elapsed:.2f} 秒，{self.files_per_sec:.1f} 文件/秒"
+        )
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'total': len(self.results),
+            'succeeded': len(self.succeeded),
+            'failed': len(self.failed),
+            'workers': self.workers,
+            'elapsed': round(self.elapsed, 6),
+            'files_per_sec': round(self.files_per_sec, 3),
+            'export_elapsed': round(self.export_elapsed, 6),
+            'export_error': self.export_error,
+            'indexed': self.indexed,
+            'results': [r.to_dict() for r in self.results],
+        }
+
+def read_manifest(manifest_file):
+    """
+    讀取清單文件，每行一個路徑、目錄或通配符，空行和 # 開頭的行會被忽略
+
+    相對路徑以清單文件所在目錄為基準
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    entries = []
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entries.append(os.path.join(base_dir, line))
+    return entries
+
+def collect_inputs(paths, pattern="*.txt", manifest=None):
+    """
+    將目錄、通配符和清單展開為去重且有序的輸入文件列表
+
+    zip壓縮包展開為其中文件名符合 pattern 的成員（bundle.zip!成員 形式），不需要先解壓
+
+    Args:
+        paths: 文件、目錄或通配符列表
+        pattern: 在目錄中遞歸搜索的文件名模式
+        manifest: 清單文件路徑
+    """
+    entries = list(paths)
+    if manifest:
+        entries.extend(read_manifest(manifest))
+
+    files = []
+    for entry in entries:
+        if os.path.isdir(entry):
+            files.extend(sorted(glob.glob(os.path.join(entry, '**', pattern), recursive=True)))
+        elif _GLOB_CHARS.intersection(entry):
+            files.extend(sorted(glob.glob(entry, recursive=True)))
+        else:
+            files.append(entry)
+
+    expanded = []
+    for path in files:
+        if path.lower().endswith('.zip') and os.path.isfile(path):
+            expanded.extend(member for member in list_archive_members(path)
+                            if fnmatch.fnmatch(os.path.basename(member), pattern))
+        else:
+            expanded.append(path)
+    files = expanded
+
+    seen = set()
+    unique = []
+    for path in files:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+def output_bases(input_files, output_dir=None):
+    """
+    計算每個輸入文件的輸出路徑（不含擴展名）
+
+    指定輸出目錄時保留輸入文件相對於所有輸入共同上級目錄的路徑，
+    a/x.txt 和 b/x.txt 分別輸出到 輸出目錄/a/x 和 輸出目錄/b/x
+
+    Args:
+        input_files: 輸入文件路徑列表
+        output_dir: 輸出目錄，如果為None則輸出到各輸入文件所在目錄
+    """
+    bases = [output_base(input_file) for input_file in input_files]
+    if not output_dir or not bases:
+        return bases
+    absolute = [os.path.abspath(base) for base in bases]
+    try:
+        root = os.path.commonpath([os.path.dirname(base) for base in absolute])
+    except ValueError:
+        # 不在同一個磁盤上（Windows），沒有共同的上級目錄
+        return [os.path.join(output_dir, os.path.basename(base)) for base in bases]
+    return [os.path.join(output_dir, os.path.relpath(base, root)) for base in absolute]
+
+def _output_conflicts(input_files, bases):
+    """
+    返回輸出路徑與之前的輸入相同的文件序號到錯誤信息的字典
+
+    例如 talk.txt 和 talk.txt.gz，或同一個zip包中不同目錄下的同名成員
+    """
+    owners = {}
+    conflicts = {}
+    for i, (input_file, base) in enumerate(zip(input_files, bases)):
+        key = os.path.normcase(os.path.abspath(base))
+        if key in owners:
+            conflicts[i] = f"輸出文件與 {owners[key]} 相同：{base}"
+        else:
+            owners[key] = input_file
+    return conflicts
+
+def convert_file(input_file, output_dir=None, theme="default", native_pptx=False, native_pdf=False,
+                 html=False, styles=CSS_STYLES, index=False, indexed_digest=None, base=None):
+    """
+    轉換單個文件，只解析一次並生成所有請求的格式
+
+    在工作進程中執行，任何異常都被捕獲並記錄在結果中，不影響其他文件
+
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_dir: 輸出目錄，如果為None則使用輸入文件所在目錄
+        theme: 使用的主題名稱
+        native_pptx: 是否同時使用python-pptx生成PPTX
+        native_pdf: 是否同時在進程內直接渲染PDF
+        html: 是否同時生成自包含的HTML簡報
+        styles: Markdown中內嵌的樣式，使用外部主題文件時為空字符串
+        index: 是否返回全文索引的內容（見 slide_index）
+        indexed_digest: 索引中記錄的內容哈希，與當前內容相同時不返回索引內容
+        base: 輸出文件路徑（不含擴展名），如果為None則根據 output_dir 計算（見 output_bases）
+    """
+    if base is None:
+        base = output_bases([input_file], output_dir)[0]
+    start = time.perf_counter()
+    outputs = []
+    index_entry = None
+    try:
+        slides = read_slides(input_file)
+        # 工作進程共享磁盤上的圖片緩存，已處理過的圖片不會重複縮小
+        images = ImageResolver.for_input(input_file)
+        outputs.append(slides_to_marp(slides, base + ".md", theme, images, styles))
+        if native_pptx:
+            from txt_to_pptx import slides_to_pptx
+            outputs.append(slides_to_pptx(slides, base + ".pptx", images))
+        if native_pdf:
+            from pdf_render import slides_to_pdf
+            outputs.append(slides_to_pdf(slides, base + ".pdf"))
+        if html:
+            from html_render import slides_to_html
+            outputs.append(slides_to_html(slides, base + ".html", images=images))
+        if index:
+            # 使用同一次解析的標題和正文，內容未改變的文件不傳回主進程
+            from slide_index import file_digest, slide_records
+            digest = file_digest(input_file)
+            if digest != indexed_digest:
+                index_entry = (digest, slide_records(slides))
+    except Exception as e:
+        return FileResult(input_file, outputs, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+    return FileResult(input_file, outputs, None, time.perf_counter() - start, index_entry)
+
+def _convert_job(job):
+    return convert_file(*job)
+
+def batch_convert(input_files, output_dir=None, theme="default", native_pptx=False, workers=None,
+                  export_formats=(), node_path=None, native_pdf=False, html=False, themes=None, index=None):
+    """
+    使用進程池批量轉換文件
+
+    Markdown生成完成後，所有文件通過 marp_export.export_batch 一起導出，
+    每種格式只啟動一次Marp
+
+    Args:
+        input_files: 輸入的TXT文件路徑列表
+        output_dir: 輸出目錄，如果為None則輸出到各輸入文件所在目錄
+        theme: 使用的主題名稱
+        native_pptx: 是否同時使用python-pptx生成PPTX
+        workers: 工作進程數，如果為None則使用CPU核心數
+        export_formats: 需要通過Marp導出的格式，'pdf' 和/或 'pptx'
+        node_path: Node.js可執行文件路徑
+        native_pdf: 是否同時在進程內直接渲染PDF（與Marp的PDF導出二選一）
+        html: 是否同時生成自包含的HTML簡報
+        themes: theme_registry.ThemeRegistry，指定時主題文件在分發任務前生成一次，
+            所有Markdown只以名稱引用它，整個批次的Marp導出共用同一組主題文件
+        index: slide_index.SlideIndex，指定時把每張幻燈片的標題和正文寫入全文索引；
+            工作進程只為內容哈希與索引記錄不同的文件傳回索引內容，由主進程寫入
+
+    Returns:
+        BatchReport
+
+    Raises:
+        ValueError: 同一種格式同時要求進程內生成和Marp導出（兩者寫入同一個文件）
+    """
+    clashes = [fmt for fmt, native in (('pptx', native_pptx), ('pdf', native_pdf))
+               if native and fmt in export_formats]
+    if clashes:
+        raise ValueError(f"{'、'.join(clashes)} 不能同時在進程內生成和通過Marp導出")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(input_files) or 1))
+
+    if themes is None:
+        styles, theme_set = CSS_STYLES, ()
+    else:
+        styles, theme_set = "", themes.theme_set([theme])
+        theme = themes.name(theme)
+
+    # 輸出路徑相同的文件不轉換，避免互相覆蓋
+    bases = output_bases(input_files, output_dir)
+    conflicts = _output_conflicts(input_files, bases)
+    if output_dir:
+        for directory in sorted({os.path.dirname(base) for base in bases}):
+            os.makedirs(directory, exist_ok=True)
+
+    jobs = [(input_file, output_dir, theme, native_pptx, native_pdf, html, styles,
+             index is not None, index.digest(input_file) if index is not None else None, base)
+            for i, (input_file, base) in enumerate(zip(input_files, bases)) if i not in conflicts]
+
+    start = time.perf_counter()
+    if workers == 1:
+        converted = [_convert_job(job) for job in jobs]
+    else:
+        # 小文件很多時按塊分發任務，減少進程間通信的開銷
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            converted = list(executor.map(_convert_job, jobs, chunksize=chunksize))
+    converted = iter(converted)
+    results = [FileResult(input_file, error=conflicts[i]) if i in conflicts else next(converted)
+               for i, input_file in enumerate(input_files)]
+    indexed = None
+    if index is not None:
+        indexed = 0
+        for result in results:
+            if result.ok and result.index_entry is not None:
+                indexed += index.update(result.input_file, *result.index_entry)
+            result.index_entry = None
+    elapsed = time.perf_counter() - start
+
+    # 所有Markdown文件一起交給Marp導出
+    export_elapsed = 0.0
+    export_error = None
+    converted = [r for r in results if r.ok]
+    if export_formats and converted:
+        start = time.perf_counter()
+        try:
+            outputs = export_batch([r.outputs[0] for r in converted], export_formats, node_path,
+                                   theme_set=theme_set)
+        except Exception as e:
+            export_error = str(e)
+        else:
+            for fmt in export_formats:
+                for result, output in zip(converted, outputs[fmt]):
+                    result.outputs.append(output)
+        export_elapsed = time.perf_counter() - start
+
+    return BatchReport(results, elapsed, workers, export_elapsed, export_error, indexed)
+
+def main():
+    parser = argparse.ArgumentParser(description='批量將TXT文件轉換為Marp格式的簡報')
+    parser.add_argument('inputs', nargs='*', help='輸入的文件、目錄或通配符')
+    parser.add_argument('-m', '--manifest', help='清單文件，每行一個文件、目錄或通配符')
+    parser.add_argument('-d', '--output-dir', help='輸出目錄，默認輸出到輸入文件所在目錄')
+    parser.add_argument('-t', '--theme', default='default', help='使用的主題名稱')
+    parser.add_argument('-j', '--workers', type=int, help='工作進程數，默認為CPU核心數')
+    parser.add_argument('--pattern', default='*.txt', help='在目錄中搜索的文件名模式')
+    parser.add_argument('--native-pptx', action='store_true', help='同時使用python-pptx生成PPTX')
+    parser.add_argument('--native-pdf', action='store_true', help='同時在進程內直接渲染PDF，不需要Node.js')
+    parser.add_argument('--html', action='store_true', help='同時生成自包含的HTML簡報')
+    parser.add_argument('--pdf', action='store_true', help='同時通過Marp生成PDF文件')
+    parser.add_argument('--pptx', action='store_true', help='同時通過Marp生成PPTX文件')
+    parser.add_argument('--node-path', help='指定Node.js可執行文件路徑')
+    parser.add_argument('--report', help='將匯總報告保存為JSON文件')
+    theme_registry.add_arguments(parser)
+    slide_index.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    input_files = collect_inputs(args.inputs, args.pattern, args.manifest)
+    if not input_files:
+        parser.error("沒有找到任何輸入文件")
+
+    # 進程內生成的格式不再通過Marp導出，兩者寫入同一個文件
+    export_formats = [fmt for fmt, wanted in (('pdf', args.pdf and not args.native_pdf),
+                                              ('pptx', args.pptx and not args.native_pptx)) if wanted]
+    index = slide_index.from_arguments(args)
+    try:
+        report = batch_convert(input_files, args.output_dir, args.theme, args.native_pptx, args.workers,
+                               export_formats, args.node_path, args.native_pdf, args.html,
+                               theme_registry.from_arguments(args), index)
+    finally:
+        if index is not None:
+            index.close()
+    print(report.summary())
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+
+    if report.failed or report.export_error:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+import tracemalloc
+
+# 倉庫根目錄
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from slide_ir import parse_slides
+from marp_markdown import write_marp
+
+# 語料名稱到 (幻燈片數量, 生成方式) 的映射
+CORPORA = {
+    'tiny': (10, 'mixed'),
+    '1k': (1000, 'mixed'),
+    '100k': (100000, 'mixed'),
+    'cjk': (2000, 'cjk'),
+    'long_line': (200, 'long_line'),
+    'list_heavy': (2000, 'list_heavy'),
+}
+
+DEFAULT_CORPORA = ('tiny', '1k', '100k', 'cjk', 'long_line', 'list_heavy')
+CONVERTERS = ('marp', 'purepython', 'pptx', 'pptx-stream', 'pdf', 'html')
+
+# python-pptx 很慢，超過此數量的語料默認不測試PPTX
+DEFAULT_PPTX_MAX_SLIDES = 5000
+
+# 默認的回歸閾值：比基準慢 25% 以上視為回歸
+DEFAULT_THRESHOLD = 0.25
+
+# 基準結果與機器有關，不隨倉庫提交：先在用於比較的機器上用相同的參數生成，
+#   python benchmarks/bench_converters.py -o benchmarks/baseline.json
+# 之後以 --baseline benchmarks/baseline.json 運行，出現回歸、失敗或缺少的組合時以非零狀態退出
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+_CJK_WORDS = ["會議", "紀要", "項目", "進度", "討論", "決定", "負責人", "時間表", "風險", "預算", "測試", "發佈"]
+_LATIN_WORDS = ["meeting", "action", "item", "review", "budget", "release", "owner", "status", "risk", "plan"]
+
+def generate_corpus(name, seed=42):
+    """
+    生成確定性的測試語料
+
+    相同的名稱和種子總是生成完全相同的文本
+    """
+    count, style = CORPORA[name]
+    rng = random.Random(seed)
+    slides = []
+    for i in range(count):
+        if style == 'cjk':
+            title = "".join(rng.choice(_CJK_WORDS) for _ in range(3)) + f" {i + 1}"
+            lines = ["".join(rng.choice(_CJK_WORDS) for _ in range(rng.randint(5, 25)))
+                     for _ in range(rng.randint(2, 6))]
+        elif style == 'long_line':
+            title = f"Long line slide {i + 1}"
+            lines = [" ".join(rng.choice(_LATIN_WORDS) for _ in range(rng.randint(500, 1500)))]
+        elif style == 'list_heavy':
+            title = f"Checklist {i + 1}"
+            lines = []
+            for j in range(rng.randint(8, 16)):
+                marker = rng.choice(("-", "*", f"{j + 1}."))
+                lines.append(f"{marker} " + " ".join(rng.choice(_LATIN_WORDS) for _ in range(rng.randint(2, 8))))
+        else:
+            title = f"Slide {i + 1} " + rng.choice(_CJK_WORDS)
+            lines = []
+            for j in range(rng.randint(0, 6)):
+                kind = rng.random()
+                words = " ".join(rng.choice(_LATIN_WORDS + _CJK_WORDS) for _ in range(rng.randint(3, 15)))
+                if kind < 0.3:
+                    lines.append(f"- {words}")
+                elif kind < 0.5:
+                    lines.append(f"{j + 1}. {words}")
+                else:
+                    lines.append(words)
+        slides.append("\n".join([title] + lines))
+    return "\n\n".join(slides) + "\n"
+
+def _load_purepython():
+    """導入文件名帶連字符的純Python版本"""
+    path = os.path.join(ROOT, 'purepython-txt_to_marp_ppt.py')
+    spec = importlib.util.spec_from_file_location('purepython_txt_to_marp_ppt', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class StageRecorder:
+    """
+    記錄每個階段的耗時，以及可選的內存分配
+
+    跟踪內存分配會明顯拖慢運行，因此計時和分配統計分兩次執行：
+    先不帶跟踪計時，再帶 tracemalloc 重跑一次統計峰值和保留的內存塊。
+    重跑會抬高進程的峰值RSS，_run_isolated 只從不跟踪的子進程取計時和峰值RSS
+    """
+
+    def __init__(self, trace_allocations):
+        self.trace_allocations = trace_allocations
+        self.stages = {}
+
+    def run(self, name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        stage = {'seconds': time.perf_counter() - start}
+        if self.trace_allocations:
+            tracemalloc.start()
+            func(*args)
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stage['alloc_peak_bytes'] = peak
+            stage['alloc_retained_blocks'] = sum(stat.count for stat in snapshot.statistics('filename'))
+        self.stages[name] = stage
+        return result
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _render_marp(slides):
+    import io
+    buffer = io.StringIO()
+    write_marp(slides, buffer)
+    return buffer.getvalue()
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def _render_pptx(slides):
+    from txt_to_pptx import build_presentation
+    return build_presentation(slides)
+
+def run_case(converter, corpus, work_dir, trace_allocations=True):
+    """
+    在當前進程中運行一個 轉換器×語料 組合
+
+    Returns:
+        包含分階段耗時、吞吐量和峰值RSS的字典；trace_allocations 時峰值RSS包含跟踪重跑的內存
+    """
+    input_file = os.path.join(work_dir, f"{corpus}.txt")
+    if not os.path.exists(input_file):
+        _write(input_file, generate_corpus(corpus))
+    size = os.path.getsize(input_file)
+    recorder = StageRecorder(trace_allocations)
+
+    start = time.perf_counter()
+    if converter == 'purepython':
+        # 純Python版本只測量端到端耗時
+        module = _load_purepython()
+        recorder.run('total', module.txt_to_marp, input_file, os.path.join(work_dir, f"{corpus}.pp.md"))
+        slide_count = len(parse_slides(_read(input_file)))
+    elif converter == 'pptx-stream':
+        # 串流寫入把讀取、切分和寫入交織在一起，只測量端到端耗時
+        from txt_to_pptx import txt_to_pptx
+        recorder.run('total', txt_to_pptx, input_file, os.path.join(work_dir, f"{corpus}.stream.pptx"), False, True)
+        slide_count = len(parse_slides(_read(input_file)))
+    else:
+        text = recorder.run('read', _read, input_file)
+        slides = recorder.run('split', parse_slides, text)
+        slide_count = len(slides)
+        if converter == 'marp':
+            markdown = recorder.run('render', _render_marp, slides)
+            recorder.run('write', _write, os.path.join(work_dir, f"{corpus}.md"), markdown)
+        elif converter == 'pdf':
+            # 頁面邊排版邊寫入，排版和寫入作為一個階段
+            from pdf_render import slides_to_pdf
+            recorder.run('render', slides_to_pdf, slides, os.path.join(work_dir, f"{corpus}.pdf"))
+        elif converter == 'html':
+            from html_render import slides_to_html
+            recorder.run('render', slides_to_html, slides, os.path.join(work_dir, f"{corpus}.html"))
+        else:
+            prs = recorder.run('render', _render_pptx, slides)
+            recorder.run('write', prs.save, os.path.join(work_dir, f"{corpus}.pptx"))
+    total = time.perf_counter() - start
+    # 吞吐量以不帶跟踪的各階段計時為準
+    measured = sum(stage['seconds'] for stage in recorder.stages.values())
+
+    return {
+        'converter': converter,
+        'corpus': corpus,
+        'slides': slide_count,
+        'bytes': size,
+        'seconds': measured,
+        'wall_seconds': total,
+        'slides_per_sec': slide_count / measured if measured else 0.0,
+        'mb_per_sec': size / (1024 * 1024) / measured if measured else 0.0,
+        'peak_rss_kb': _peak_rss_kb(),
+        'stages': recorder.stages,
+    }
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字節為單位，Linux 以KB為單位
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def _run_single(converter, corpus, work_dir, trace_allocations):
+    args = [sys.executable, os.path.abspath(__file__), '--single', converter, corpus, '--work-dir', work_dir]
+    if not trace_allocations:
+        args.append('--no-alloc')
+    result = subprocess.run(args, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'converter': converter, 'corpus': corpus, 'error': result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout)
+
+def _run_isolated(converter, corpus, work_dir, trace_allocations):
+    """
+    在子進程中運行一個組合，使峰值RSS互不影響
+
+    分配統計在另一個子進程中收集，計時、峰值RSS和回歸比較與是否跟踪分配無關
+    """
+    result = _run_single(converter, corpus, work_dir, False)
+    if trace_allocations and 'error' not in result:
+        traced = _run_single(converter, corpus, work_dir, True)
+        if 'error' in traced:
+            return traced
+        for name, stage in traced['stages'].items():
+            result['stages'][name].update((key, value) for key, value in stage.items() if key.startswith('alloc_'))
+    return result
+
+STUB_MARP = '''#!{python}
+import os, sys
+args = sys.argv[1:]
+fmt = next(a[2:] for a in args if a in ('--pdf', '--pptx'))
+output = args[args.index('--output') + 1] if '--output' in args else None
+for md_file in (a for a in args if a.endswith('.md')):
+    with open(output or os.path.splitext(md_file)[0] + '.' + fmt, 'wb') as f:
+        f.write(b'stub')
+'''
+
+def bench_export(work_dir, file_count=20):
+    """
+    使用本地假Marp可執行文件測量導出流程的開銷（不需要網絡和Node.js）
+    """
+    from marp_export import export_batch
+
+    stub_dir = os.path.join(work_dir, 'stub-bin')
+    os.makedirs(stub_dir, exist_ok=True)
+    stub = os.path.join(stub_dir, 'marp')
+    with open(stub, 'w', encoding='utf-8') as f:
+        f.write(STUB_MARP.format(python=sys.executable))
+    os.chmod(stub, 0o755)
+
+    md_files = []
+    for i in range(file_count):
+        path = os.path.join(work_dir, f"export-{i}.md")
+        _write(path, _render_marp(parse_slides(generate_corpus('tiny', seed=i))))
+        md_files.append(path)
+
+    old_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = stub_dir + os.pathsep + old_path
+    try:
+        start = time.perf_counter()
+        export_batch(md_files, ('pdf', 'pptx'), use_npx=False)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.environ['PATH'] = old_path
+
+    return {'converter': 'marp-export-stub', 'corpus': f'{file_count}x tiny', 'files': file_count,
+            'seconds': elapsed, 'files_per_sec': file_count / elapsed if elapsed else 0.0}
+
+def compare(results, baseline, threshold, converters=None, corpora=None):
+    """
+    與基準比較，返回回歸描述列表
+
+    耗時和峰值RSS超過基準 (1 + threshold) 倍時視為回歸；本次運行失敗的組合、
+    基準中沒有（或在基準中失敗）的組合，以及基準中有、屬於本次選擇的轉換器和語料
+    卻沒有運行的組合也計入，沒有比較過的組合不會被當作通過
+
+    Args:
+        results: 本次運行的結果列表
+        baseline: 基準結果（main() 保存的JSON）
+        threshold: 回歸閾值
+        converters: 本次選擇的轉換器，如果為None則不檢查缺少的組合
+        corpora: 本次選擇的語料，如果為None則不檢查缺少的組合
+    """
+    reference = {(r['converter'], r['corpus']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        name = f"{result['converter']}/{result['corpus']}"
+        if 'error' in result:
+            regressions.append(f"{name}: 運行失敗 {result['error']}")
+            continue
+        old = reference.get((result['converter'], result['corpus']))
+        if old is None:
+            regressions.append(f"{name}: 基準中沒有此組合")
+            continue
+        if 'error' in old:
+            regressions.append(f"{name}: 基準中此組合失敗，無法比較")
+            continue
+        for metric in ('seconds', 'peak_rss_kb'):
+            if old.get(metric) and result.get(metric) and result[metric] > old[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {old[metric]:.4g} -> {result[metric]:.4g}")
+    if converters is not None and corpora is not None:
+        ran = {(r['converter'], r['corpus']) for r in results}
+        for converter, corpus in reference:
+            if converter in converters and corpus in corpora and (converter, corpus) not in ran:
+                regressions.append(f"{converter}/{corpus}: 基準中有此組合，本次沒有運行")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='轉換器吞吐量和內存基準測試')
+    parser.add_argument('--corpus', action='append', choices=sorted(CORPORA), help='要測試的語料，可重複指定')
+    parser.add_argument('--converter', action='append', choices=CONVERTERS, help='要測試的轉換器，可重複指定')
+    parser.add_argument('--pptx-max-slides', type=int, default=DEFAULT_PPTX_MAX_SLIDES,
+                        help='PPTX轉換器測試的最大幻燈片數量')
+    parser.add_argument('--no-alloc', action='store_true', help='不跟踪內存分配（更快）')
+    parser.add_argument('--no-export', action='store_true', help='不測試Marp導出流程')
+    parser.add_argument('-o', '--output', help='將結果保存為JSON文件')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='基準結果JSON文件（不帶路徑時為 benchmarks/baseline.json），'
+                             '出現回歸、失敗或缺少的組合時以非零狀態退出')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回歸閾值，默認0.25即慢25%%')
+    parser.add_argument('--work-dir', help='語料和輸出文件的目錄，默認使用臨時目錄')
+    parser.add_argument('--single', nargs=2, metavar=('CONVERTER', 'CORPUS'), help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_case(args.single[0], args.single[1], args.work_dir, not args.no_alloc)
+        json.dump(result, sys.stdout)
+        return
+
+    corpora = args.corpus or list(DEFAULT_CORPORA)
+    converters = args.converter or list(CONVERTERS)
+    if args.baseline and not os.path.exists(args.baseline):
+        # 在運行整套測試之前報告，基準文件需要先用 -o 生成
+        parser.error(f"基準文件不存在: {args.baseline}，請先在本機運行 -o {args.baseline} 生成")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        results = []
+        for corpus in corpora:
+            for converter in converters:
+                if converter == 'pptx' and CORPORA[corpus][0] > args.pptx_max_slides:
+                    continue
+                result = _run_isolated(converter, corpus, work_dir, not args.no_alloc)
+                results.append(result)
+                if 'error' in result:
+                    print(f"{converter:<11} {corpus:<11} 失敗: {result['error']}")
+                    continue
+                stages = "  ".join(f"{name} {stage['seconds'] * 1000:.1f}ms" for name, stage in result['stages'].items())
+                print(f"{converter:<11} {corpus:<11} {result['slides_per_sec']:>10.0f} 張/秒 "
+                      f"{result['mb_per_sec']:>7.2f} MB/s  峰值RSS {result['peak_rss_kb'] or 0:>8} KB  {stages}")
+        if not args.no_export:
+            export = bench_export(work_dir)
+            results.append(export)
+            print(f"Marp導出(假可執行文件) {export['files']} 個文件 {export['seconds']:.2f} 秒")
+
+    report = {'python': sys.version.split()[0], 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, converters, corpora)
+        for regression in regressions:
+            print(f"回歸: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+# 倉庫根目錄
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 命令行模式下不應該被導入的重量級模塊
+HEAVY_MODULES = ('tkinter', 'pptx', 'lxml', 'PIL', 'asyncio')
+
+# 用於端到端計時的小型輸入
+TINY_DECK = "標題\n- 第一點\n- 第二點\n\n第二頁\n1. 步驟一\n2. 步驟二\n"
+
+def import_times(module):
+    """
+    使用 python -X importtime 導入模塊，返回 (模塊名, 自身耗時us, 累計耗時us) 列表
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+def time_command(args, runs):
+    """多次運行命令，返回每次的耗時（秒）"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def run(runs=10, module='txt_to_marp_ppt'):
+    """運行啟動時間基準測試並返回結果字典"""
+    entries = import_times(module)
+    total_us = next((cumulative for name, _, cumulative in entries if name == module), 0)
+    heavy = sorted({name.split('.')[0] for name, _, _ in entries} & set(HEAVY_MODULES))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_file = os.path.join(tmp_dir, 'tiny.txt')
+        with open(input_file, 'w', encoding='utf-8') as f:
+            f.write(TINY_DECK)
+        interpreter = time_command([sys.executable, '-c', 'pass'], runs)
+        cli = time_command([sys.executable, os.path.join(ROOT, 'txt_to_marp_ppt.py'), input_file,
+                            '-o', os.path.join(tmp_dir, 'tiny.md'), '--no-cache'], runs)
+
+    return {
+        'module': module,
+        'import_us': total_us,
+        'slowest_imports': [
+            {'module': name, 'self_us': self_us, 'cumulative_us': cumulative}
+            for name, self_us, cumulative in sorted(entries, key=lambda e: e[1], reverse=True)[:10]
+        ],
+        'heavy_modules': heavy,
+        'interpreter_ms': statistics.median(interpreter) * 1000,
+        'cli_ms': statistics.median(cli) * 1000,
+        'runs': runs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='測量命令行模式的冷啟動耗時')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='端到端計時的運行次數')
+    parser.add_argument('--module', default='txt_to_marp_ppt', help='要測量導入耗時的模塊')
+    parser.add_argument('--json', help='將結果保存為JSON文件')
+
+    args = parser.parse_args()
+    result = run(args.runs, args.module)
+
+    print(f"導入 {result['module']}: {result['import_us'] / 1000:.1f} 毫秒")
+    for entry in result['slowest_imports']:
+        print(f"  {entry['module']:<30} 自身 {entry['self_us'] / 1000:6.1f} 毫秒  累計 {entry['cumulative_us'] / 1000:6.1f} 毫秒")
+    print(f"空解釋器啟動: {result['interpreter_ms']:.1f} 毫秒（中位數）")
+    print(f"命令行轉換小文件: {result['cli_ms']:.1f} 毫秒（中位數）")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if result['heavy_modules']:
+        print(f"錯誤: 命令行模式導入了 {', '.join(result['heavy_modules'])}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import io
+import re
+import shutil
+import hashlib
+import tempfile
+
+from slide_ir import IMAGE_PREFIX, Paragraph, match_image, parse_slides
+from marp_markdown import CSS_STYLES, write_marp
+from marp_export import export_batch, marp_command, marp_version
+from text_input import decode_text, output_base, read_bytes
+from image_assets import ImageResolver, copy_assets
+from profiling import stage
+
+# 默認緩存大小上限
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 參與計算工具版本的源文件，任何一個改變都會使舊緩存失效
+_TOOL_SOURCES = ('slide_ir.py', 'marp_markdown.py', 'marp_export.py', 'build_cache.py', 'text_input.py',
+                 'image_assets.py')
+
+_tool_version = None
+
+# 讀不到umask時新建文件使用的權限
+_FALLBACK_MODE = 0o644
+
+_file_mode = None
+
+def _new_file_mode():
+    """
+    返回新建文件的權限，與普通 open() 一致（0o666 去掉umask）
+
+    不用 os.umask() 讀取：它需要臨時改變整個進程的umask，其他線程在這期間創建的文件
+    會變成所有人可寫。umask從 /proc/self/status 讀取（Linux），讀不到時使用 0o644
+    """
+    global _file_mode
+    if _file_mode is None:
+        mode = _FALLBACK_MODE
+        try:
+            with open('/proc/self/status', encoding='ascii', errors='replace') as f:
+                for line in f:
+                    if line.startswith('Umask:'):
+                        mode = 0o666 & ~int(line.split()[1], 8)
+                        break
+        except (OSError, ValueError):
+            pass
+        _file_mode = mode
+    return _file_mode
+
+def tool_version():
+    """根據轉換器源代碼計算工具版本"""
+    global _tool_version
+    if _tool_version is None:
+        digest = hashlib.sha256()
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in _TOOL_SOURCES:
+            path = os.path.join(base_dir, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _tool_version = digest.hexdigest()[:16]
+    return _tool_version
+
+def default_cache_dir():
+    """默認緩存目錄，可通過環境變量 TXT_TO_MARP_CACHE 覆蓋"""
+    return os.environ.get('TXT_TO_MARP_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'txt_to_marp')
+
+def _same_bytes(path, data):
+    """判斷文件內容是否與給定字節相同"""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+def write_if_changed(path, data):
+    """
+    只有內容改變時才寫入文件，保持未改變文件的修改時間
+
+    寫入先落到臨時文件再原子替換，避免留下寫了一半的文件
+
+    Returns:
+        是否寫入了文件
+    """
+    if _same_bytes(path, data):
+        return False
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = _new_file_mode()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+def copy_if_changed(src, dst):
+    """只有內容改變時才複製文件"""
+    with open(src, 'rb') as f:
+        return write_if_changed(dst, f.read())
+
+class BuildCache:
+    """
+    以內容哈希為鍵的構建緩存
+
+    緩存文件按 鍵+擴展名 存放，命中時更新修改時間，
+    總大小超過上限時按最近最少使用(LRU)的順序刪除
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, content, theme, css=CSS_STYLES, extra=""):
+        """
+        計算緩存鍵
+
+        Args:
+            content: 輸入文件的字節內容
+            theme: 主題名稱
+            css: 嵌入的CSS樣式
+            extra: 其他影響輸出的參數，例如Marp命令
+        """
+        digest = hashlib.sha256()
+        for part in (tool_version(), theme, css, extra):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def lookup(self, key, ext):
+        """查找緩存文件，命中時返回路徑並更新其使用時間，否則返回None"""
+        path = self._path(key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, key, ext, src):
+        """將文件存入緩存並在需要時清理舊條目"""
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        os.close(fd)
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def write(self, key, ext, data):
+        """將字節存入緩存，不清理舊條目；用於批量寫入小文件，寫完後再調用 evict()"""
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def entries(self):
+        """返回 (修改時間, 大小, 路徑) 列表"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """刪除最久未使用的條目，直到總大小不超過上限"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+# 可能引用圖片的輸入：圖片擴展名或圖片語法，用於跳過沒有圖片的輸入的解碼和逐行掃描
+_IMAGE_HINT = re.compile(rb'\.(?:png|jpe?g|gif|bmp|webp)|!\[', re.IGNORECASE)
+
+def _image_references(content, images):
+    """
+    返回輸入引用的圖片在Markdown中的地址列表，用於構建緩存鍵
+
+    地址包含圖片的內容哈希，圖片內容改變時緩存鍵隨之改變；
+    同時把處理後的圖片複製到輸出目錄，從緩存複製的Markdown也能找到圖片
+    """
+    # UTF-16/32 編碼的輸入無法用字節正則判斷，總是逐行掃描
+    if not _IMAGE_HINT.search(content) and b'\0' not in content[:4096]:
+        return []
+    references = []
+    for line in decode_text(content).split('\n'):
+        image = match_image(line)
+        if image is not None:
+            references.append(images.marp_path(Paragraph(IMAGE_PREFIX, image).image[1]))
+    return references
+
+def _render_markdown(content, theme, images=None, styles=CSS_STYLES, slides=None):
+    """將解壓後的輸入字節轉換為Marp Markdown字節，換行符與文本模式寫入時一致"""
+    if slides is None:
+        slides = parse_slides(decode_text(content))
+    buffer = io.StringIO()
+    write_marp(slides, buffer, theme, images, styles)
+    text = buffer.getvalue()
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+def convert_cached(input_file, output_file=None, theme="default", formats=(), node_path=None,
+                   use_npx=True, cache=None, themes=None, slides=None):
+    """
+    帶緩存的轉換：未改變的輸入只需一次哈希計算和文件複製
+
+    輸出內容未改變時不會重寫文件，基於修改時間的監視程序不會被觸發
+
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的Markdown文件路徑，如果為None則自動生成
+        theme: 使用的主題名稱
+        formats: 需要通過Marp導出的格式，'pdf' 和/或 'pptx'
+        node_path: Node.js可執行文件路徑
+        use_npx: 是否通過npx運行Marp CLI
+        cache: BuildCache，如果為None則使用默認緩存目錄
+        themes: theme_registry.ThemeRegistry，指定時Markdown只以名稱引用外部主題文件
+        slides: 調用方已經解析好的幻燈片，如果為None則在緩存未命中時解析
+
+    Returns:
+        (Markdown文件路徑, 格式到輸出文件路徑的字典, 命中緩存的擴展名列表)
+    """
+    if cache is None:
+        cache = BuildCache()
+    if output_file is None:
+        output_file = output_base(input_file) + ".md"
+
+    with stage('read'):
+        content = read_bytes(input_file)
+    images = ImageResolver.for_input(input_file).for_output(output_file)
+    with stage('images'):
+        references = _image_references(content, images)
+    if themes is None:
+        header_theme, styles, theme_set = theme, CSS_STYLES, []
+    else:
+        # 主題文件的內容代替內嵌樣式參與緩存鍵
+        header_theme, styles, theme_set = themes.name(theme), "", themes.theme_set([theme])
+    css = styles or themes.theme_css(theme)
+    key = cache.key(content, header_theme, css,
+                    extra=" ".join(marp_command(node_path, use_npx) + references))
+    hits = []
+
+    # Markdown
+    cached_md = cache.lookup(key, ".md")
+    if cached_md:
+        hits.append(".md")
+        copy_if_changed(cached_md, output_file)
+    else:
+        with stage('render'):
+            markdown = _render_markdown(content, header_theme, images, styles, slides)
+        write_if_changed(output_file, markdown)
+        cache.store(key, ".md", output_file)
+
+    # 通過Marp導出緩存中沒有的格式
+    base = os.path.splitext(output_file)[0]
+    outputs = {fmt: f"{base}.{fmt}" for fmt in formats}
+    if formats:
+        # 導出結果還取決於Marp CLI的版本，只生成Markdown時不需要啟動Marp查詢
+        key = hashlib.sha256(f"{key}\0{marp_version(node_path, use_npx)}".encode('utf-8')).hexdigest()
+    missing = []
+    for fmt in formats:
+        cached = cache.lookup(key, "." + fmt)
+        if cached:
+            hits.append("." + fmt)
+            copy_if_changed(cached, outputs[fmt])
+        else:
+            missing.append(fmt)
+
+    if missing:
+        # 在臨時目錄中導出，再只複製內容改變的文件
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_md = os.path.join(tmp_dir, os.path.basename(output_file))
+            shutil.copyfile(output_file, tmp_md)
+            # Markdown以相對路徑引用輸出目錄中的圖片
+            copy_assets(output_file, tmp_dir)
+            exported = export_batch([tmp_md], missing, node_path, use_npx, theme_set=theme_set)
+            for fmt in missing:
+                cache.store(key, "." + fmt, exported[fmt][0])
+                copy_if_changed(exported[fmt][0], outputs[fmt])
+
+    return output_file, outputs, hits
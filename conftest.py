@@ -0,0 +1 @@
+# pytest 從倉庫根目錄收集 tests/ 時，將根目錄加入 sys.path，測試可以直接導入各模塊
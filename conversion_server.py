@@ -0,0 +1,272 @@
+import os
+import re
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import memory_api
+
+# 路徑 -> 響應的Content-Type
+CONTENT_TYPES = {
+    'markdown': 'text/markdown; charset=utf-8',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+# 默認監聽端口
+DEFAULT_PORT = 8765
+
+# 請求正文的大小上限
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# 主題名稱會寫入Markdown頭部，只允許簡單的名稱
+_THEME_NAME = re.compile(r'[\w.-]+')
+
+class ServiceBusy(Exception):
+    """等待中的請求已達上限"""
+
+class WorkerCrashed(Exception):
+    """處理請求的工作進程異常退出（例如被OOM終止），進程池已經重建"""
+
+def _warm_up():
+    """工作進程初始化：預先創建共用的PPTX模板，第一個請求不需要等待"""
+    memory_api.pptx_template()
+
+def _convert(fmt, data, theme):
+    """在工作進程中轉換一個請求，返回響應正文"""
+    if fmt == 'pptx':
+        return memory_api.text_to_pptx(data)
+    return memory_api.text_to_markdown(data, theme).encode('utf-8')
+
+class ConversionService:
+    """
+    把轉換請求分派給工作進程池
+
+    同時接受的請求（排隊中和轉換中）不超過 max_pending 個。沒有空位時最多等待
+    queue_timeout 秒，仍然沒有空位就拋出 ServiceBusy，由HTTP層返回503讓客戶端稍後重試，
+    請求不會無限堆積在內存中。轉換完全在內存中進行（見 memory_api），
+    每個工作進程啟動時創建一次PPTX模板，之後所有請求共用。
+
+    任何一個工作進程異常退出後 ProcessPoolExecutor 就不能再用，此時重建進程池：
+    提交時發現進程池已損壞的請求在新的進程池中重試一次，
+    正在處理而進程退出的請求不重試（可能正是它導致了崩潰），拋出 WorkerCrashed
+    """
+
+    def __init__(self, workers=None, max_pending=None, queue_timeout=0.5, timeout=30.0):
+        """
+        Args:
+            workers: 工作進程數，如果為None則使用CPU核心數
+            max_pending: 同時接受的請求數上限，如果為None則為工作進程數的8倍
+            queue_timeout: 沒有空位時等待的秒數
+            timeout: 單個請求轉換的超時時間（秒）
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counts = {'completed': 0, 'failed': 0, 'rejected': 0, 'pending': 0, 'pool_restarts': 0}
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+    def _rebuild(self, broken):
+        """替換已損壞的進程池，多個線程同時發現時只重建一次，返回可用的進程池"""
+        with self._executor_lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                self._count('pool_restarts')
+            return self._executor
+
+    def _submit(self, fmt, data, theme):
+        """提交請求，返回 (進程池, future)"""
+        executor = self._executor
+        try:
+            return executor, executor.submit(_convert, fmt, data, theme)
+        except BrokenProcessPool:
+            # 之前的請求使工作進程退出，進程池已損壞，重建後重試一次
+            executor = self._rebuild(executor)
+            return executor, executor.submit(_convert, fmt, data, theme)
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._counts[name] += delta
+
+    def _done(self, future):
+        # 超時的請求在工作進程中完成後才釋放空位，排隊的任務數始終不超過上限
+        self._slots.release()
+        self._count('pending', -1)
+        self._count('failed' if future.cancelled() or future.exception() else 'completed')
+
+    def convert(self, fmt, data, theme="default"):
+        """
+        轉換一個請求
+
+        Args:
+            fmt: 'markdown' 或 'pptx'
+            data: 文本內容的字節
+            theme: Markdown使用的主題名稱
+
+        Returns:
+            轉換結果的字節
+
+        Raises:
+            ServiceBusy: 等待中的請求已達上限
+            WorkerCrashed: 工作進程在處理請求時異常退出
+            concurrent.futures.TimeoutError: 轉換超時
+        """
+        if fmt not in CONTENT_TYPES:
+            raise ValueError(f"不支持的輸出格式: {fmt}")
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise ServiceBusy(f"等待中的請求已達上限（{self.max_pending}）")
+        self._count('pending')
+        try:
+            executor, future = self._submit(fmt, data, theme)
+        except BaseException as e:
+            self._slots.release()
+            self._count('pending', -1)
+            self._count('failed')
+            if isinstance(e, BrokenProcessPool):
+                raise WorkerCrashed("工作進程異常退出，請稍後重試") from e
+            raise
+        future.add_done_callback(self._done)
+        try:
+            return future.result(self.timeout)
+        except BrokenProcessPool as e:
+            # 下一個請求不必再等待提交失敗才重建
+            self._rebuild(executor)
+            raise WorkerCrashed("工作進程異常退出，請稍後重試") from e
+
+    def stats(self):
+        """返回服務狀態的字典"""
+        with self._lock:
+            return dict(self._counts, workers=self.workers, max_pending=self.max_pending)
+
+    def close(self):
+        """停止工作進程"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class _Handler(BaseHTTPRequestHandler):
+    # 支持長連接，客戶端可以在同一個連接上連續發送請求
+    protocol_version = "HTTP/1.1"
+    server_version = "txt-to-marp"
+    # 響應頭和正文一起發送，小響應不會被Nagle算法延遲
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body, content_type='text/plain; charset=utf-8', headers=()):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != '/health':
+            self._reply(404, "未知的路徑\n")
+            return
+        self._reply(200, json.dumps(self.server.service.stats()), 'application/json')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        fmt = url.path.strip('/')
+        if fmt not in CONTENT_TYPES:
+            self._reply(404, "未知的路徑，請使用 /markdown 或 /pptx\n")
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self._reply(411, "需要 Content-Length\n")
+            return
+        if length > MAX_BODY_SIZE:
+            # 沒有讀取請求正文，連接不能再用
+            self.close_connection = True
+            self._reply(413, f"請求正文超過 {MAX_BODY_SIZE} 字節\n")
+            return
+        data = self.rfile.read(length)
+        theme = parse_qs(url.query).get('theme', ['default'])[0]
+        if not _THEME_NAME.fullmatch(theme):
+            self._reply(400, "無效的主題名稱\n")
+            return
+
+        try:
+            body = self.server.service.convert(fmt, data, theme)
+        except (ServiceBusy, WorkerCrashed) as e:
+            self._reply(503, f"{e}\n", headers=[('Retry-After', '1')])
+        except FutureTimeout:
+            self._reply(504, "轉換超時\n")
+        except UnicodeDecodeError:
+            self._reply(400, "無法識別文本編碼\n")
+        except Exception as e:
+            self._reply(500, f"轉換失敗: {e}\n")
+        else:
+            self._reply(200, body, CONTENT_TYPES[fmt])
+
+    def log_message(self, format, *args):
+        # 每秒數百個請求時逐條記錄會拖慢服務，只在 --verbose 時輸出
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    本地HTTP轉換服務
+
+        POST /markdown?theme=名稱  請求正文為文本，返回Marp格式的Markdown
+        POST /pptx                 請求正文為文本，返回PPTX文件
+        GET  /health               返回服務狀態（JSON）
+
+    每個連接由一個線程處理，轉換交給 ConversionService 的工作進程池
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, verbose=False):
+        """
+        Args:
+            address: (主機, 端口)
+            service: ConversionService
+            verbose: 是否記錄每個請求
+        """
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+def main():
+    parser = argparse.ArgumentParser(description='啟動本地HTTP服務，在內存中將文本轉換為Marp Markdown或PPTX')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽地址')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help='監聽端口')
+    parser.add_argument('-j', '--workers', type=int, help='工作進程數，默認為CPU核心數')
+    parser.add_argument('--max-pending', type=int, help='同時接受的請求數上限，超過時返回503，默認為工作進程數的8倍')
+    parser.add_argument('--queue-timeout', type=float, default=0.5, help='沒有空位時等待的秒數')
+    parser.add_argument('--timeout', type=float, default=30.0, help='單個請求轉換的超時時間（秒）')
+    parser.add_argument('-v', '--verbose', action='store_true', help='記錄每個請求')
+
+    args = parser.parse_args()
+
+    service = ConversionService(args.workers, args.max_pending, args.queue_timeout, args.timeout)
+    server = ConversionServer((args.host, args.port), service, args.verbose)
+    print(f"轉換服務已啟動: http://{args.host}:{server.server_address[1]}/ "
+          f"（{service.workers} 個工作進程）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
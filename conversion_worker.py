@@ -0,0 +1,186 @@
+import os
+import time
+import queue
+import threading
+
+from slide_ir import read_slides
+from marp_markdown import slides_to_marp
+from marp_export import export_batch
+from export_executor import AsyncExportExecutor, print_stderr
+from text_input import output_base
+from image_assets import ImageResolver
+
+class ConversionCancelled(Exception):
+    """轉換被用戶取消"""
+
+class ConversionJob:
+    """一個排隊中的轉換任務"""
+    __slots__ = ('input_file', 'output_file', 'theme', 'formats', 'node_path',
+                 'status', 'timings', 'error', 'outputs', 'profile')
+
+    def __init__(self, input_file, output_file=None, theme="default", formats=(), node_path=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.theme = theme
+        self.formats = list(formats)
+        self.node_path = node_path
+        self.status = "排隊中"
+        self.timings = []
+        self.error = None
+        self.outputs = []
+        self.profile = None  # 啟用分析時為 profiling.Profiler
+
+    @property
+    def stage_count(self):
+        """任務包含的階段數：生成Markdown，以及可選的Marp導出"""
+        return 2 if self.formats else 1
+
+    def describe(self):
+        """返回用於界面顯示的一行文本"""
+        text = f"{os.path.basename(self.input_file)} — {self.status}"
+        if self.timings:
+            text += "（" + "，".join(f"{name} {elapsed:.2f}秒" for name, elapsed in self.timings) + "）"
+        if self.error:
+            text += f": {self.error}"
+        return text
+
+class ConversionWorker:
+    """
+    在後台線程中按順序執行轉換任務
+
+    界面線程只負責 submit() 和 cancel()，進度通過 on_event 回調通知：
+    on_event(event, job)，event 為 'start'、'stage'、'done'、'error' 或 'cancelled'。
+    回調在工作線程中執行，Tk界面應將事件轉交給主線程處理。
+
+    persistent 為True時Marp導出交給常駐的 marp_worker.MarpWorker（每個Node.js路徑一個），
+    連續轉換不必每次重新啟動Node和Chromium。
+    profile 為True時每個任務都在 profiling.Profiler 下執行，結果保存在 job.profile 中
+    """
+
+    def __init__(self, on_event, persistent=False, profile=False):
+        self._on_event = on_event
+        self._persistent = persistent
+        self._profile = profile
+        self._marp_workers = {}
+        self._jobs = queue.Queue()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._current = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """將任務加入隊列"""
+        self._jobs.put(job)
+
+    def cancel(self):
+        """取消當前任務和所有排隊中的任務，並終止正在運行的Marp進程"""
+        with self._lock:
+            if self._current is not None:
+                self._cancel.set()
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.status = "已取消"
+                self._on_event('cancelled', job)
+        with self._lock:
+            if self._executor is not None:
+                self._executor.cancel()
+            marp_workers = list(self._marp_workers.values()) if self._current is not None else []
+        for marp_worker in marp_workers:
+            marp_worker.cancel()
+
+    def close(self):
+        """停止工作線程，並關閉常駐的Marp進程"""
+        self._jobs.put(None)
+        with self._lock:
+            marp_workers, self._marp_workers = list(self._marp_workers.values()), {}
+        for marp_worker in marp_workers:
+            marp_worker.close()
+
+    def _marp_worker(self, node_path):
+        """返回指定Node.js路徑對應的常駐Marp進程，不存在時創建"""
+        if not self._persistent:
+            return None
+        with self._lock:
+            marp_worker = self._marp_workers.get(node_path)
+            if marp_worker is None:
+                from marp_worker import MarpWorker
+                marp_worker = self._marp_workers[node_path] = MarpWorker(node_path)
+            return marp_worker
+
+    def _check_cancelled(self):
+        if self._cancel.is_set():
+            raise ConversionCancelled()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                self._current = job
+            try:
+                if self._profile:
+                    from profiling import Profiler
+                    job.profile = Profiler()
+                    with job.profile:
+                        self._convert(job)
+                else:
+                    self._convert(job)
+            except ConversionCancelled:
+                job.status = "已取消"
+                self._on_event('cancelled', job)
+            except Exception as e:
+                if self._cancel.is_set():
+                    job.status = "已取消"
+                    self._on_event('cancelled', job)
+                else:
+                    job.status = "失敗"
+                    job.error = str(e)
+                    self._on_event('error', job)
+            else:
+                job.status = "完成"
+                self._on_event('done', job)
+            finally:
+                with self._lock:
+                    self._executor = None
+                    self._current = None
+                    self._cancel.clear()
+
+    def _convert(self, job):
+        job.status = "正在生成Markdown"
+        self._on_event('start', job)
+
+        # 生成Markdown
+        start = time.perf_counter()
+        output_file = job.output_file or output_base(job.input_file) + ".md"
+        md_file = slides_to_marp(read_slides(job.input_file), output_file, job.theme,
+                                 ImageResolver.for_input(job.input_file))
+        job.outputs.append(md_file)
+        job.timings.append(("Markdown", time.perf_counter() - start))
+        self._on_event('stage', job)
+        self._check_cancelled()
+
+        # PDF和PPTX同時導出
+        if job.formats:
+            job.status = "正在導出" + "/".join(fmt.upper() for fmt in job.formats)
+            self._on_event('stage', job)
+            start = time.perf_counter()
+            executor = AsyncExportExecutor(node_path=job.node_path, on_stderr=print_stderr)
+            with self._lock:
+                self._executor = executor
+                # 導出開始前已經取消時，執行器不會啟動進程
+                if self._cancel.is_set():
+                    executor.cancel()
+            outputs = export_batch([md_file], job.formats, executor=executor,
+                                   worker=self._marp_worker(job.node_path))
+            self._check_cancelled()
+            for fmt in job.formats:
+                job.outputs.extend(outputs[fmt])
+            job.timings.append(("/".join(fmt.upper() for fmt in job.formats), time.perf_counter() - start))
+            self._on_event('stage', job)
@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+from collections import deque
+
+from marp_export import EXPORT_FORMATS, marp_command, theme_set_args
+
+# 默認同時運行的Marp進程數；每個進程都會啟動自己的Chromium，內存佔用較大
+DEFAULT_CONCURRENCY = 2
+
+# 單次導出的默認超時時間（秒）
+DEFAULT_TIMEOUT = 600.0
+
+# 每次導出保留的stderr行數，用於錯誤信息
+STDERR_TAIL_LINES = 50
+
+class ExportError(Exception):
+    """Marp導出失敗；jobs 為失敗的 ExportJob 列表，其 stderr 保存了進程最後的錯誤輸出"""
+
+    def __init__(self, message, jobs=()):
+        super().__init__(message)
+        self.jobs = list(jobs)
+
+class ExportTimeout(ExportError):
+    """Marp導出超時，進程已被終止"""
+
+class ExportCancelled(ExportError):
+    """導出被 AsyncExportExecutor.cancel() 取消，進程已被終止"""
+
+class ExportJob:
+    """一次Marp導出：一個Markdown文件導出為一種格式"""
+    __slots__ = ('md_file', 'fmt', 'output_file', 'timeout', 'returncode', 'stderr', 'elapsed')
+
+    def __init__(self, md_file, fmt, output_file=None, timeout=None):
+        """
+        Args:
+            md_file: Markdown文件路徑
+            fmt: 'pdf' 或 'pptx'
+            output_file: 輸出文件路徑，如果為None則與Markdown文件同名
+            timeout: 超時時間（秒），如果為None則使用執行器的設置
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的導出格式: {fmt}")
+        self.md_file = md_file
+        self.fmt = fmt
+        self.output_file = output_file or os.path.splitext(md_file)[0] + "." + fmt
+        self.timeout = timeout
+        self.returncode = None
+        self.stderr = deque(maxlen=STDERR_TAIL_LINES)
+        self.elapsed = 0.0
+
+    def marp_args(self):
+        """返回Marp命令前綴之後的參數"""
+        return [self.md_file, f"--{self.fmt}", "--output", self.output_file]
+
+    def error_message(self):
+        """失敗時的提示，附上stderr的最後幾行"""
+        tail = [line for line in self.stderr if line.strip()][-5:]
+        message = EXPORT_FORMATS[self.fmt]
+        return message + ("\n" + "\n".join(tail) if tail else "")
+
+class BatchExportJob(ExportJob):
+    """
+    一次Marp調用把多個Markdown文件導出為同一種格式，Node和Chromium只啟動一次
+
+    輸出文件與各Markdown文件同目錄同名，output_file 為輸出文件路徑列表
+    """
+    __slots__ = ('md_files',)
+
+    def __init__(self, md_files, fmt, timeout=None):
+        """
+        Args:
+            md_files: Markdown文件路徑列表
+            fmt: 'pdf' 或 'pptx'
+            timeout: 超時時間（秒），如果為None則使用執行器的設置
+        """
+        self.md_files = list(md_files)
+        super().__init__(self.md_files[0], fmt, timeout=timeout)
+        self.output_file = [os.path.splitext(md_file)[0] + "." + fmt for md_file in self.md_files]
+
+    def marp_args(self):
+        return [f"--{self.fmt}"] + self.md_files
+
+def print_stderr(job, line):
+    """將Marp的錯誤輸出加上格式前綴後轉發到本進程的stderr，可作為 on_stderr 回調"""
+    print(f"[{job.fmt}] {line}", file=sys.stderr, flush=True)
+
+def kill_process(process):
+    """
+    終止Marp進程及其子進程（npx會再啟動Node和Chromium）
+
+    接受 subprocess.Popen 或asyncio的進程對象。進程在POSIX系統上運行於獨立的會話中
+    （start_new_session=True），因此可以整組終止
+    """
+    poll = getattr(process, 'poll', None)
+    if (poll() if poll is not None else process.returncode) is not None:
+        return
+    if os.name == 'posix':
+        import signal
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    try:
+        process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+class AsyncExportExecutor:
+    """
+    基於asyncio子進程的Marp導出執行器
+
+    直接以參數列表啟動Marp，不經過shell，路徑中的空格和特殊字符不需要轉義。
+    同時運行的進程數受 concurrency 限制，其餘導出排隊等待；每次導出有獨立的超時，
+    超時或取消時整個進程組被終止。stderr 逐行讀取，交給 on_stderr 回調並保留最後若干行。
+
+    用法：
+
+        executor = AsyncExportExecutor(concurrency=2, timeout=300)
+        outputs = executor.run_sync([ExportJob("a.md", "pdf"), ExportJob("a.md", "pptx")])
+
+    在協程中可以直接 await executor.run_all(jobs)；另一個線程可以調用 cancel() 取消正在進行的導出
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, node_path=None,
+                 use_npx=True, theme_set=(), on_stderr=None, command=None):
+        """
+        Args:
+            concurrency: 同時運行的Marp進程數上限
+            timeout: 每次導出的超時時間（秒），None表示不限制
+            node_path: Node.js可執行文件路徑
+            use_npx: 是否通過npx運行Marp CLI
+            theme_set: 傳給Marp --theme-set 的主題文件列表
+            on_stderr: 以 (ExportJob, 行) 為參數調用的回調，例如 print_stderr；在事件循環線程中調用
+            command: Marp命令前綴，默認為 marp_command() 的結果
+        """
+        self.concurrency = max(1, concurrency or DEFAULT_CONCURRENCY)
+        self.timeout = timeout
+        self.command = list(command) if command else marp_command(node_path, use_npx)
+        self.theme_set = list(theme_set)
+        self.on_stderr = on_stderr
+        self._loop = None
+        self._semaphore = None
+        self._tasks = set()
+        self._cancelled = False
+
+    def args(self, job):
+        """返回一次導出的完整命令參數"""
+        # --theme-set 會吞掉後面的位置參數，放在最後
+        return self.command + job.marp_args() + theme_set_args(self.theme_set)
+
+    def _limit(self):
+        import asyncio
+        # 信號量屬於創建它的事件循環，run_sync 每次都會創建新的循環
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _read_stderr(self, job, process):
+        while True:
+            try:
+                line = await process.stderr.readline()
+            except ValueError:
+                # 超長的行（例如進度條）只保留緩衝區中的部分
+                line = await process.stderr.read(64 * 1024)
+            if not line:
+                break
+            text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            job.stderr.append(text)
+            if self.on_stderr:
+                self.on_stderr(job, text)
+        await process.wait()
+
+    async def run(self, job):
+        """
+        運行一次導出
+
+        Returns:
+            輸出文件路徑
+
+        Raises:
+            ExportTimeout: 超時
+            ExportCancelled: 被 cancel() 取消
+            ExportError: Marp返回非零退出碼
+        """
+        import asyncio
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            # 先綁定事件循環再檢查取消標記：cancel() 要麼看到循環並取消本任務，要麼本任務看到標記
+            limit = self._limit()
+            if self._cancelled:
+                raise ExportCancelled("導出已取消", [job])
+            async with limit:
+                start = time.perf_counter()
+                popen_kwargs = {'start_new_session': True} if os.name == 'posix' else {}
+                process = await asyncio.create_subprocess_exec(
+                    *self.args(job), stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE, **popen_kwargs)
+                timeout = job.timeout if job.timeout is not None else self.timeout
+                try:
+                    await asyncio.wait_for(self._read_stderr(job, process), timeout)
+                except asyncio.TimeoutError:
+                    kill_process(process)
+                    await process.wait()
+                    raise ExportTimeout(f"{EXPORT_FORMATS[job.fmt]}（超過 {timeout:g} 秒）", [job])
+                except BaseException:
+                    # 被取消時不留下孤兒進程；等待進程退出，事件循環關閉前釋放子進程的管道
+                    kill_process(process)
+                    try:
+                        await process.wait()
+                    except asyncio.CancelledError:
+                        pass
+                    raise
+                finally:
+                    job.returncode = process.returncode
+                    job.elapsed = time.perf_counter() - start
+        except asyncio.CancelledError:
+            if not self._cancelled:
+                raise
+            raise ExportCancelled("導出已取消", [job]) from None
+        finally:
+            self._tasks.discard(task)
+
+        if job.returncode != 0:
+            raise ExportError(job.error_message(), [job])
+        return job.output_file
+
+    async def run_all(self, jobs):
+        """
+        同時運行多個導出，全部結束後再檢查結果
+
+        Returns:
+            與 jobs 順序一致的輸出文件路徑列表
+
+        Raises:
+            ExportError: 任何一個導出失敗時，包含所有失敗的任務
+        """
+        import asyncio
+        jobs = list(jobs)
+        results = await asyncio.gather(*(self.run(job) for job in jobs), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        failed = [(job, result) for job, result in zip(jobs, results) if isinstance(result, Exception)]
+        if len(failed) == 1:
+            raise failed[0][1]
+        if failed:
+            raise ExportError("；".join(dict.fromkeys(str(error) for _, error in failed)),
+                              [job for job, _ in failed])
+        return results
+
+    def run_sync(self, jobs):
+        """run_all 的同步版本，供命令行等非異步代碼使用；Ctrl+C 會終止所有Marp進程"""
+        # asyncio導入較慢，只在真正導出時才導入，不影響命令行的啟動時間
+        import asyncio
+        return asyncio.run(self.run_all(jobs))
+
+    def cancel(self):
+        """
+        取消所有正在運行和排隊的導出，可以從其他線程調用
+
+        被取消的導出以 ExportCancelled 結束；取消之後執行器不再啟動新的導出
+        """
+        self._cancelled = True
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        def cancel_tasks():
+            for task in list(self._tasks):
+                task.cancel()
+        try:
+            loop.call_soon_threadsafe(cancel_tasks)
+        except RuntimeError:
+            # 事件循環已經關閉
+            pass
+
+def run_exports(jobs, **kwargs):
+    """
+    同步運行一組導出
+
+    Args:
+        jobs: ExportJob 的可迭代對象
+        **kwargs: 傳給 AsyncExportExecutor 的參數
+
+    Returns:
+        與 jobs 順序一致的輸出文件路徑列表
+    """
+    return AsyncExportExecutor(**kwargs).run_sync(jobs)
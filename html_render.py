@@ -0,0 +1,330 @@
+import re
+from html import escape
+
+from slide_ir import BULLET, IMAGE, ORDERED, PLAIN, Paragraph, iter_slides
+from marp_markdown import CSS_STYLES, split_heading
+from text_input import open_text, output_base
+from profiling import stage
+
+# 幻燈片容器的樣式：與Marp默認主題相同的1280x720畫布，按窗口大小縮放，一次只顯示一張
+DECK_STYLES = """
+<style>
+* {
+    box-sizing: border-box;
+}
+html, body {
+    margin: 0;
+    padding: 0;
+    height: 100%;
+    background-color: #f0f0f0;
+    overflow: hidden;
+}
+#deck {
+    position: absolute;
+    left: 50%;
+    top: 50%;
+    width: 1280px;
+    height: 720px;
+    transform-origin: center center;
+}
+section {
+    display: none;
+    position: absolute;
+    inset: 0;
+    width: 1280px;
+    height: 720px;
+    overflow: hidden;
+    background-color: #fff;
+    color: #24292f;
+    font-size: 29px;
+    line-height: 1.5;
+    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2);
+}
+section.active {
+    display: block;
+}
+section h1, section h2, section h3, section h4, section h5, section h6 {
+    margin-top: 0;
+    line-height: 1.25;
+}
+section p, section ul, section ol {
+    margin-top: 0;
+    margin-bottom: 1em;
+}
+section ul, section ol {
+    padding-left: 2em;
+}
+section::after {
+    content: attr(data-page);
+    position: absolute;
+    right: 30px;
+    bottom: 21px;
+    font-size: 24px;
+    color: #777;
+}
+#controls {
+    position: fixed;
+    bottom: 10px;
+    left: 50%;
+    transform: translateX(-50%);
+    display: flex;
+    gap: 10px;
+    align-items: center;
+    font-family: Arial, sans-serif;
+}
+.nav-btn {
+    padding: 6px 16px;
+    font-size: 16px;
+    background-color: #4CAF50;
+    color: white;
+    border: none;
+    border-radius: 5px;
+    cursor: pointer;
+}
+.nav-btn:hover {
+    background-color: #45a049;
+}
+@media print {
+    html, body {
+        overflow: visible;
+        background: none;
+    }
+    #deck {
+        position: static;
+        transform: none !important;
+    }
+    section {
+        display: block;
+        position: relative;
+        box-shadow: none;
+        page-break-after: always;
+    }
+    #controls {
+        display: none;
+    }
+}
+</style>
+"""
+
+# 鍵盤和按鈕導航：←/→、PageUp/PageDown、空格、Home/End，當前頁碼保存在網址的 #序號 中
+DECK_SCRIPT = """
+<script>
+const slides = document.querySelectorAll('#deck > section');
+const deck = document.getElementById('deck');
+const counter = document.getElementById('counter');
+let current = 0;
+
+function showSlide(index) {
+    if (!slides.length) return;
+    current = Math.max(0, Math.min(slides.length - 1, index));
+    slides.forEach((slide, i) => slide.classList.toggle('active', i === current));
+    counter.textContent = (current + 1) + ' / ' + slides.length;
+    history.replaceState(null, '', '#' + (current + 1));
+}
+
+function fitDeck() {
+    const scale = Math.min(window.innerWidth / 1280, (window.innerHeight - 50) / 720);
+    deck.style.transform = 'translate(-50%, calc(-50% - 20px)) scale(' + scale + ')';
+}
+
+document.addEventListener('keydown', (event) => {
+    switch(event.key) {
+        case 'ArrowRight':
+        case 'ArrowDown':
+        case 'PageDown':
+        case ' ':
+            showSlide(current + 1);
+            break;
+        case 'ArrowLeft':
+        case 'ArrowUp':
+        case 'PageUp':
+            showSlide(current - 1);
+            break;
+        case 'Home':
+            showSlide(0);
+            break;
+        case 'End':
+            showSlide(slides.length - 1);
+            break;
+        default:
+            return;
+    }
+    event.preventDefault();
+});
+
+[['prev-btn', -1], ['next-btn', 1]].forEach(([id, step]) => {
+    ['touchstart', 'mousedown'].forEach(eventType => {
+        document.getElementById(id).addEventListener(eventType, (e) => {
+            e.preventDefault();
+            showSlide(current + step);
+        });
+    });
+});
+
+window.addEventListener('resize', fitDeck);
+fitDeck();
+showSlide((parseInt(location.hash.slice(1), 10) || 1) - 1);
+</script>
+"""
+
+# 行內語法：代碼、粗體、斜體
+_CODE_SPAN = re.compile(r'`([^`]+)`')
+_STRONG = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+_EM = re.compile(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\w)|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)')
+_INLINE_LEAD = frozenset('`*_')
+
+def _inline(text):
+    """將一行文本轉換為HTML，支持行內代碼、粗體和斜體，其餘字符轉義"""
+    if _INLINE_LEAD.isdisjoint(text):
+        return escape(text, quote=False)
+    parts = []
+    position = 0
+    for match in _CODE_SPAN.finditer(text):
+        parts.append(_emphasis(text[position:match.start()]))
+        parts.append(f"<code>{escape(match.group(1), quote=False)}</code>")
+        position = match.end()
+    parts.append(_emphasis(text[position:]))
+    return "".join(parts)
+
+def _emphasis(text):
+    text = escape(text, quote=False)
+    text = _STRONG.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    return _EM.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+
+def _image_sources(images):
+    """
+    返回將圖片路徑轉換為 <img> 地址的函數
+
+    能解析的圖片以 data: 地址內嵌，使HTML保持自包含；同一張圖片只編碼一次
+    """
+    encoded = {}
+    def image_src(path):
+        asset = images.resolve(path) if images is not None else None
+        if asset is None or not asset.content_type:
+            return path
+        src = encoded.get(asset.digest)
+        if src is None:
+            import base64
+            src = f"data:{asset.content_type};base64,{base64.b64encode(asset.read()).decode('ascii')}"
+            encoded[asset.digest] = src
+        return src
+    return image_src
+
+def render_section(slide, page_number, image_src=None):
+    """
+    將一張幻燈片轉換為HTML的 <section> 元素
+
+    結構與Marp渲染生成的Markdown一致：標題為h1（或標題自帶的#級別），
+    連續的列表項組成 ul/ol，其餘連續的內容行組成一個段落並保留換行，
+    每張圖片單獨成為一個段落
+
+    Args:
+        slide: slide_ir.Slide
+        page_number: 頁碼（從1開始）
+        image_src: 將圖片路徑轉換為 <img> 地址的函數，如果為None則使用原路徑
+    """
+    parts = [f'<section id="slide-{page_number}" data-page="{page_number}">']
+
+    paragraphs = slide.paragraphs
+    level, title = split_heading(slide.title.strip())
+    if level:
+        parts.append(f"<h{level}>{_inline(title)}</h{level}>")
+    elif title:
+        # 不是標題語法時，標題行和後面的普通內容行屬於同一個段落
+        paragraphs = [Paragraph("", title)] + paragraphs
+
+    # 按段落類型分組
+    group_kind = None
+    group = []
+    for paragraph in paragraphs + [None]:
+        kind = paragraph.kind if paragraph is not None else None
+        if group and (kind != group_kind or paragraph is None):
+            if group_kind == PLAIN:
+                parts.append("<p>" + "<br>\n".join(_inline(p.text.strip()) for p in group) + "</p>")
+            elif group_kind == IMAGE:
+                for p in group:
+                    alt, path = p.image
+                    src = image_src(path) if image_src is not None else path
+                    parts.append(f'<p><img src="{escape(src)}" alt="{escape(alt)}"></p>')
+            else:
+                tag = "ul" if group_kind == BULLET else "ol"
+                start = ""
+                if group_kind == ORDERED:
+                    number = group[0].marker.rstrip('.')
+                    if number != "1":
+                        start = f' start="{int(number)}"'
+                parts.append(f"<{tag}{start}>" + "".join(f"<li>{_inline(p.text.strip())}</li>" for p in group)
+                             + f"</{tag}>")
+            group = []
+        if paragraph is not None:
+            group_kind = kind
+            group.append(paragraph)
+
+    parts.append("</section>")
+    return "\n".join(parts)
+
+def write_html(slides, f, title=None, images=None):
+    """
+    將幻燈片逐張寫入自包含的HTML簡報
+
+    輸出只有一個文件，CSS、導航腳本和本地圖片都內嵌在其中，可以離線打開
+
+    Args:
+        slides: slide_ir.Slide 的可迭代對象，可以是生成器
+        f: 以文本模式打開的輸出文件對象
+        title: 頁面標題，如果為None則使用第一張幻燈片的標題
+        images: image_assets.ImageResolver，如果為None則圖片使用原路徑
+    """
+    image_src = _image_sources(images)
+    slides = iter(slides)
+    first = next(slides, None)
+    if title is None:
+        title = split_heading(first.title.strip())[1] if first is not None else ""
+
+    f.write('<!DOCTYPE html>\n<html lang="zh">\n<head>\n<meta charset="UTF-8">\n'
+            '<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+            f'<title>{escape(title)}</title>\n')
+    f.write(DECK_STYLES)
+    f.write(CSS_STYLES)
+    f.write('</head>\n<body>\n<div id="deck">\n')
+    if first is not None:
+        f.write(render_section(first, 1, image_src))
+        f.write("\n")
+        for page_number, slide in enumerate(slides, 2):
+            f.write(render_section(slide, page_number, image_src))
+            f.write("\n")
+    f.write('</div>\n<div id="controls">\n'
+            '<button id="prev-btn" class="nav-btn">←</button>\n'
+            '<span id="counter"></span>\n'
+            '<button id="next-btn" class="nav-btn">→</button>\n'
+            '</div>\n')
+    f.write(DECK_SCRIPT)
+    f.write('</body>\n</html>\n')
+
+def slides_to_html(slides, output_file, title=None, images=None):
+    """
+    將幻燈片寫入自包含的HTML文件
+
+    Args:
+        slides: slide_ir.Slide 的可迭代對象
+        output_file: 輸出的HTML文件路徑
+        title: 頁面標題，如果為None則使用第一張幻燈片的標題
+        images: image_assets.ImageResolver，見 write_html
+    """
+    with stage('html'), open(output_file, 'w', encoding='utf-8') as f:
+        write_html(slides, f, title, images)
+    return output_file
+
+def txt_to_html(input_file, output_file=None):
+    """
+    以串流方式將TXT文件直接轉換為HTML簡報
+
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的HTML文件路徑，如果為None則自動生成
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".html"
+    from image_assets import ImageResolver
+    with open_text(input_file) as f:
+        return slides_to_html(iter_slides(f), output_file, images=ImageResolver.for_input(input_file))
@@ -0,0 +1,383 @@
+import os
+import threading
+
+# 超過此尺寸（像素）的圖片會按比例縮小後再放入簡報
+MAX_IMAGE_SIZE = (1920, 1080)
+
+# PPTX可以直接嵌入的格式；其他格式需要Pillow轉換為PNG
+PPTX_FORMATS = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg',
+                'gif': 'image/gif', 'bmp': 'image/bmp'}
+
+# 讀取圖片計算哈希時的塊大小
+_CHUNK_SIZE = 1 << 20
+
+# 圖片緩存的默認大小上限
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Markdown輸出旁存放處理後圖片的子目錄，Markdown以相對路徑引用其中的文件
+ASSET_DIR = "assets"
+
+def default_asset_dir():
+    """默認的圖片緩存目錄，可通過環境變量 TXT_TO_MARP_ASSETS 覆蓋"""
+    return os.environ.get('TXT_TO_MARP_ASSETS') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'txt_to_marp_assets')
+
+def _file_digest(path):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Asset:
+    """
+    緩存中的一張圖片
+
+    path 指向緩存中（可能已縮小的）文件，digest 是原圖內容的哈希，
+    內容相同的圖片無論來自哪個路徑都對應同一個 Asset
+    """
+    __slots__ = ('path', 'digest', 'ext', 'size')
+
+    def __init__(self, path, digest, ext, size):
+        self.path = path
+        self.digest = digest
+        self.ext = ext
+        self.size = size  # (寬, 高) 像素，無法讀取時為None
+
+    @property
+    def content_type(self):
+        return PPTX_FORMATS.get(self.ext)
+
+    @property
+    def filename(self):
+        """以內容哈希命名的文件名，內容相同的圖片文件名相同"""
+        return os.path.basename(self.path)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+class AssetCache:
+    """
+    以內容哈希為鍵的圖片緩存
+
+    每張圖片只在第一次遇到時處理一次：超過 max_size 的圖片用Pillow按比例縮小，
+    PPTX不支持的格式（例如WebP）轉換為PNG，結果以 哈希.擴展名 保存在緩存目錄中，
+    之後的轉換（包括其他簡報）直接使用緩存文件。沒有安裝Pillow時圖片原樣複製。
+    prepare() 用線程池並行處理一批圖片，哈希計算和Pillow的編解碼都會釋放GIL。
+    寫入新文件後總大小超過 max_bytes 時按最近最少使用(LRU)的順序刪除，
+    本進程正在使用的圖片不會被刪除
+    """
+
+    def __init__(self, cache_dir=None, max_size=MAX_IMAGE_SIZE, workers=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir: 緩存目錄，如果為None則使用 default_asset_dir()
+            max_size: (寬, 高) 像素上限，None表示不縮小
+            workers: 線程池大小，如果為None則使用CPU核心數
+            max_bytes: 緩存目錄的大小上限
+        """
+        self.cache_dir = cache_dir or default_asset_dir()
+        self.max_size = tuple(max_size) if max_size else None
+        self.workers = workers or os.cpu_count() or 1
+        self.max_bytes = max_bytes
+        self._assets = {}  # (絕對路徑, 修改時間, 大小) -> Asset
+        self._lock = threading.Lock()
+
+    def _variant_dir(self):
+        name = "%dx%d" % self.max_size if self.max_size else "original"
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, path):
+        """
+        返回圖片對應的 Asset，需要時處理並寫入緩存
+
+        Args:
+            path: 圖片文件路徑
+
+        Returns:
+            Asset，文件不存在或無法讀取時返回None
+        """
+        asset, written = self._get(path)
+        if written:
+            self.evict()
+        return asset
+
+    def _get(self, path):
+        """返回 (Asset或None, 是否寫入了新的緩存文件)"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, False
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            asset = self._assets.get(key)
+        if asset is not None:
+            return asset, False
+        asset, written = self._process(path)
+        with self._lock:
+            self._assets[key] = asset
+        return asset, written
+
+    def prepare(self, paths):
+        """
+        用線程池並行處理一批圖片
+
+        Args:
+            paths: 圖片文件路徑的可迭代對象，重複的路徑只處理一次
+
+        Returns:
+            路徑到 Asset（或None）的字典
+        """
+        unique = list(dict.fromkeys(paths))
+        if len(unique) <= 1 or self.workers == 1:
+            results = [self._get(path) for path in unique]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(unique))) as executor:
+                results = list(executor.map(self._get, unique))
+        # 整批處理完後只清理一次
+        if any(written for _, written in results):
+            self.evict()
+        return {path: asset for path, (asset, _) in zip(unique, results)}
+
+    def evict(self):
+        """刪除最久未使用的緩存文件，直到總大小不超過上限；本進程使用中的圖片不刪除"""
+        with self._lock:
+            in_use = {asset.path for asset in self._assets.values() if asset is not None}
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path in in_use:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def _process(self, path):
+        """處理一張圖片，返回 (Asset或None, 是否寫入了新的緩存文件)"""
+        try:
+            digest = _file_digest(path)
+        except OSError:
+            return None, False
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        if ext == 'jpeg':
+            ext = 'jpg'
+        directory = os.path.join(self._variant_dir(), digest[:2])
+
+        # 已經處理過的圖片：縮小或轉換的結果擴展名可能不同
+        for candidate in (ext, 'png'):
+            cached = os.path.join(directory, f"{digest}.{candidate}")
+            try:
+                # 更新修改時間，清理時按最近使用的順序保留
+                os.utime(cached)
+            except OSError:
+                continue
+            return Asset(cached, digest, candidate, _image_size(cached)), False
+
+        data, out_ext, size = _downscale(path, ext, self.max_size)
+        cached = os.path.join(directory, f"{digest}.{out_ext}")
+        os.makedirs(directory, exist_ok=True)
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if data is None:
+                    with open(path, 'rb') as src:
+                        for chunk in iter(lambda: src.read(_CHUNK_SIZE), b''):
+                            f.write(chunk)
+                else:
+                    f.write(data)
+            # 多個線程或進程同時處理同一張圖片時，結果相同，後寫入的覆蓋即可
+            os.replace(tmp_path, cached)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return Asset(cached, digest, out_ext, size or _image_size(cached)), True
+
+def _downscale(path, ext, max_size):
+    """
+    需要時縮小或轉換圖片
+
+    Returns:
+        (新的圖片字節或None表示原樣使用, 擴展名, (寬, 高)或None)
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, ext, None
+
+    try:
+        with Image.open(path) as image:
+            size = image.size
+            oversized = max_size is not None and (size[0] > max_size[0] or size[1] > max_size[1])
+            if ext in PPTX_FORMATS and not oversized:
+                return None, ext, size
+            # 動畫GIF縮小後只保留第一幀，因此不處理
+            if ext == 'gif' and getattr(image, 'is_animated', False):
+                return None, ext, size
+            image.load()
+            if oversized:
+                image.thumbnail(max_size, Image.LANCZOS)
+            import io
+            buffer = io.BytesIO()
+            if ext in ('jpg', 'jpeg') and image.mode in ('RGB', 'L', 'CMYK'):
+                image.save(buffer, 'JPEG', quality=85, optimize=True)
+                out_ext = 'jpg'
+            else:
+                if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                    image = image.convert('RGBA')
+                image.save(buffer, 'PNG', optimize=True)
+                out_ext = 'png'
+            return buffer.getvalue(), out_ext, image.size
+    except (OSError, ValueError):
+        # Pillow無法解碼的文件原樣使用
+        return None, ext, None
+
+def _image_size(path):
+    """讀取圖片的像素尺寸，只解析文件頭"""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        try:
+            with Image.open(path) as image:
+                return image.size
+        except (OSError, ValueError):
+            return None
+    try:
+        from pptx.parts.image import Image as PptxImage
+        return PptxImage.from_file(path).size
+    except Exception:
+        return None
+
+# 不屬於本地文件的圖片地址，原樣保留
+_REMOTE_PREFIXES = ('http://', 'https://', 'data:', 'file:')
+
+_default_cache = None
+
+def default_cache():
+    """進程內共享的默認 AssetCache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AssetCache()
+    return _default_cache
+
+class ImageResolver:
+    """
+    將簡報中寫的圖片路徑解析為緩存中的 Asset
+
+    相對路徑以輸入文件所在目錄為基準，網址原樣保留。
+    Markdown不引用緩存目錄中的文件：處理後的圖片複製到Markdown輸出旁的 assets 目錄，
+    以相對路徑引用，Markdown移動到其他機器上仍然可以渲染
+    """
+
+    def __init__(self, base_dir, cache=None, output_dir=None):
+        """
+        Args:
+            base_dir: 相對圖片路徑的基準目錄，通常是輸入文件所在目錄
+            cache: AssetCache，如果為None則使用 default_cache()
+            output_dir: Markdown輸出所在的目錄，如果為None則與 base_dir 相同
+        """
+        self.base_dir = base_dir
+        self.cache = cache or default_cache()
+        self.output_dir = output_dir or base_dir
+
+    @classmethod
+    def for_input(cls, input_file, cache=None):
+        """以輸入文件（可以是zip成員）所在目錄為基準"""
+        from text_input import split_archive_path
+        return cls(os.path.dirname(os.path.abspath(split_archive_path(input_file)[0])), cache)
+
+    def for_output(self, output_file):
+        """返回Markdown寫入 output_file 時使用的解析器，共用同一個緩存"""
+        return ImageResolver(self.base_dir, self.cache, os.path.dirname(os.path.abspath(output_file)))
+
+    def local_path(self, path):
+        """返回本地圖片的絕對路徑，網址返回None"""
+        if path.startswith(_REMOTE_PREFIXES):
+            return None
+        return os.path.join(self.base_dir, os.path.expanduser(path))
+
+    def resolve(self, path):
+        """返回圖片對應的 Asset，網址或不存在的文件返回None"""
+        local = self.local_path(path)
+        return self.cache.get(local) if local else None
+
+    def prepare(self, slides):
+        """用線程池預先處理幻燈片列表中的所有本地圖片"""
+        paths = [self.local_path(path) for slide in slides for _, path in slide.images]
+        self.cache.prepare(path for path in paths if path)
+
+    def marp_path(self, path):
+        """
+        Markdown中使用的圖片地址，無法解析時保持原樣
+
+        處理後的圖片複製到 output_dir 下的 assets 目錄（已存在時不再複製），
+        返回相對於 output_dir 的地址。文件名是內容哈希，圖片改變時地址隨之改變
+        """
+        asset = self.resolve(path)
+        if asset is None:
+            return path
+        target = os.path.join(self.output_dir, ASSET_DIR, asset.filename)
+        if not os.path.exists(target):
+            _publish(asset.path, target)
+        return f"{ASSET_DIR}/{asset.filename}"
+
+def copy_assets(md_file, target_dir):
+    """
+    將Markdown引用的 assets 目錄中的圖片複製到 target_dir 下
+
+    在其他目錄中導出Markdown的副本時使用（構建緩存的臨時目錄、常駐Marp進程的工作目錄），
+    副本中的相對地址仍然有效
+
+    Args:
+        md_file: Markdown文件路徑
+        target_dir: Markdown副本所在的目錄
+    """
+    import re
+    import shutil
+    with open(md_file, encoding='utf-8') as f:
+        names = set(re.findall(r'\]\(' + ASSET_DIR + r'/([^/)\s]+)\)', f.read()))
+    if not names:
+        return
+    source_dir = os.path.join(os.path.dirname(os.path.abspath(md_file)), ASSET_DIR)
+    os.makedirs(os.path.join(target_dir, ASSET_DIR), exist_ok=True)
+    for name in names:
+        source = os.path.join(source_dir, name)
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(target_dir, ASSET_DIR, name))
+
+def _publish(src, target):
+    """將緩存文件複製到輸出目錄，先寫臨時文件再原子替換，並行的轉換不會讀到寫了一半的圖片"""
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    # 不使用 mkstemp：它創建的文件只有所有者可讀，輸出文件應與普通 open() 一樣遵循umask
+    tmp_path = os.path.join(directory, f".tmp-{os.urandom(8).hex()}")
+    try:
+        with open(src, 'rb') as f, open(tmp_path, 'xb') as out:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                out.write(chunk)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
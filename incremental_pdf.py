@@ -0,0 +1,263 @@
+import io
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+
+from build_cache import BuildCache, write_if_changed
+from export_executor import DEFAULT_TIMEOUT, ExportJob, print_stderr, run_exports
+from marp_export import marp_command, marp_version
+from marp_markdown import SLIDE_BREAK
+from pdf_merge import PdfMerger, PdfReader
+from profiling import stage
+
+# 緩存條目的擴展名：一次渲染得到的PDF（批次），以及幻燈片指向批次中頁面的指針
+BATCH_EXT = ".batch.pdf"
+PAGE_EXT = ".page"
+
+# 合併結果引用的批次超過此數時全部重新渲染：每個批次帶有各自的字體子集，
+# 經過多次編輯後合併的文件會越來越大
+MAX_BATCHES = 32
+
+# 指針格式的版本，改變時舊的條目全部失效
+_FORMAT = "incremental-pdf-1"
+
+_PAGINATE = re.compile(r'^paginate:[ \t]*true[ \t]*$', re.M)
+_THEME = re.compile(r'^theme:[ \t]*(\S*)[ \t]*$', re.M)
+# 改變頁碼樣式的CSS：頁碼是 section::after 偽元素
+_PAGE_NUMBER_STYLE = re.compile(r'::?after')
+_GLOBAL_STYLE = re.compile(r'\A\s*<style>.*?</style>\s*', re.S)
+# 幻燈片中的Marp指令註釋，例如 <!-- class: lead --> 或 <!-- _paginate: false -->
+_DIRECTIVE = re.compile(r'<!--\s*[_$]?[A-Za-z][\w-]*\s*:')
+_FENCE = re.compile(r'`{3,}|~{3,}')
+
+def split_marp(text):
+    """
+    將Marp Markdown拆分為頭部和各張幻燈片
+
+    頭部包括front-matter和第一張幻燈片之前的全局 <style>。幻燈片以前面是空行的
+    單獨一行 --- 分隔（緊跟在文字後面的 --- 是標題下劃線），代碼塊中的不算
+
+    Returns:
+        (頭部, 幻燈片Markdown列表)，每張幻燈片去掉首尾空行後以換行符結尾
+    """
+    lines = text.replace('\r\n', '\n').split('\n')
+    head = ""
+    start = 0
+    if lines[0].rstrip() == '---':
+        for i in range(1, len(lines)):
+            if lines[i].rstrip() == '---':
+                head = "\n".join(lines[:i + 1]) + "\n\n"
+                start = i + 1
+                break
+
+    pages = []
+    current = []
+    fence = None
+    for line in lines[start:]:
+        stripped = line.strip()
+        if fence is None and stripped == '---' and (not current or not current[-1].strip()):
+            pages.append(current)
+            current = []
+            continue
+        match = _FENCE.match(stripped)
+        if match:
+            if fence is None:
+                fence = match.group()[0]
+            elif match.group()[0] == fence:
+                fence = None
+        current.append(line)
+    pages.append(current)
+    pages = ["\n".join(page).strip('\n') for page in pages]
+
+    style = _GLOBAL_STYLE.match(pages[0])
+    if style:
+        head += style.group().strip('\n') + "\n\n"
+        pages[0] = pages[0][style.end():]
+    return head, [page + "\n" for page in pages]
+
+def stamps_like_marp(head, theme_set=()):
+    """
+    判斷合併時蓋印的頁碼能否與Marp渲染的一致
+
+    pdf_merge.PdfMerger 按Marp內置 default 主題的位置、字號和顏色蓋印頁碼；gaia、uncover、
+    --theme-set 指定的主題文件或改寫 section::after 的樣式都會改變頁碼的樣子
+
+    Args:
+        head: split_marp() 返回的頭部
+        theme_set: 傳給Marp --theme-set 的主題文件列表
+    """
+    theme = _THEME.search(head)
+    if theme is not None and theme.group(1) not in ("", "default"):
+        return False
+    return not theme_set and _PAGE_NUMBER_STYLE.search(head) is None
+
+def marp_renderer(node_path=None, use_npx=True, theme_set=(), timeout=DEFAULT_TIMEOUT):
+    """
+    返回通過Marp CLI將Markdown導出為PDF的渲染函數 render(md_file, pdf_file)
+
+    Args:
+        node_path: Node.js可執行文件路徑
+        use_npx: 是否通過npx運行Marp CLI
+        theme_set: 傳給Marp --theme-set 的主題文件列表
+        timeout: 每次導出的超時時間（秒）
+    """
+    def render(md_file, pdf_file):
+        run_exports([ExportJob(md_file, 'pdf', pdf_file)], node_path=node_path, use_npx=use_npx,
+                    theme_set=theme_set, timeout=timeout, on_stderr=print_stderr)
+    return render
+
+def _renderer_id(renderer):
+    """渲染函數的標識，參與緩存鍵，不同渲染器的結果不會混用"""
+    target = getattr(renderer, 'func', renderer)
+    return f"{getattr(target, '__module__', '')}.{getattr(target, '__qualname__', type(target).__name__)}"
+
+def _lookup(cache, key):
+    """返回緩存中幻燈片所在的 (批次鍵, 頁序號)，指針或批次不存在時返回None"""
+    path = cache.lookup(key, PAGE_EXT)
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='ascii') as f:
+            batch, index = f.read().split()
+    except (OSError, ValueError):
+        return None
+    if cache.lookup(batch, BATCH_EXT) is None:
+        return None
+    return batch, int(index)
+
+def _read_batch(cache, batch):
+    """讀取緩存中的批次PDF，不存在或無法解析時返回None"""
+    path = cache.lookup(batch, BATCH_EXT)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return PdfReader(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _render_batch(renderer, md_file, head, pages):
+    """
+    渲染一批幻燈片，返回PDF的字節
+
+    臨時Markdown寫在原文件所在的目錄中，相對路徑的圖片仍然有效
+    """
+    directory = os.path.dirname(os.path.abspath(md_file))
+    fd, batch_md = tempfile.mkstemp(dir=directory, prefix='.incremental-', suffix='.md')
+    pdf_dir = tempfile.mkdtemp()
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(head + SLIDE_BREAK.join(pages))
+        pdf_file = os.path.join(pdf_dir, 'batch.pdf')
+        renderer(batch_md, pdf_file)
+        with open(pdf_file, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(batch_md)
+        shutil.rmtree(pdf_dir, ignore_errors=True)
+
+def export_pdf_incremental(md_file, output_file=None, cache=None, renderer=None, node_path=None,
+                           use_npx=True, theme_set=(), timeout=DEFAULT_TIMEOUT):
+    """
+    逐頁增量導出PDF：只重新渲染新增或改變了的幻燈片
+
+    每張幻燈片以 其Markdown + 頭部（主題、樣式）+ 主題文件內容 + 渲染器 的哈希為鍵。
+    緩存中沒有的幻燈片合在一個Markdown文件中只調用一次渲染器，得到的PDF作為一個批次存入
+    緩存，每張幻燈片記錄指向批次中頁面的指針。最後用 pdf_merge.PdfMerger 按順序複製
+    各頁合併為輸出文件，因此導出時間與改動的幻燈片數成正比，而不是與總頁數成正比。
+
+    頁碼不能隨幻燈片緩存（插入一張幻燈片會改變之後所有頁面的頁碼），批次以
+    paginate: false 渲染，頁碼在合併時蓋印。圖片以內容哈希命名的地址引用
+    （見 image_assets.ImageResolver.marp_path），圖片改變時幻燈片的Markdown也隨之改變。
+
+    幻燈片中含有Marp指令註釋時（指令會影響之後的幻燈片），需要頁碼但頁碼的樣子與
+    default 主題不同時（見 stamps_like_marp），或者Marp輸出的頁數與拆分的幻燈片數
+    不一致時，改為整份渲染
+
+    Args:
+        md_file: Marp Markdown文件路徑
+        output_file: 輸出的PDF文件路徑，如果為None則與Markdown文件同名
+        cache: BuildCache，如果為None則使用默認緩存目錄
+        renderer: 渲染函數 render(md_file, pdf_file)，如果為None則使用Marp CLI（見 marp_renderer）
+        node_path: Node.js可執行文件路徑
+        use_npx: 是否通過npx運行Marp CLI
+        theme_set: 傳給Marp --theme-set 的主題文件列表，其內容參與緩存鍵
+        timeout: 每次Marp導出的超時時間（秒）
+
+    Returns:
+        (PDF文件路徑, 重新渲染的幻燈片數, 總頁數)
+    """
+    if output_file is None:
+        output_file = os.path.splitext(md_file)[0] + ".pdf"
+    if cache is None:
+        cache = BuildCache()
+    if renderer is None:
+        renderer = marp_renderer(node_path, use_npx, theme_set, timeout)
+        renderer_id = " ".join(marp_command(node_path, use_npx) + [marp_version(node_path, use_npx)])
+    else:
+        renderer_id = _renderer_id(renderer)
+
+    with open(md_file, encoding='utf-8') as f:
+        head, pages = split_marp(f.read())
+    paginate = _PAGINATE.search(head) is not None
+    if (any(_DIRECTIVE.search(page) for page in pages)
+            or paginate and not stamps_like_marp(head, theme_set)):
+        with stage('marp pdf'):
+            renderer(md_file, output_file)
+        return output_file, len(pages), len(pages)
+
+    render_head = _PAGINATE.sub('paginate: false', head)
+    identity = hashlib.sha256(f"{_FORMAT}\0{renderer_id}\0".encode('utf-8'))
+    for path in theme_set:
+        with open(path, 'rb') as f:
+            identity.update(f.read())
+    identity = identity.hexdigest()
+    keys = [cache.key(page.encode('utf-8'), "", render_head, identity) for page in pages]
+
+    with stage('lookup'):
+        locations = {}
+        for key in keys:
+            if key not in locations:
+                location = _lookup(cache, key)
+                if location is not None:
+                    locations[key] = location
+        # 先讀入需要的舊批次，之後存入新批次時的清理不會影響本次合併
+        readers = {}
+        for batch in {batch for batch, _ in locations.values()}:
+            reader = _read_batch(cache, batch)
+            if reader is not None:
+                readers[batch] = reader
+        locations = {key: location for key, location in locations.items() if location[0] in readers}
+        missing = list(dict.fromkeys(key for key in keys if key not in locations))
+        if len(readers) + bool(missing) > MAX_BATCHES:
+            locations, readers, missing = {}, {}, list(dict.fromkeys(keys))
+
+    if missing:
+        markdown = dict(zip(keys, pages))
+        with stage('marp pdf'):
+            data = _render_batch(renderer, md_file, render_head, [markdown[key] for key in missing])
+        reader = PdfReader(data)
+        if len(reader.pages) != len(missing):
+            # 幻燈片的拆分與Marp不一致，整份渲染
+            with stage('marp pdf'):
+                renderer(md_file, output_file)
+            return output_file, len(pages), len(pages)
+        batch = hashlib.sha256("\0".join(missing).encode('ascii')).hexdigest()
+        for i, key in enumerate(missing):
+            cache.write(key, PAGE_EXT, f"{batch} {i}\n".encode('ascii'))
+            locations[key] = (batch, i)
+        cache.write(batch, BATCH_EXT, data)
+        cache.evict()
+        readers[batch] = reader
+
+    with stage('merge'):
+        buffer = io.BytesIO()
+        merger = PdfMerger(buffer)
+        for number, key in enumerate(keys, 1):
+            batch, index = locations[key]
+            merger.add_page(readers[batch], index, str(number) if paginate else None)
+        merger.close()
+        write_if_changed(output_file, buffer.getvalue())
+    return output_file, len(missing), len(keys)
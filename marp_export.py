@@ -0,0 +1,155 @@
+import os
+import threading
+
+from profiling import stage
+
+# 每次Marp調用最多處理的文件數，避免超出命令行長度限制
+MAX_FILES_PER_RUN = 200
+
+# 所有Marp調用共用的選項：允許讀取本地圖片（緩存中的圖片以 file:// 地址引用）
+MARP_OPTIONS = ["--allow-local-files"]
+
+# 查詢Marp CLI版本的超時時間（秒），npx首次運行時可能需要下載
+VERSION_TIMEOUT = 120
+
+# 支持的導出格式及錯誤提示
+EXPORT_FORMATS = {
+    'pdf': "轉換PDF失敗，請確保已安裝Node.js和npm",
+    'pptx': "轉換PPTX失敗，請確保已安裝Node.js和npm",
+}
+
+def marp_command(node_path=None, use_npx=True):
+    """
+    構建調用Marp CLI的命令前綴
+
+    Args:
+        node_path: Node.js可執行文件路徑，如果為None則使用系統PATH中的npx
+        use_npx: 是否通過npx運行，False時直接調用全局安裝的marp
+    """
+    if not use_npx:
+        return ["marp"] + MARP_OPTIONS
+    if node_path and os.path.exists(node_path):
+        return [os.path.join(os.path.dirname(node_path), "npx"), "@marp-team/marp-cli"] + MARP_OPTIONS
+    return ["npx", "@marp-team/marp-cli"] + MARP_OPTIONS
+
+_marp_versions = {}
+_marp_versions_lock = threading.Lock()
+
+def marp_version(node_path=None, use_npx=True):
+    """
+    返回Marp CLI的版本，每個進程中每種命令只運行一次 --version
+
+    npx運行的 @marp-team/marp-cli 沒有鎖定版本，升級後導出的PDF/PPTX可能不同，
+    緩存鍵需要包含實際使用的版本。查詢失敗時返回空字符串，由之後的導出報告錯誤
+
+    Args:
+        node_path: Node.js可執行文件路徑，如果為None則使用系統PATH中的npx
+        use_npx: 是否通過npx運行，False時直接調用全局安裝的marp
+    """
+    command = marp_command(node_path, use_npx)
+    key = tuple(command)
+    with _marp_versions_lock:
+        if key not in _marp_versions:
+            import subprocess
+            try:
+                result = subprocess.run(command[:len(command) - len(MARP_OPTIONS)] + ["--version"],
+                                        stdin=subprocess.DEVNULL, capture_output=True, text=True,
+                                        timeout=VERSION_TIMEOUT)
+                _marp_versions[key] = result.stdout.strip() if result.returncode == 0 else ""
+            except (OSError, subprocess.TimeoutExpired):
+                _marp_versions[key] = ""
+        return _marp_versions[key]
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _export_with_worker(md_files, formats, worker):
+    """通過常駐的Marp進程導出，不同格式在各自的線程中同時進行"""
+    import threading
+
+    errors = {}
+    def run(fmt):
+        try:
+            for md_file in md_files:
+                worker.export(md_file, fmt)
+        except Exception as e:
+            errors[fmt] = e
+
+    threads = [threading.Thread(target=run, args=(fmt,)) for fmt in formats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        # 錯誤信息中列出每種格式失敗的原因，並保留第一個異常
+        failed = [fmt for fmt in formats if fmt in errors]
+        reasons = [errors[fmt].__cause__ or errors[fmt] for fmt in failed]
+        raise Exception("；".join(f"{EXPORT_FORMATS[fmt]}（{reason}）" for fmt, reason in zip(failed, reasons))) \
+            from errors[failed[0]]
+
+    return {fmt: [os.path.splitext(md_file)[0] + "." + fmt for md_file in md_files]
+            for fmt in formats}
+
+def theme_set_args(theme_set):
+    """
+    將主題文件列表轉換為Marp的 --theme-set 參數
+
+    --theme-set 接受多個值，會吞掉後面的位置參數，因此必須放在命令的最後
+    """
+    return ["--theme-set"] + list(theme_set) if theme_set else []
+
+def export_batch(md_files, formats=('pdf', 'pptx'), node_path=None, use_npx=True, executor=None,
+                 worker=None, theme_set=()):
+    """
+    使用盡量少的Marp CLI調用批量導出多個Markdown文件
+
+    每種格式只啟動一次Marp（文件很多時按 MAX_FILES_PER_RUN 分組），
+    不同格式的導出同時進行，輸出文件與Markdown文件位於同一目錄。
+    進程由 export_executor.AsyncExportExecutor 運行，超時按每組的文件數累加。
+    指定 worker 時改為交給常駐的Marp進程導出，不再啟動新進程
+
+    Args:
+        md_files: Markdown文件路徑列表
+        formats: 導出格式，'pdf' 和/或 'pptx'
+        node_path: Node.js可執行文件路徑，如果為None則使用系統PATH中的npx
+        use_npx: 是否通過npx運行Marp CLI
+        executor: export_executor.AsyncExportExecutor，可以從其他線程調用其 cancel() 取消導出；
+            指定時忽略 node_path、use_npx 和 theme_set
+        worker: marp_worker.MarpWorker，指定時忽略 node_path、use_npx、executor 和 theme_set
+            （主題文件需要在創建常駐進程時通過其命令傳入）
+        theme_set: 傳給Marp --theme-set 的主題文件列表，見 theme_registry
+
+    Returns:
+        格式到輸出文件路徑列表的字典
+    """
+    for fmt in formats:
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的導出格式: {fmt}")
+
+    # 整個導出作為一個分析階段，Marp進程的CPU時間計入其中的 children_cpu
+    with stage('marp'):
+        if worker is not None:
+            return _export_with_worker(list(md_files), formats, worker)
+
+        # export_executor 導入了本模塊，在函數中導入以避免循環導入
+        from export_executor import AsyncExportExecutor, BatchExportJob, ExportJob, print_stderr
+
+        md_files = list(md_files)
+        if executor is None:
+            executor = AsyncExportExecutor(node_path=node_path, use_npx=use_npx, theme_set=theme_set,
+                                           on_stderr=print_stderr)
+        jobs = []
+        for fmt in formats:
+            for group in _chunks(md_files, MAX_FILES_PER_RUN):
+                timeout = executor.timeout * len(group) if executor.timeout is not None else None
+                if len(group) == 1:
+                    # 單個文件時Marp需要顯式指定輸出路徑
+                    jobs.append(ExportJob(group[0], fmt, timeout=timeout))
+                else:
+                    jobs.append(BatchExportJob(group, fmt, timeout=timeout))
+        # 全部結束後才拋出錯誤，不會留下孤兒進程
+        executor.run_sync(jobs)
+
+        return {fmt: [os.path.splitext(md_file)[0] + "." + fmt for md_file in md_files]
+                for fmt in formats}
@@ -0,0 +1,208 @@
+import re
+
+from slide_ir import IMAGE_PREFIX
+from profiling import stage, timed_writes
+
+# Marp簡報的CSS樣式
+CSS_STYLES = """
+<style>
+/* 全局樣式 */
+section {
+    font-family: 'Arial', sans-serif;
+    padding: 40px;
+}
+
+/* 標題樣式 */
+h1 {
+    color: #2c3e50;
+    font-size: 2.5em;
+    margin-bottom: 0.5em;
+}
+
+h2 {
+    color: #3498db;
+    font-size: 2em;
+    margin-bottom: 0.5em;
+}
+
+/* 列表樣式 */
+ul, ol {
+    margin-left: 1.5em;
+    line-height: 1.6;
+}
+
+li {
+    margin-bottom: 0.5em;
+}
+
+/* 強調文本 */
+strong {
+    color: #e74c3c;
+}
+
+em {
+    color: #27ae60;
+}
+
+/* 代碼塊 */
+code {
+    background-color: #f8f8f8;
+    border-radius: 3px;
+    padding: 0.2em 0.4em;
+    font-family: 'Courier New', monospace;
+}
+
+/* 引用塊 */
+blockquote {
+    border-left: 5px solid #3498db;
+    padding-left: 1em;
+    color: #7f8c8d;
+    font-style: italic;
+}
+
+/* 表格樣式 */
+table {
+    border-collapse: collapse;
+    width: 100%;
+    margin: 1em 0;
+}
+
+th, td {
+    border: 1px solid #ddd;
+    padding: 8px 12px;
+    text-align: left;
+}
+
+th {
+    background-color: #f2f2f2;
+    font-weight: bold;
+}
+
+/* 圖片樣式 */
+img {
+    max-width: 100%;
+    height: auto;
+    display: block;
+    margin: 0 auto;
+}
+
+/* 頁腳樣式 */
+footer {
+    position: absolute;
+    bottom: 20px;
+    right: 20px;
+    font-size: 0.8em;
+    color: #95a5a6;
+}
+</style>
+
+"""
+
+def marp_header(theme):
+    """創建Marp頭部"""
+    return f"""---
+marp: true
+theme: {theme}
+paginate: true
+backgroundColor: #fff
+---
+
+"""
+
+# 幻燈片之間的分隔符
+SLIDE_BREAK = "\n---\n\n"
+
+# Markdown標題語法：1到6個#加空白
+_HEADING = re.compile(r'(#{1,6})[ \t]+(.*)')
+
+def split_heading(title):
+    """
+    判斷幻燈片標題在生成的Markdown中渲染成什麼
+
+    不以#開頭的標題會被加上 '# ' 成為h1；已經以#開頭的標題保持原樣，
+    符合標題語法時為對應級別的標題，否則（例如 '#tag'）只是普通段落
+
+    Returns:
+        (標題級別, 文本)，級別為0表示普通段落
+    """
+    if not title.startswith('#'):
+        return 1, title
+    match = _HEADING.match(title)
+    if match:
+        return len(match.group(1)), match.group(2).strip()
+    return 0, title
+
+def render_slide(slide, images=None):
+    """
+    將一張幻燈片的中間表示轉換為Marp格式的Markdown
+
+    Args:
+        slide: slide_ir.Slide
+        images: image_assets.ImageResolver，指定時圖片改為引用複製到輸出目錄中的（已縮小的）文件，
+            見 ImageResolver.marp_path
+    """
+    # 將標題轉換為Markdown標題
+    title = slide.title
+    if not title.startswith('#'):
+        title = f"# {title}"
+
+    # 列表項使用統一的標記，其餘行保持原樣
+    if images is not None and IMAGE_PREFIX in slide.prefixes:
+        lines = []
+        for paragraph in slide.paragraphs:
+            image = paragraph.image
+            if image is None:
+                lines.append(paragraph.prefix + paragraph.text)
+            else:
+                lines.append(f"![{image[0]}]({images.marp_path(image[1])})")
+        content = "\n".join(lines)
+    elif any(slide.prefixes):
+        content = "\n".join(prefix + text for prefix, text
+                            in zip(slide.prefixes, slide.body.split('\n')))
+    else:
+        content = slide.body
+
+    return f"{title}\n\n{content}\n"
+
+def write_marp(slides, f, theme="default", images=None, styles=CSS_STYLES):
+    """
+    將幻燈片逐張寫入已打開的文件對象
+
+    slides 可以是列表，也可以是 slide_ir.iter_slides 返回的生成器，
+    後者每解析出一張幻燈片就立即寫出
+
+    Args:
+        slides: slide_ir.Slide 的可迭代對象
+        f: 以文本模式打開的輸出文件對象
+        theme: 使用的主題名稱
+        images: image_assets.ImageResolver，見 render_slide
+        styles: 內嵌在頭部之後的樣式；使用外部主題文件（theme_registry）時為空字符串
+    """
+    f.write(marp_header(theme))
+    f.write(styles)
+    first = True
+    for slide in slides:
+        if not first:
+            f.write(SLIDE_BREAK)
+        f.write(render_slide(slide, images))
+        first = False
+
+def slides_to_marp(slides, output_file, theme="default", images=None, styles=CSS_STYLES):
+    """
+    將幻燈片寫入Marp格式的Markdown文件
+
+    Args:
+        slides: slide_ir.Slide 的可迭代對象
+        output_file: 輸出的Markdown文件路徑
+        theme: 使用的主題名稱
+        images: image_assets.ImageResolver，見 render_slide；圖片地址相對於 output_file 所在目錄
+        styles: 內嵌的樣式，見 write_marp
+    """
+    if images is not None:
+        images = images.for_output(output_file)
+        if isinstance(slides, list):
+            with stage('images'):
+                images.prepare(slides)
+    with stage('render'), open(output_file, 'w', encoding='utf-8') as f:
+        write_marp(slides, timed_writes(f), theme, images, styles)
+    return output_file
@@ -0,0 +1,257 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from marp_export import EXPORT_FORMATS, marp_command, theme_set_args
+from export_executor import kill_process
+from image_assets import copy_assets
+
+# 空閒多久後關閉常駐的Marp進程（秒）
+DEFAULT_IDLE_TIMEOUT = 300
+
+# 等待Marp伺服器啟動的最長時間，首次通過npx運行時可能需要下載
+DEFAULT_STARTUP_TIMEOUT = 120
+
+# 單次導出請求的超時時間
+DEFAULT_REQUEST_TIMEOUT = 300
+
+class MarpWorkerError(Exception):
+    """常駐Marp進程無法啟動或導出失敗"""
+
+def _free_port():
+    """取得一個當前未被佔用的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class MarpWorker:
+    """
+    常駐的Marp CLI進程
+
+    以伺服器模式（marp --server）運行Marp，Node和Chromium只啟動一次，
+    之後每次導出只是一個本地HTTP請求：GET /文件.md?pdf 或 ?pptx，
+    延遲只剩渲染本身的時間。
+
+    Markdown文件先複製到進程專用的臨時目錄中再請求導出，
+    進程退出或請求失敗時自動重啟並重試一次，空閒超過 idle_timeout 秒後自動關閉，
+    下一次導出時再按需啟動
+    """
+
+    def __init__(self, node_path=None, use_npx=True, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 command=None, startup_timeout=DEFAULT_STARTUP_TIMEOUT,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, theme_set=()):
+        """
+        Args:
+            node_path: Node.js可執行文件路徑
+            use_npx: 是否通過npx運行Marp CLI
+            idle_timeout: 空閒多久後關閉進程（秒），None表示不自動關閉
+            command: 啟動伺服器的命令前綴，默認為 marp_command() 的結果；
+                會在其後追加 --server 和服務目錄，端口通過環境變量 PORT 傳遞
+            startup_timeout: 等待伺服器就緒的最長時間（秒）
+            request_timeout: 單次導出請求的超時時間（秒）
+            theme_set: 伺服器啟動時載入的主題文件列表，見 theme_registry
+        """
+        self.command = list(command) if command else marp_command(node_path, use_npx)
+        self.theme_set = list(theme_set)
+        self.idle_timeout = idle_timeout
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.process = None
+        self.port = None
+        self.restarts = 0
+        self._generation = 0
+        self._cancelled_generation = -1
+        self._root = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._sequence = 0
+        self._idle_timer = None
+        self._closed = False
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _url(self, path=""):
+        return f"http://127.0.0.1:{self.port}/{path}"
+
+    def _request(self, path, timeout, query=""):
+        # 只有真正導出時才導入urllib，不影響命令行的啟動時間
+        import urllib.parse
+        import urllib.request
+        # 文件名可能包含空格和CJK字符，需要編碼後才能放入URL
+        url = self._url(urllib.parse.quote(path)) + (f"?{query}" if query else "")
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+
+    def healthy(self):
+        """檢查進程是否在運行並能響應請求"""
+        if not self.running:
+            return False
+        import http.client
+        try:
+            self._request("", timeout=5)
+        except (OSError, http.client.HTTPException):
+            return False
+        return True
+
+    def _start(self):
+        """啟動伺服器並等待其就緒，調用方需持有鎖"""
+        import subprocess
+
+        if self._root is None:
+            self._root = tempfile.mkdtemp(prefix='marp-worker-')
+        self.port = _free_port()
+        self._generation += 1
+        env = dict(os.environ, PORT=str(self.port))
+        popen_kwargs = {'start_new_session': True} if os.name == 'posix' else {}
+        self.process = subprocess.Popen(self.command + ["--server", self._root]
+                                        + theme_set_args(self.theme_set), env=env,
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, **popen_kwargs)
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            if self.healthy():
+                return
+            time.sleep(0.1)
+        self._stop()
+        raise MarpWorkerError("無法啟動常駐的Marp進程，請確保已安裝Node.js和npm")
+
+    def _stop(self):
+        """終止伺服器進程，調用方需持有鎖"""
+        if self.process is not None:
+            kill_process(self.process)
+            self.process.wait()
+            self.process = None
+
+    def ensure_running(self):
+        """進程未運行或已崩潰時（重新）啟動"""
+        with self._lock:
+            if self._closed:
+                raise MarpWorkerError("常駐的Marp進程已關閉")
+            if self.running:
+                return
+            if self.process is not None:
+                self.restarts += 1
+                self._stop()
+            self._start()
+
+    def _discard(self, generation):
+        """
+        終止不再響應的進程，下一次 ensure_running() 重新啟動
+
+        崩潰的進程關閉端口後可能還沒有退出，running 仍然為真，不能只依靠 ensure_running()。
+        其他線程已經重啟過（代數改變）時不做任何事
+        """
+        with self._lock:
+            if self._generation == generation and self.process is not None:
+                self.restarts += 1
+                self._stop()
+
+    def cancel(self):
+        """
+        取消正在進行的導出
+
+        Marp伺服器無法中止單個請求，因此直接終止進程，進行中的導出以 MarpWorkerError 結束，
+        下一次導出時重新啟動
+        """
+        with self._lock:
+            if self.running:
+                self._cancelled_generation = self._generation
+                self._stop()
+
+    def _begin(self):
+        with self._lock:
+            self._active += 1
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+
+    def _end(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0 and self.idle_timeout is not None and not self._closed:
+                self._idle_timer = threading.Timer(self.idle_timeout, self._idle)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+
+    def _idle(self):
+        with self._lock:
+            if self._active == 0:
+                self._stop()
+
+    def export(self, md_file, fmt, output_file=None):
+        """
+        導出一個Markdown文件
+
+        Args:
+            md_file: Markdown文件路徑
+            fmt: 'pdf' 或 'pptx'
+            output_file: 輸出文件路徑，如果為None則與Markdown文件同目錄同名
+
+        Returns:
+            輸出文件路徑
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的導出格式: {fmt}")
+        if output_file is None:
+            output_file = os.path.splitext(md_file)[0] + "." + fmt
+
+        import http.client
+
+        self._begin()
+        try:
+            # 每個請求使用獨立的子目錄，同名文件可以同時導出
+            with self._lock:
+                self._sequence += 1
+                sequence = self._sequence
+            for attempt in range(2):
+                self.ensure_running()
+                generation = self._generation
+                job_dir = os.path.join(self._root, str(sequence))
+                os.makedirs(job_dir, exist_ok=True)
+                name = os.path.basename(md_file)
+                shutil.copyfile(md_file, os.path.join(job_dir, name))
+                # Markdown以相對路徑引用旁邊 assets 目錄中的圖片
+                copy_assets(md_file, job_dir)
+                try:
+                    data = self._request(f"{sequence}/{name}", self.request_timeout, fmt)
+                except (OSError, http.client.HTTPException) as e:
+                    if generation == self._cancelled_generation:
+                        raise MarpWorkerError("導出已取消") from e
+                    # 進程崩潰（不再響應健康檢查）時重啟並重試一次
+                    if attempt == 0 and not self.healthy():
+                        self._discard(generation)
+                        continue
+                    raise MarpWorkerError(EXPORT_FORMATS[fmt]) from e
+                finally:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                with open(output_file, 'wb') as f:
+                    f.write(data)
+                return output_file
+        finally:
+            self._end()
+
+    def close(self):
+        """關閉進程並刪除臨時目錄"""
+        with self._lock:
+            self._closed = True
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            self._stop()
+            if self._root is not None:
+                shutil.rmtree(self._root, ignore_errors=True)
+                self._root = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,73 @@
+import io
+import threading
+
+from slide_ir import parse_slides
+from marp_markdown import CSS_STYLES, write_marp
+from text_input import decode_text
+
+# 共用的PPTX模板，第一次生成PPTX時創建
+_pptx_template = None
+_template_lock = threading.Lock()
+
+def _as_text(text):
+    """接受字符串或字節；字節的編碼判斷和換行符處理與讀取文件時一致"""
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        return decode_text(bytes(text))
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def pptx_template():
+    """
+    返回共用的 txt_to_pptx.PptxTemplate
+
+    模板在第一次調用時創建（約需數十毫秒），之後所有轉換（包括其他線程中的）都重複使用它
+    """
+    global _pptx_template
+    if _pptx_template is None:
+        with _template_lock:
+            if _pptx_template is None:
+                from txt_to_pptx import PptxTemplate
+                _pptx_template = PptxTemplate()
+    return _pptx_template
+
+def text_to_markdown(text, theme="default", themes=None):
+    """
+    在內存中將文本轉換為Marp格式的Markdown，不讀寫任何文件
+
+    圖片沒有可以相對的目錄，保持原有的引用
+
+    Args:
+        text: 文本內容，字符串或字節（自動檢測編碼）
+        theme: 使用的主題名稱
+        themes: theme_registry.ThemeRegistry，指定時只以名稱引用外部主題文件
+
+    Returns:
+        Markdown字符串
+    """
+    slides = parse_slides(_as_text(text))
+    if themes is None:
+        theme_name, styles = theme, CSS_STYLES
+    else:
+        theme_name, styles = themes.name(theme), ""
+    f = io.StringIO()
+    write_marp(slides, f, theme_name, None, styles)
+    return f.getvalue()
+
+def text_to_pptx(text):
+    """
+    在內存中將文本轉換為PPTX，不讀寫任何文件
+
+    使用共用的模板（見 pptx_template）逐張寫入內存中的ZIP包；圖片無法解析，以說明文字顯示
+
+    Args:
+        text: 文本內容，字符串或字節（自動檢測編碼）
+
+    Returns:
+        PPTX文件的字節
+    """
+    from txt_to_pptx import StreamingPptxWriter
+    slides = parse_slides(_as_text(text))
+    buffer = io.BytesIO()
+    with StreamingPptxWriter(buffer, template=pptx_template()) as writer:
+        for item in slides:
+            writer.add(item)
+    return buffer.getvalue()
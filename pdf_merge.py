@@ -0,0 +1,675 @@
+import re
+import zlib
+import hashlib
+from array import array
+
+from pdf_render import (PAGE_HEIGHT, PAGE_NUMBER_BOTTOM, PAGE_NUMBER_COLOR, PAGE_NUMBER_RIGHT,
+                        PAGE_NUMBER_SIZE)
+
+# 可以從上層頁面樹繼承的頁面屬性
+_INHERITABLE = (b'Resources', b'MediaBox', b'CropBox', b'Rotate')
+
+# 複製頁面時不保留的屬性：父節點由新的頁面樹代替，文章線程和結構樹沒有被複製
+_DROPPED_PAGE_KEYS = {b'Parent', b'B', b'StructParents'}
+
+# 蓋印頁碼使用的字體資源名稱
+_PAGE_NUMBER_FONT = b'TxtToMarpPageNumber'
+
+# 正則中的PDF字符類：空白字符、分隔符
+_WS = rb'\x00\t\n\x0c\r '
+_DELIMS = rb'()<>\[\]{}/%'
+
+_SPACE = re.compile(rb'(?:[' + _WS + rb']+|%[^\r\n]*)*')
+_NAME = re.compile(rb'/([^' + _WS + _DELIMS + rb']*)')
+_REF = re.compile(rb'(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+R(?![^' + _WS + _DELIMS + rb'])')
+_NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_KEYWORD = re.compile(rb'[A-Za-z]+')
+_HEX_STRING = re.compile(rb'<[0-9A-Fa-f' + _WS + rb']*>')
+_PARENS = re.compile(rb'[()\\]')
+_OBJ = re.compile(rb'[' + _WS + rb']*(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+obj')
+_ANY_OBJ = re.compile(rb'(?<![0-9])(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+obj(?![^' + _WS + _DELIMS + rb'])')
+_XREF_ENTRY = re.compile(rb'[' + _WS + rb']*(\d+)[' + _WS + rb']+(\d+)[' + _WS + rb']+([nf])')
+_XREF_SECTION = re.compile(rb'[' + _WS + rb']*(\d+)[' + _WS + rb']+(\d+)')
+
+class PdfError(ValueError):
+    """無法解析或不支持的PDF文件"""
+
+class _Encrypted(PdfError):
+    """加密的文件，重建交叉引用也無法讀取"""
+
+class Name(bytes):
+    """名稱對象，內容為 / 之後的原始字節"""
+
+class Token(bytes):
+    """原樣寫回的標記：字符串、實數和 true/false/null 等關鍵字"""
+
+NULL = Token(b'null')
+
+class Ref:
+    """間接引用"""
+
+    __slots__ = ('num', 'gen')
+
+    def __init__(self, num, gen=0):
+        self.num = num
+        self.gen = gen
+
+    def __eq__(self, other):
+        return isinstance(other, Ref) and (self.num, self.gen) == (other.num, other.gen)
+
+    def __hash__(self):
+        return hash((self.num, self.gen))
+
+    def __repr__(self):
+        return f"Ref({self.num}, {self.gen})"
+
+class Stream:
+    """流對象：字典和未解碼的數據"""
+
+    __slots__ = ('dict', 'data')
+
+    def __init__(self, dictionary, data):
+        self.dict = dictionary
+        self.data = data
+
+def _literal_end(data, pos):
+    """返回從 pos 處的 ( 開始的字面字符串的結束位置，處理嵌套括號和轉義"""
+    depth = 0
+    while True:
+        match = _PARENS.search(data, pos)
+        if match is None:
+            raise PdfError("字符串沒有結束")
+        char = match.group()
+        pos = match.end()
+        if char == b'\\':
+            pos += 1
+        elif char == b'(':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+def parse_object(data, pos):
+    """
+    解析 pos 處的一個直接對象
+
+    字典為以 Name 為鍵的dict，數組為list，整數為int，間接引用為 Ref，
+    其餘（字符串、實數、關鍵字）為原樣保存的 Token
+
+    Returns:
+        (對象, 結束位置)
+    """
+    pos = _SPACE.match(data, pos).end()
+    char = data[pos:pos + 1]
+    if char == b'/':
+        match = _NAME.match(data, pos)
+        return Name(match.group(1)), match.end()
+    if char == b'<':
+        if data[pos + 1:pos + 2] == b'<':
+            result = {}
+            pos += 2
+            while True:
+                pos = _SPACE.match(data, pos).end()
+                if data.startswith(b'>>', pos):
+                    return result, pos + 2
+                key, pos = parse_object(data, pos)
+                if not isinstance(key, Name):
+                    raise PdfError(f"字典的鍵不是名稱（位置 {pos}）")
+                result[key], pos = parse_object(data, pos)
+        match = _HEX_STRING.match(data, pos)
+        if match is None:
+            raise PdfError(f"無法解析的十六進制字符串（位置 {pos}）")
+        return Token(match.group()), match.end()
+    if char == b'[':
+        result = []
+        pos += 1
+        while True:
+            pos = _SPACE.match(data, pos).end()
+            if data.startswith(b']', pos):
+                return result, pos + 1
+            item, pos = parse_object(data, pos)
+            result.append(item)
+    if char == b'(':
+        end = _literal_end(data, pos)
+        return Token(data[pos:end]), end
+    match = _REF.match(data, pos)
+    if match:
+        return Ref(int(match.group(1)), int(match.group(2))), match.end()
+    match = _NUMBER.match(data, pos)
+    if match:
+        text = match.group()
+        if b'.' in text:
+            return Token(text), match.end()
+        return int(text), match.end()
+    match = _KEYWORD.match(data, pos)
+    if match:
+        return Token(match.group()), match.end()
+    raise PdfError(f"無法解析的PDF對象（位置 {pos}）")
+
+def _unpredict(data, parms):
+    """還原PNG預測器（Predictor >= 10），用於交叉引用流和對象流"""
+    predictor = parms.get(b'Predictor', 1)
+    if predictor < 10:
+        if predictor != 1:
+            raise PdfError(f"不支持的預測器: {predictor}")
+        return data
+    bpp = max(1, parms.get(b'Colors', 1) * parms.get(b'BitsPerComponent', 8) // 8)
+    width = (parms.get(b'Columns', 1) * parms.get(b'Colors', 1) * parms.get(b'BitsPerComponent', 8) + 7) // 8
+    output = bytearray()
+    previous = bytearray(width)
+    for start in range(0, len(data) - width, width + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + 1 + width])
+        for i in range(len(row)):
+            left = row[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xff
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xff
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xff
+            elif kind == 4:
+                upper_left = previous[i - bpp] if i >= bpp else 0
+                p = left + up - upper_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - upper_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else upper_left)) & 0xff
+        output += row
+        previous = row
+    return bytes(output)
+
+class PdfReader:
+    """
+    讀取PDF文件的頁面和對象，只支持複製頁面所需的部分
+
+    支持傳統的交叉引用表、交叉引用流和對象流（PDF 1.5），以及增量更新；
+    交叉引用損壞時掃描整個文件重建。不支持加密的文件
+
+    用法：
+
+        reader = PdfReader(data)
+        for number, page in reader.pages:
+            ...
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data: PDF文件的字節內容
+        """
+        self.data = data
+        self._offsets = {}  # 對象編號 -> 文件偏移量
+        self._compressed = {}  # 對象編號 -> (對象流編號, 序號)
+        self._objects = {}
+        self._object_streams = {}
+        try:
+            self.trailer = self._read_xref()
+            self._check_encryption()
+            self.pages = self._read_pages()
+        except (PdfError, ValueError, IndexError, KeyError, zlib.error) as e:
+            if isinstance(e, _Encrypted):
+                raise
+            self.trailer = self._rebuild_xref()
+            self._check_encryption()
+            self.pages = self._read_pages()
+
+    def _check_encryption(self):
+        if b'Encrypt' in self.trailer:
+            raise _Encrypted("不支持加密的PDF文件")
+
+    def _read_xref(self):
+        data = self.data
+        start = data.rfind(b'startxref')
+        if start < 0:
+            raise PdfError("找不到 startxref")
+        offset = parse_object(data, start + 9)[0]
+        trailer = None
+        seen = set()
+        while isinstance(offset, int) and offset not in seen:
+            seen.add(offset)
+            position = _SPACE.match(data, offset).end()
+            if data.startswith(b'xref', position):
+                section_trailer = self._read_xref_table(position + 4)
+                if isinstance(section_trailer.get(b'XRefStm'), int):
+                    # 混合文件：交叉引用流中的條目
+                    self._read_xref_stream(section_trailer[b'XRefStm'])
+            else:
+                section_trailer = self._read_xref_stream(offset)
+            if trailer is None:
+                trailer = section_trailer
+            offset = section_trailer.get(b'Prev')
+        if trailer is None or b'Root' not in trailer:
+            raise PdfError("找不到文件尾")
+        return trailer
+
+    def _known(self, number):
+        return number in self._offsets or number in self._compressed
+
+    def _read_xref_table(self, pos):
+        """讀取傳統的交叉引用表，較新的條目（先讀取的）優先"""
+        data = self.data
+        while True:
+            pos = _SPACE.match(data, pos).end()
+            if data.startswith(b'trailer', pos):
+                return parse_object(data, pos + 7)[0]
+            match = _XREF_SECTION.match(data, pos)
+            if match is None:
+                raise PdfError("無法解析的交叉引用表")
+            first, count = int(match.group(1)), int(match.group(2))
+            pos = match.end()
+            for number in range(first, first + count):
+                match = _XREF_ENTRY.match(data, pos)
+                if match is None:
+                    raise PdfError("無法解析的交叉引用條目")
+                pos = match.end()
+                if not self._known(number):
+                    if match.group(3) == b'n':
+                        self._offsets[number] = int(match.group(1))
+                    else:
+                        # 已刪除的對象，記錄下來使較舊的條目不再生效
+                        self._offsets[number] = None
+
+    def _read_xref_stream(self, offset):
+        """讀取交叉引用流，返回其字典（同時作為文件尾）"""
+        stream = self._read_indirect(offset)
+        if not isinstance(stream, Stream):
+            raise PdfError("交叉引用位置不是流對象")
+        info = stream.dict
+        widths = info[b'W']
+        index = info.get(b'Index', [0, info[b'Size']])
+        data = self._decode(stream)
+        pos = 0
+        for i in range(0, len(index) - 1, 2):
+            for number in range(index[i], index[i] + index[i + 1]):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos:pos + width], 'big') if width else None)
+                    pos += width
+                if pos > len(data):
+                    raise PdfError("交叉引用流的數據不完整")
+                if self._known(number):
+                    continue
+                kind = 1 if fields[0] is None else fields[0]
+                if kind == 1:
+                    self._offsets[number] = fields[1]
+                elif kind == 2:
+                    self._compressed[number] = (fields[1], fields[2] or 0)
+                elif kind == 0:
+                    self._offsets[number] = None
+        return info
+
+    def _rebuild_xref(self):
+        """掃描整個文件中的 'n g obj' 重建交叉引用，文件後部的定義優先"""
+        self._offsets.clear()
+        self._compressed.clear()
+        self._objects.clear()
+        self._object_streams.clear()
+        for match in _ANY_OBJ.finditer(self.data):
+            self._offsets[int(match.group(1))] = match.start()
+        trailer = None
+        position = self.data.rfind(b'trailer')
+        if position >= 0:
+            try:
+                trailer = parse_object(self.data, position + 7)[0]
+            except PdfError:
+                trailer = None
+        if not isinstance(trailer, dict) or b'Root' not in trailer:
+            trailer = None
+            for number in sorted(self._offsets, reverse=True):
+                try:
+                    obj = self.object(number)
+                except PdfError:
+                    continue
+                if isinstance(obj, Stream) and obj.dict.get(b'Type') == b'XRef' and b'Root' in obj.dict:
+                    trailer = obj.dict
+                    self._read_xref_stream(self._offsets[number])
+                    break
+                if isinstance(obj, dict) and obj.get(b'Type') == b'Catalog':
+                    trailer = {Name(b'Root'): Ref(number)}
+                    break
+        if trailer is None:
+            raise PdfError("無法讀取PDF文件：找不到文件目錄")
+        return trailer
+
+    def _read_indirect(self, offset, number=None):
+        """讀取 offset 處的間接對象"""
+        data = self.data
+        match = _OBJ.match(data, offset)
+        if match is None or (number is not None and int(match.group(1)) != number):
+            raise PdfError(f"交叉引用中對象 {number} 的位置錯誤")
+        obj, pos = parse_object(data, match.end())
+        if not isinstance(obj, dict):
+            return obj
+        pos = _SPACE.match(data, pos).end()
+        if not data.startswith(b'stream', pos):
+            return obj
+        pos += 6
+        if data.startswith(b'\r\n', pos):
+            pos += 2
+        elif data[pos:pos + 1] in (b'\n', b'\r'):
+            pos += 1
+        length = obj.get(b'Length')
+        if isinstance(length, Ref):
+            length = self.object(length.num)
+        end = pos + length if isinstance(length, int) else -1
+        if end < pos or not data.startswith(b'endstream', _SPACE.match(data, end).end()):
+            # 長度錯誤時以 endstream 為準
+            end = data.find(b'endstream', pos)
+            if end < 0:
+                raise PdfError(f"對象 {number} 的流沒有結束")
+            if data[end - 2:end] == b'\r\n':
+                end -= 2
+            elif data[end - 1:end] in (b'\n', b'\r'):
+                end -= 1
+        return Stream(obj, data[pos:end])
+
+    def _decode(self, stream):
+        """解碼流數據，只支持交叉引用流和對象流使用的 FlateDecode"""
+        filters = stream.dict.get(b'Filter', [])
+        parms = stream.dict.get(b'DecodeParms', [])
+        if not isinstance(filters, list):
+            filters = [filters]
+        if not isinstance(parms, list):
+            parms = [parms]
+        data = stream.data
+        for i, name in enumerate(filters):
+            if name != b'FlateDecode':
+                raise PdfError(f"不支持的流過濾器: {name.decode('latin-1')}")
+            data = zlib.decompressobj().decompress(data)
+            parm = parms[i] if i < len(parms) else None
+            if isinstance(parm, dict):
+                data = _unpredict(data, parm)
+        return data
+
+    def _object_stream(self, number):
+        objects = self._object_streams.get(number)
+        if objects is None:
+            stream = self.object(number)
+            if not isinstance(stream, Stream):
+                raise PdfError(f"對象 {number} 不是對象流")
+            data = self._decode(stream)
+            first = stream.dict[b'First']
+            pos = 0
+            header = []
+            for _ in range(stream.dict[b'N']):
+                obj_number, pos = parse_object(data, pos)
+                obj_offset, pos = parse_object(data, pos)
+                header.append(first + obj_offset)
+            objects = [parse_object(data, offset)[0] for offset in header]
+            self._object_streams[number] = objects
+        return objects
+
+    def object(self, number):
+        """返回編號為 number 的間接對象，不存在時返回 NULL"""
+        obj = self._objects.get(number)
+        if obj is None:
+            if self._offsets.get(number) is not None:
+                obj = self._read_indirect(self._offsets[number], number)
+            elif number in self._compressed:
+                stream_number, index = self._compressed[number]
+                obj = self._object_stream(stream_number)[index]
+            else:
+                obj = NULL
+            self._objects[number] = obj
+        return obj
+
+    def resolve(self, obj):
+        """將間接引用解析為對象"""
+        seen = 0
+        while isinstance(obj, Ref):
+            obj = self.object(obj.num)
+            seen += 1
+            if seen > 32:
+                raise PdfError("間接引用形成了循環")
+        return obj
+
+    def _read_pages(self):
+        """返回 [(頁面對象編號, 頁面字典)]，可繼承的屬性已從上層頁面樹複製到字典中"""
+        pages = []
+        visited = set()
+        root = self.resolve(self.trailer[b'Root'])
+        stack = [(root.get(b'Pages'), {})]
+        while stack:
+            ref, inherited = stack.pop()
+            number = ref.num if isinstance(ref, Ref) else None
+            if number is not None:
+                if number in visited:
+                    continue
+                visited.add(number)
+            node = self.resolve(ref)
+            if not isinstance(node, dict):
+                continue
+            kids = self.resolve(node.get(b'Kids'))
+            if node.get(b'Type') != b'Page' and isinstance(kids, list):
+                inherited = dict(inherited)
+                for key in _INHERITABLE:
+                    if key in node:
+                        inherited[Name(key)] = node[key]
+                stack.extend((kid, inherited) for kid in reversed(kids))
+            else:
+                page = dict(inherited)
+                page.update(node)
+                pages.append((number, page))
+        return pages
+
+def _write(obj, out):
+    if type(obj) is Name:
+        out(b'/' + obj)
+    elif isinstance(obj, bytes):
+        out(obj)
+    elif isinstance(obj, Ref):
+        out(b'%d %d R' % (obj.num, obj.gen))
+    elif isinstance(obj, int):
+        out(b'%d' % obj)
+    elif isinstance(obj, float):
+        out(('%.4f' % obj).rstrip('0').rstrip('.').encode('ascii'))
+    elif isinstance(obj, dict):
+        out(b'<<')
+        for key, value in obj.items():
+            out(b'/' + key + b' ')
+            _write(value, out)
+            out(b' ')
+        out(b'>>')
+    elif isinstance(obj, list):
+        out(b'[')
+        for i, item in enumerate(obj):
+            if i:
+                out(b' ')
+            _write(item, out)
+        out(b']')
+    elif isinstance(obj, Stream):
+        dictionary = dict(obj.dict)
+        dictionary[Name(b'Length')] = len(obj.data)
+        _write(dictionary, out)
+        out(b'\nstream\n')
+        out(obj.data)
+        out(b'\nendstream')
+    elif obj is None:
+        out(b'null')
+    else:
+        raise TypeError(f"無法寫入的PDF對象: {obj!r}")
+
+def serialize(obj):
+    """將對象轉換為PDF語法的字節"""
+    parts = []
+    _write(obj, parts.append)
+    return b"".join(parts)
+
+class _Pending:
+    """正在複製的對象；被自己的下層對象引用時預先分配編號"""
+
+    __slots__ = ('number',)
+
+    def __init__(self):
+        self.number = None
+
+class PdfMerger:
+    """
+    以串流方式將其他PDF文件的頁面合併為一個PDF
+
+    每個頁面引用的對象（內容流、字體、圖片等）從源文件中複製並重新編號後立即寫入，
+    同一個源文件的頁面共用已複製的對象，內容完全相同的對象只寫入一次。
+    頁面樹、目錄和交叉引用表在 close() 時寫入。
+
+    對象編號：1 目錄，2 頁面樹，之後按複製順序分配
+    """
+
+    def __init__(self, f):
+        """
+        Args:
+            f: 以二進制模式打開的輸出文件對象
+        """
+        self._f = f
+        self._position = 0
+        self._offsets = array('q', [0, 0])
+        self._pages = []
+        self._digests = {}  # 對象內容的哈希 -> 編號
+        self._memos = {}  # PdfReader -> {源對象編號: 新編號}
+        self._font = None
+        self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def count(self):
+        return len(self._pages)
+
+    def _write(self, data):
+        self._f.write(data)
+        self._position += len(data)
+
+    def _allocate(self):
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _object(self, number, body):
+        self._offsets[number - 1] = self._position
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def _shared(self, body):
+        """寫入可共用的對象，內容相同的對象只寫入一次，返回編號"""
+        digest = hashlib.sha1(body).digest()
+        number = self._digests.get(digest)
+        if number is None:
+            number = self._allocate()
+            self._digests[digest] = number
+            self._object(number, body)
+        return number
+
+    def _memo(self, reader):
+        memo = self._memos.get(reader)
+        if memo is None:
+            # 源文件中的其他頁面不被複製，指向它們的引用（例如內部鏈接）寫為null
+            memo = self._memos[reader] = {number: None for number, _ in reader.pages if number is not None}
+        return memo
+
+    def _copy(self, reader, obj, memo):
+        """返回對象的副本，其中的間接引用換成本文件的編號"""
+        if isinstance(obj, Ref):
+            number = self._import(reader, obj.num, memo)
+            return NULL if number is None else Ref(number)
+        if isinstance(obj, dict):
+            return {key: self._copy(reader, value, memo) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [self._copy(reader, item, memo) for item in obj]
+        if isinstance(obj, Stream):
+            # 長度在寫入時重新計算
+            return Stream({key: self._copy(reader, value, memo) for key, value in obj.dict.items()
+                           if key != b'Length'}, obj.data)
+        return obj
+
+    def _import(self, reader, number, memo):
+        """複製源文件中的間接對象及其引用的所有對象，返回新編號"""
+        if number in memo:
+            target = memo[number]
+            if isinstance(target, _Pending):
+                # 循環引用：為正在複製的對象預先分配編號
+                if target.number is None:
+                    target.number = self._allocate()
+                return target.number
+            return target
+        memo[number] = pending = _Pending()
+        body = serialize(self._copy(reader, reader.object(number), memo))
+        if pending.number is None:
+            target = self._shared(body)
+        else:
+            target = pending.number
+            self._object(target, body)
+        memo[number] = target
+        return target
+
+    def add_page(self, reader, index, label=None):
+        """
+        複製源文件中的一個頁面到文檔末尾
+
+        Args:
+            reader: PdfReader
+            index: 頁面在源文件中的序號（從0開始）
+            label: 蓋印在頁面右下角的頁碼文本，None表示不蓋印
+        """
+        memo = self._memo(reader)
+        source_number, page = reader.pages[index]
+        number = self._allocate()
+        if source_number is not None:
+            # 註釋等對象中指向本頁的引用指向新頁面
+            memo[source_number] = number
+        copied = {key: self._copy(reader, value, memo) for key, value in page.items()
+                  if key not in _DROPPED_PAGE_KEYS}
+        copied[Name(b'Parent')] = Ref(2)
+        if label is not None:
+            self._stamp(reader, page, copied, label, memo)
+        self._object(number, serialize(copied))
+        self._pages.append(number)
+
+    def _stamp(self, reader, page, copied, label, memo):
+        """
+        以額外的內容流蓋印頁碼，位置和樣式與Marp default 主題的 paginate: true 一致
+        （其他主題由 incremental_pdf.stamps_like_marp 判斷後改為整份渲染）
+
+        原有內容包在 q/Q 中，不會影響頁碼的圖形狀態；字體加入頁面自己的資源字典副本，
+        源文件中共用的資源字典保持不變
+        """
+        box = reader.resolve(page.get(b'CropBox') or page.get(b'MediaBox'))
+        x0, y0, x1, y1 = [float(reader.resolve(value)) for value in box] if isinstance(box, list) else (0, 0, 612, 792)
+        scale = (y1 - y0) / PAGE_HEIGHT
+        size = PAGE_NUMBER_SIZE * scale
+        # Helvetica 中數字的寬度為 0.556em
+        x = x1 - PAGE_NUMBER_RIGHT * scale - 0.556 * size * len(label)
+        y = y0 + (PAGE_NUMBER_BOTTOM + 0.2 * PAGE_NUMBER_SIZE) * scale
+        color = " ".join(f"{c / 255:.3f}" for c in PAGE_NUMBER_COLOR)
+
+        if self._font is None:
+            self._font = self._shared(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                      b"/Encoding /WinAnsiEncoding >>")
+        source = reader.resolve(page.get(b'Resources'))
+        source = source if isinstance(source, dict) else {}
+        resources = self._copy(reader, source, memo)
+        fonts = reader.resolve(source.get(b'Font'))
+        fonts = self._copy(reader, fonts, memo) if isinstance(fonts, dict) else {}
+        fonts[Name(_PAGE_NUMBER_FONT)] = Ref(self._font)
+        resources[Name(b'Font')] = fonts
+        copied[Name(b'Resources')] = resources
+
+        contents = copied.get(b'Contents')
+        if isinstance(contents, Ref):
+            target = reader.resolve(page.get(b'Contents'))
+            contents = self._copy(reader, target, memo) if isinstance(target, list) else [contents]
+        elif not isinstance(contents, list):
+            contents = []
+        before = self._shared(b"<< /Length 2 >>\nstream\nq\n\nendstream")
+        text = (f"Q\n{color} rg BT /{_PAGE_NUMBER_FONT.decode('ascii')} {size:.2f} Tf "
+                f"{x:.2f} {y:.2f} Td ({label}) Tj ET").encode('latin-1')
+        after = self._shared(b"<< /Length %d >>\nstream\n" % len(text) + text + b"\nendstream")
+        copied[Name(b'Contents')] = [Ref(before)] + contents + [Ref(after)]
+
+    def close(self):
+        """寫入頁面樹、目錄、交叉引用表和文件尾"""
+        kids = b" ".join(b"%d 0 R" % number for number in self._pages)
+        self._object(2, b"<< /Type /Pages /Count %d /Kids [%s] >>" % (len(self._pages), kids))
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_position = self._position
+        size = len(self._offsets) + 1
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        self._write(b"".join(b"%010d 00000 n \n" % offset if offset else b"0000000000 00000 f \n"
+                             for offset in self._offsets))
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_position))
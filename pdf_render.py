@@ -0,0 +1,420 @@
+import re
+import zlib
+from array import array
+from functools import lru_cache
+
+from slide_ir import BULLET, IMAGE, ORDERED, PLAIN, iter_slides
+from marp_markdown import split_heading
+from text_input import open_text, output_base
+from profiling import stage
+
+# 頁面大小：Marp默認的16:9幻燈片為1280x720像素，PDF中為960x540點
+PAGE_WIDTH = 1280
+PAGE_HEIGHT = 720
+PX_TO_PT = 0.75
+
+# 與 marp_markdown.CSS_STYLES 及Marp默認主題對應的版式（單位：像素）
+PADDING = 40
+BASE_FONT_SIZE = 29
+TEXT_COLOR = (0x24, 0x29, 0x2f)
+PARAGRAPH_LINE_HEIGHT = 1.5
+BLOCK_MARGIN = 1.0  # 段落和列表之間的間距（em）
+HEADING_LINE_HEIGHT = 1.25
+HEADING_MARGIN = 0.5  # h1, h2 { margin-bottom: 0.5em; }
+HEADING_STYLES = {
+    # 級別: (字號em, 顏色)
+    1: (2.5, (0x2c, 0x3e, 0x50)),  # h1 { color: #2c3e50; font-size: 2.5em; }
+    2: (2.0, (0x34, 0x98, 0xdb)),  # h2 { color: #3498db; font-size: 2em; }
+    3: (1.5, TEXT_COLOR),
+    4: (1.25, TEXT_COLOR),
+    5: (1.0, TEXT_COLOR),
+    6: (0.85, TEXT_COLOR),
+}
+LIST_INDENT = 3.5  # ul, ol { margin-left: 1.5em; } 加上默認主題的 padding-left: 2em
+LIST_LINE_HEIGHT = 1.6  # ul, ol { line-height: 1.6; }
+LIST_ITEM_MARGIN = 0.5  # li { margin-bottom: 0.5em; }
+PAGE_NUMBER_SIZE = 24
+PAGE_NUMBER_COLOR = (0x77, 0x77, 0x77)
+PAGE_NUMBER_RIGHT = 30
+PAGE_NUMBER_BOTTOM = 21
+
+# Adobe預定義的CJK CID字體，閱讀器自帶，不需要嵌入
+# 名稱: (字體名, 編碼, 字符集, 補充版本, 字體包圍盒)
+CJK_FONTS = {
+    'cns1': ('MHei-Medium', 'UniCNS-UCS2-H', 'CNS1', 0, '[-45 -250 1015 887]'),
+    'gb1': ('STSong-Light', 'UniGB-UCS2-H', 'GB1', 2, '[-25 -254 1000 880]'),
+    'japan1': ('HeiseiKakuGo-W5', 'UniJIS-UCS2-H', 'Japan1', 2, '[-92 -250 1010 922]'),
+    'korea1': ('HYGoThic-Medium', 'UniKS-UCS2-H', 'Korea1', 1, '[-6 -145 1003 880]'),
+}
+DEFAULT_CJK_FONT = 'cns1'
+
+# Helvetica 和 Helvetica-Bold 中 ASCII 32-126 的字寬（千分之一em，WinAnsiEncoding）
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+
+def _width_table(ascii_widths):
+    """按WinAnsiEncoding字節值索引的字寬表，非ASCII的拉丁字符使用平均寬度"""
+    table = [556] * 256
+    table[32:127] = ascii_widths
+    table[0x95] = 350  # •
+    return table
+
+_WIDTHS = {
+    'F1': _width_table(_HELVETICA_WIDTHS),
+    'F2': _width_table(_HELVETICA_BOLD_WIDTHS),
+}
+
+# 不能用WinAnsiEncoding表示的字符，使用CJK字體繪製，按全角寬度計算
+_CID_RUN = re.compile('[^\x00-\xff\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc'
+                      '\u2013\u2014\u2018-\u201a\u201c-\u201e\u2020-\u2022\u2026\u2030\u2039\u203a\u20ac\u2122]+')
+
+# 換行時的斷點：CJK字符可以在任意位置斷開，其他文字在空白處斷開
+_CJK_CHARS = '\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+_WRAP_TOKEN = re.compile(f'[{_CJK_CHARS}]|[^\\s{_CJK_CHARS}]+|\\s+')
+
+_CONTROL_CHARS = re.compile('[\x00-\x1f\x7f]')
+# BMP以外的字符（如emoji）無法用UCS2編碼表示
+_ASTRAL_CHARS = re.compile('[\U00010000-\U0010ffff]')
+_LITERAL_ESCAPE = str.maketrans({'\\': '\\\\', '(': '\\(', ')': '\\)'})
+
+def _text_width(text, font, size):
+    """估算文本寬度（像素）"""
+    width = 0
+    for match in _CID_RUN.finditer(text):
+        width += 1000 * len(match.group())
+    latin = _CID_RUN.sub('', text) if width else text
+    if latin:
+        table = _WIDTHS[font]
+        width += sum(map(table.__getitem__, latin.encode('cp1252', 'replace')))
+    return width * size / 1000
+
+def _split_long(token, font, size, max_width):
+    """將比一行還寬的單詞按字符斷開"""
+    pieces = []
+    piece, piece_width = "", 0
+    for char in token:
+        char_width = _text_width(char, font, size)
+        if piece and piece_width + char_width > max_width:
+            pieces.append(piece)
+            piece, piece_width = "", 0
+        piece += char
+        piece_width += char_width
+    pieces.append(piece)
+    return pieces
+
+def wrap_text(text, font, size, max_width, max_lines=None):
+    """
+    將文本按寬度折行
+
+    Args:
+        text: 單行文本
+        font: 'F1'（常規）或 'F2'（粗體）
+        size: 字號（像素）
+        max_width: 最大寬度（像素）
+        max_lines: 最多返回的行數，超出頁面的部分不需要排版
+
+    Returns:
+        行的列表
+    """
+    if _text_width(text, font, size) <= max_width:
+        return [text]
+    lines = []
+    line, line_width = "", 0
+    for token in _WRAP_TOKEN.findall(text):
+        if max_lines is not None and len(lines) >= max_lines:
+            return lines[:max_lines]
+        token_width = _text_width(token, font, size)
+        if line_width + token_width <= max_width:
+            line += token
+            line_width += token_width
+        elif token.isspace():
+            # 行尾的空白不換到下一行
+            continue
+        else:
+            if line:
+                lines.append(line.rstrip())
+            pieces = _split_long(token, font, size, max_width) if token_width > max_width else [token]
+            lines.extend(pieces[:-1])
+            line = pieces[-1]
+            line_width = _text_width(line, font, size)
+    if line.strip():
+        lines.append(line.rstrip())
+    return lines
+
+def _show_text(text, font):
+    """生成繪製一行文本的內容流操作，CJK字符切換到CID字體"""
+    parts = []
+    position = 0
+    for match in _CID_RUN.finditer(text):
+        if match.start() > position:
+            parts.append(_latin_show(text[position:match.start()], font))
+        parts.append(f"/F3 1 Tf <{match.group().encode('utf-16-be').hex()}> Tj")
+        position = match.end()
+    if position < len(text):
+        parts.append(_latin_show(text[position:], font))
+    return " ".join(parts)
+
+def _latin_show(text, font):
+    encoded = text.encode('cp1252', 'replace').decode('latin-1')
+    return f"/{font} 1 Tf ({encoded.translate(_LITERAL_ESCAPE)}) Tj"
+
+@lru_cache(maxsize=None)
+def _color(rgb):
+    return "%.3f %.3f %.3f rg" % tuple(c / 255 for c in rgb)
+
+class _PageBuilder:
+    """在一頁上從上到下排列文本行"""
+
+    def __init__(self):
+        self.ops = []
+        self.y = PADDING
+        self.bottom = PAGE_HEIGHT - PADDING
+
+    def line(self, x, text, font, size, line_height, color):
+        """繪製一行並下移，超出頁面底部的內容不繪製（與幻燈片溢出時被裁切一致）"""
+        top = self.y
+        self.y += size * line_height
+        if top >= self.bottom or not text:
+            return
+        # 基線位於行框中央偏下，字體上升部約為字號的0.8
+        baseline = top + (line_height - 1) * size / 2 + 0.8 * size
+        self.ops.append(f"{_color(color)} BT {size:g} 0 0 {size:g} {x:.2f} {PAGE_HEIGHT - baseline:.2f} Tm "
+                        f"{_show_text(text, font)} ET")
+
+    def paragraph(self, x, text, font, size, line_height, color, width):
+        """折行繪製一段文本，只排版頁面上還能容納的行"""
+        if self.y >= self.bottom:
+            return
+        max_lines = int((self.bottom - self.y) // (size * line_height)) + 1
+        for line in wrap_text(text, font, size, width, max_lines):
+            self.line(x, line, font, size, line_height, color)
+
+    def marker(self, x_right, text, font, size, line_height, color):
+        """在下一行的左側繪製右對齊的列表標記"""
+        baseline = self.y + (line_height - 1) * size / 2 + 0.8 * size
+        if self.y >= self.bottom:
+            return
+        x = x_right - _text_width(text, font, size)
+        self.ops.append(f"{_color(color)} BT {size:g} 0 0 {size:g} {x:.2f} {PAGE_HEIGHT - baseline:.2f} Tm "
+                        f"{_show_text(text, font)} ET")
+
+def _clean(text):
+    text = _CONTROL_CHARS.sub(' ', text.replace('\t', '    '))
+    if not text.isascii():
+        text = _ASTRAL_CHARS.sub('?', text)
+    return text
+
+def render_page(slide, page_number=None):
+    """
+    將一張幻燈片排版為PDF頁面內容流
+
+    排版與Marp使用 CSS_STYLES 時的效果一致：標題為h1（或標題自帶的#級別），
+    連續的列表項組成列表，其餘內容行組成段落並保留換行。
+    行內Markdown語法（粗體、代碼等）按原文繪製
+
+    Args:
+        slide: slide_ir.Slide
+        page_number: 右下角顯示的頁碼，為None時不顯示
+
+    Returns:
+        內容流字符串（座標單位為像素）
+    """
+    page = _PageBuilder()
+    width = PAGE_WIDTH - 2 * PADDING
+    base = BASE_FONT_SIZE
+
+    # 標題
+    previous = None
+    level, title = split_heading(_clean(slide.title.strip()))
+    if level and title:
+        size_em, color = HEADING_STYLES[level]
+        size = base * size_em
+        page.paragraph(PADDING, title, 'F2', size, HEADING_LINE_HEIGHT, color, width)
+        page.y += size * HEADING_MARGIN
+    elif title:
+        # 以#開頭但不是標題語法時，Markdown將其與後面的普通內容行作為同一個段落
+        page.paragraph(PADDING, title, 'F1', base, PARAGRAPH_LINE_HEIGHT, TEXT_COLOR, width)
+        previous = PLAIN
+
+    # 內容：按類型分組，每組之後留出段落間距
+    text_x = PADDING + base * LIST_INDENT
+    list_width = width - base * LIST_INDENT
+    for paragraph in slide.paragraphs:
+        text = _clean(paragraph.text.strip())
+        kind = paragraph.kind
+        if previous is not None and kind != previous:
+            page.y += base * BLOCK_MARGIN
+        previous = kind
+        if kind == BULLET or kind == ORDERED:
+            marker = "•" if kind == BULLET else paragraph.marker
+            page.marker(text_x - base * 0.4, marker, 'F1', base, LIST_LINE_HEIGHT, TEXT_COLOR)
+            page.paragraph(text_x, text, 'F1', base, LIST_LINE_HEIGHT, TEXT_COLOR, list_width)
+            page.y += base * LIST_ITEM_MARGIN
+        elif kind == IMAGE:
+            # 進程內渲染不嵌入圖片，以說明文字（或路徑）作為佔位
+            alt, path = paragraph.image
+            page.paragraph(PADDING, _clean(f"[圖片] {alt or path}"), 'F1', base, PARAGRAPH_LINE_HEIGHT,
+                           PAGE_NUMBER_COLOR, width)
+        else:
+            page.paragraph(PADDING, text, 'F1', base, PARAGRAPH_LINE_HEIGHT, TEXT_COLOR, width)
+
+    # 頁碼（paginate: true）
+    if page_number is not None:
+        label = str(page_number)
+        x = PAGE_WIDTH - PAGE_NUMBER_RIGHT - _text_width(label, 'F1', PAGE_NUMBER_SIZE)
+        page.ops.append(f"{_color(PAGE_NUMBER_COLOR)} BT {PAGE_NUMBER_SIZE} 0 0 {PAGE_NUMBER_SIZE} "
+                        f"{x:.2f} {PAGE_NUMBER_BOTTOM + 0.2 * PAGE_NUMBER_SIZE:.2f} Tm "
+                        f"{_latin_show(label, 'F1')} ET")
+
+    return f"{PX_TO_PT} 0 0 {PX_TO_PT} 0 0 cm\n" + "\n".join(page.ops)
+
+def page_stream(slide, page_number=None, compress=True):
+    """
+    返回一張幻燈片的內容流對象（字典、stream 和 endstream），可以在其他進程中生成
+
+    Args:
+        slide: slide_ir.Slide
+        page_number: 右下角顯示的頁碼，為None時不顯示
+        compress: 是否壓縮內容流
+    """
+    content = render_page(slide, page_number).encode('latin-1')
+    if compress:
+        content = zlib.compress(content, 6)
+        header = b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content)
+    else:
+        header = b"<< /Length %d >>\nstream\n" % len(content)
+    return header + content + b"\nendstream"
+
+class PdfDeckWriter:
+    """
+    以串流方式寫入PDF幻燈片
+
+    字體對象在創建時寫入，每添加一張幻燈片就寫入它的頁面和內容流，
+    頁面樹、目錄和交叉引用表在 close() 時寫入。
+    內存中只保留每個對象的文件偏移量。
+    add_stream() 寫入在其他進程中用 page_stream() 生成的頁面（見 shard_convert）
+
+    對象編號：1 目錄，2 頁面樹，3-7 字體，之後每頁兩個對象（頁面、內容流）
+    """
+
+    _FIRST_PAGE = 8
+
+    def __init__(self, f, cjk_font=DEFAULT_CJK_FONT, compress=True, paginate=True):
+        """
+        Args:
+            f: 以二進制模式打開的輸出文件對象
+            cjk_font: CJK_FONTS 中的字體名稱
+            compress: 是否壓縮內容流
+            paginate: 是否在右下角顯示頁碼
+        """
+        if cjk_font not in CJK_FONTS:
+            raise ValueError(f"不支持的CJK字體: {cjk_font}")
+        self._f = f
+        self._position = 0
+        self._offsets = array('q', [0] * (self._FIRST_PAGE - 1))
+        self.compress = compress
+        self.paginate = paginate
+        self.count = 0
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        font_name, encoding, ordering, supplement, bbox = CJK_FONTS[cjk_font]
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        self._object(5, (f"<< /Type /Font /Subtype /Type0 /BaseFont /{font_name} /Encoding /{encoding} "
+                         f"/DescendantFonts [6 0 R] >>").encode('ascii'))
+        self._object(6, (f"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /{font_name} "
+                         f"/CIDSystemInfo << /Registry (Adobe) /Ordering ({ordering}) /Supplement {supplement} >> "
+                         f"/FontDescriptor 7 0 R /DW 1000 >>").encode('ascii'))
+        self._object(7, (f"<< /Type /FontDescriptor /FontName /{font_name} /Flags 6 /FontBBox {bbox} "
+                         f"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>").encode('ascii'))
+
+    def _write(self, data):
+        self._f.write(data)
+        self._position += len(data)
+
+    def _object(self, number, body):
+        while len(self._offsets) < number:
+            self._offsets.append(0)
+        self._offsets[number - 1] = self._position
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def add(self, slide):
+        """
+        寫入一張幻燈片
+
+        Args:
+            slide: slide_ir.Slide
+        """
+        self.add_stream(page_stream(slide, self.count + 1 if self.paginate else None, self.compress))
+
+    def add_stream(self, stream):
+        """
+        寫入一個已經生成的頁面
+
+        Args:
+            stream: page_stream() 的結果，頁碼需要與頁面在文檔中的位置一致
+        """
+        page_object = self._FIRST_PAGE + 2 * self.count
+        self.count += 1
+        self._object(page_object, b"<< /Type /Page /Parent 2 0 R /Contents %d 0 R >>" % (page_object + 1))
+        self._object(page_object + 1, stream)
+
+    def close(self):
+        """寫入頁面樹、目錄、交叉引用表和文件尾"""
+        width, height = PAGE_WIDTH * PX_TO_PT, PAGE_HEIGHT * PX_TO_PT
+        kids = " ".join(f"{self._FIRST_PAGE + 2 * i} 0 R" for i in range(self.count))
+        self._object(2, (f"<< /Type /Pages /Count {self.count} /MediaBox [0 0 {width:g} {height:g}] "
+                         f"/Resources << /Font << /F1 3 0 R /F2 4 0 R /F3 5 0 R >> >> "
+                         f"/Kids [{kids}] >>").encode('ascii'))
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_position = self._position
+        size = len(self._offsets) + 1
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        self._write(b"".join(b"%010d 00000 n \n" % offset for offset in self._offsets))
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_position))
+
+def slides_to_pdf(slides, output_file, cjk_font=DEFAULT_CJK_FONT, compress=True):
+    """
+    直接將幻燈片渲染為PDF文件，不需要Node.js和Chromium
+
+    Args:
+        slides: slide_ir.Slide 的可迭代對象，可以是生成器
+        output_file: 輸出的PDF文件路徑
+        cjk_font: CJK字符使用的預定義CID字體，見 CJK_FONTS
+        compress: 是否壓縮內容流
+    """
+    with stage('pdf'), open(output_file, 'wb') as f:
+        writer = PdfDeckWriter(f, cjk_font, compress)
+        for slide in slides:
+            writer.add(slide)
+        writer.close()
+    return output_file
+
+def txt_to_pdf(input_file, output_file=None, cjk_font=DEFAULT_CJK_FONT):
+    """
+    以串流方式將TXT文件直接轉換為PDF
+
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的PDF文件路徑，如果為None則自動生成
+        cjk_font: CJK字符使用的預定義CID字體，見 CJK_FONTS
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".pdf"
+    with open_text(input_file) as f:
+        return slides_to_pdf(iter_slides(f), output_file, cjk_font)
@@ -0,0 +1,308 @@
+import os
+import sys
+import time
+from _thread import get_ident
+
+# 當前啟用的Profiler，未啟用時為None；轉換函數通過 stage() 查詢，未啟用時幾乎沒有開銷
+_active = None
+
+class _NullStage:
+    """未啟用分析時 stage() 返回的空上下文管理器"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def _peak_rss():
+    """進程至今的最大常駐內存（字節），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字節為單位，Linux 以KB為單位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+class StageRecord:
+    """一個階段的測量結果，時間單位為秒，內存單位為字節"""
+    __slots__ = ('name', 'depth', 'start', 'wall', 'cpu', 'children_cpu', 'peak_bytes', 'calls')
+
+    def __init__(self, name, depth, start):
+        self.name = name
+        self.depth = depth
+        self.start = start
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.children_cpu = 0.0
+        self.peak_bytes = None
+        self.calls = 1
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'depth': self.depth,
+            'start': round(self.start, 6),
+            'wall': round(self.wall, 6),
+            'cpu': round(self.cpu, 6),
+            'children_cpu': round(self.children_cpu, 6),
+            'peak_bytes': self.peak_bytes,
+            'calls': self.calls,
+        }
+
+class _Stage:
+    """Profiler.stage() 返回的上下文管理器"""
+    __slots__ = ('profiler', 'record', '_wall', '_cpu', '_children')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.record = StageRecord(name, len(profiler._stack), 0.0)
+
+    def __enter__(self):
+        profiler = self.profiler
+        profiler._enter_memory()
+        profiler._stack.append(self.record)
+        profiler.records.append(self.record)
+        self._children = _children_cpu()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        self.record.start = self._wall - profiler.origin
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        record = self.record
+        record.wall = wall - self._wall
+        record.cpu = cpu - self._cpu
+        record.children_cpu = _children_cpu() - self._children
+        profiler = self.profiler
+        profiler._stack.pop()
+        record.peak_bytes = profiler._exit_memory()
+        if profiler.on_stage:
+            profiler.on_stage(record)
+        return False
+
+class _TimedWriter:
+    """記錄 write() 累計耗時的文件代理，用於把字符串構建和實際寫入分開統計"""
+
+    def __init__(self, f, record):
+        self._f = f
+        self._record = record
+
+    def write(self, text):
+        start = time.perf_counter()
+        cpu = time.process_time()
+        result = self._f.write(text)
+        self._record.wall += time.perf_counter() - start
+        self._record.cpu += time.process_time() - cpu
+        self._record.calls += 1
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+class Profiler:
+    """
+    按階段記錄轉換耗時的分析器
+
+    每個階段記錄牆鐘時間、本進程CPU時間、子進程（例如Marp）CPU時間和內存峰值。
+    默認的內存峰值是進程的最大常駐內存（RSS），開銷可以忽略；
+    trace_memory 為True時改用 tracemalloc 統計每個階段內Python對象的分配峰值，更精確但明顯更慢。
+
+    用法：
+
+        with Profiler() as profiler:
+            txt_to_marp("input.txt")
+        print(profiler.summary())
+
+    在 with 區塊內（同一線程中）調用的轉換函數會通過 profiling.stage() 自動記錄各階段
+    """
+
+    def __init__(self, trace_memory=False, on_stage=None):
+        """
+        Args:
+            trace_memory: 是否使用tracemalloc統計分配峰值
+            on_stage: 每個階段結束時以 StageRecord 為參數調用的回調
+        """
+        self.trace_memory = trace_memory
+        self.on_stage = on_stage
+        self.records = []
+        self.origin = time.perf_counter()
+        self.thread = None
+        self._stack = []
+        self._peaks = []
+        self._previous = None
+        self._started_tracing = False
+
+    def stage(self, name):
+        """返回記錄一個階段的上下文管理器，階段可以嵌套"""
+        return _Stage(self, name)
+
+    def timed_writes(self, f, name='write'):
+        """
+        返回記錄 write() 累計耗時的文件代理，結果作為當前階段的子階段 name
+
+        寫入分散在整個階段中，記錄的是累計時間和調用次數，而不是一段連續的時間
+        """
+        record = StageRecord(name, len(self._stack), time.perf_counter() - self.origin)
+        record.calls = 0
+        self.records.append(record)
+        return _TimedWriter(f, record)
+
+    # tracemalloc 只有一個全局峰值，嵌套階段開始時先把當前峰值併入外層階段再重置
+    def _enter_memory(self):
+        if not self._started_tracing:
+            return
+        import tracemalloc
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._peaks.append(0)
+
+    def _exit_memory(self):
+        if not self._started_tracing:
+            return _peak_rss()
+        import tracemalloc
+        peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], peak)
+        return peak
+
+    def __enter__(self):
+        global _active
+        self.thread = get_ident()
+        self._previous = _active
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        _active = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = self._previous
+        if self._started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @property
+    def total(self):
+        """頂層階段的總耗時"""
+        return sum(record.wall for record in self.records if record.depth == 0)
+
+    def summary(self):
+        """返回一行可讀的匯總，例如：read 0.01秒 · parse 0.20秒 · 峰值 35.2 MB"""
+        parts = [f"{record.name} {record.wall:.2f}秒" for record in self.records if record.depth == 0]
+        peaks = [record.peak_bytes for record in self.records if record.peak_bytes is not None]
+        if peaks:
+            parts.append(f"峰值 {max(peaks) / (1024 * 1024):.1f} MB")
+        return " · ".join(parts) if parts else "沒有記錄到階段"
+
+    def to_dict(self):
+        return {
+            'total_wall': round(self.total, 6),
+            'memory': 'tracemalloc' if self.trace_memory else 'rss',
+            'stages': [record.to_dict() for record in self.records],
+        }
+
+    def chrome_trace(self):
+        """
+        返回Chrome追蹤事件格式（chrome://tracing、Perfetto）的字典
+
+        每個階段是一個完整事件（ph: X），時間單位為微秒；
+        write() 等累計的子階段無法表示為連續時間段，放在父階段開頭並在參數中註明調用次數
+        """
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            events.append({
+                'name': record.name,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(record.start * 1e6, 3),
+                'dur': round(record.wall * 1e6, 3),
+                'pid': pid,
+                'tid': self.thread or 0,
+                'args': {
+                    'cpu_ms': round(record.cpu * 1000, 3),
+                    'children_cpu_ms': round(record.children_cpu * 1000, 3),
+                    'peak_bytes': record.peak_bytes,
+                    'calls': record.calls,
+                },
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, output_file, format='json'):
+        """
+        將結果寫入文件
+
+        Args:
+            output_file: 輸出路徑，'-' 表示標準輸出
+            format: 'json'（階段列表）或 'chrome'（追蹤事件）
+        """
+        import json
+        data = self.chrome_trace() if format == 'chrome' else self.to_dict()
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if output_file == '-':
+            sys.stdout.write(text + "\n")
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(text + "\n")
+        return output_file
+
+def active():
+    """返回當前線程中啟用的Profiler，沒有則返回None"""
+    profiler = _active
+    if profiler is None or profiler.thread != get_ident():
+        return None
+    return profiler
+
+def stage(name):
+    """
+    轉換函數用於標記一個階段：with profiling.stage('parse'): ...
+
+    沒有啟用的Profiler時返回共享的空上下文管理器
+    """
+    profiler = _active
+    if profiler is None or profiler.thread != get_ident():
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+def timed_writes(f, name='write'):
+    """啟用分析時返回記錄寫入耗時的文件代理，否則原樣返回 f"""
+    profiler = active()
+    return f if profiler is None else profiler.timed_writes(f, name)
+
+def add_arguments(parser):
+    """為命令行添加 --profile、--profile-format 和 --profile-memory 參數"""
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help='分析各階段的耗時、CPU時間和內存峰值，指定文件時寫入結果（- 表示標準輸出）')
+    parser.add_argument('--profile-format', choices=('json', 'chrome'), default='json',
+                        help='分析結果的格式：json 或 chrome（Chrome追蹤事件，可在Perfetto中查看）')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='使用tracemalloc統計每個階段的分配峰值（更精確但更慢）')
+
+def from_arguments(args):
+    """根據命令行參數創建Profiler，沒有指定 --profile 時返回None"""
+    if args.profile is None:
+        return None
+    return Profiler(trace_memory=args.profile_memory)
+
+def report(profiler, args):
+    """命令行結束時輸出匯總，並按參數寫入結果文件"""
+    print(f"性能分析: {profiler.summary()}", file=sys.stderr)
+    if args.profile:
+        profiler.write(args.profile, args.profile_format)
@@ -1,7 +1,11 @@
 import os
-import re
+import time
 import argparse
-from pathlib import Path
+
+from slide_ir import STREAM_CHUNK_SIZE, iter_slides, parse_slides
+from marp_markdown import slides_to_marp, write_marp
+from export_executor import ExportJob, print_stderr, run_exports
+from text_input import open_text, output_base, split_archive_path
 
 def txt_to_marp(input_file, output_file=None, theme="default"):
     """
@@ -13,158 +17,36 @@ def txt_to_marp(input_file, output_file=None, theme="default"):
         theme: 使用的主題名稱
     """
     if output_file is None:
-        output_file = os.path.splitext(input_file)[0] + ".md"
-    
-    # 讀取TXT文件
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+        output_file = output_base(input_file) + ".md"
     
-    # 分割內容為幻燈片
+    # 讀取並解析TXT文件
     # 假設每個幻燈片由至少兩個連續的換行符分隔
-    slides = re.split(r'\n{2,}', content)
-    
-    # 創建Marp頭部
-    marp_header = f"""---
-marp: true
-theme: {theme}
-paginate: true
-backgroundColor: #fff
----
-
-"""
-    
-    # 創建CSS樣式
-    css_styles = """
-<style>
-/* 全局樣式 */
-section {
-    font-family: 'Arial', sans-serif;
-    padding: 40px;
-}
-
-/* 標題樣式 */
-h1 {
-    color: #2c3e50;
-    font-size: 2.5em;
-    margin-bottom: 0.5em;
-}
-
-h2 {
-    color: #3498db;
-    font-size: 2em;
-    margin-bottom: 0.5em;
-}
-
-/* 列表樣式 */
-ul, ol {
-    margin-left: 1.5em;
-    line-height: 1.6;
-}
-
-li {
-    margin-bottom: 0.5em;
-}
-
-/* 強調文本 */
-strong {
-    color: #e74c3c;
-}
-
-em {
-    color: #27ae60;
-}
-
-/* 代碼塊 */
-code {
-    background-color: #f8f8f8;
-    border-radius: 3px;
-    padding: 0.2em 0.4em;
-    font-family: 'Courier New', monospace;
-}
-
-/* 引用塊 */
-blockquote {
-    border-left: 5px solid #3498db;
-    padding-left: 1em;
-    color: #7f8c8d;
-    font-style: italic;
-}
-
-/* 表格樣式 */
-table {
-    border-collapse: collapse;
-    width: 100%;
-    margin: 1em 0;
-}
-
-th, td {
-    border: 1px solid #ddd;
-    padding: 8px 12px;
-    text-align: left;
-}
-
-th {
-    background-color: #f2f2f2;
-    font-weight: bold;
-}
-
-/* 圖片樣式 */
-img {
-    max-width: 100%;
-    height: auto;
-    display: block;
-    margin: 0 auto;
-}
-
-/* 頁腳樣式 */
-footer {
-    position: absolute;
-    bottom: 20px;
-    right: 20px;
-    font-size: 0.8em;
-    color: #95a5a6;
-}
-</style>
+    with open_text(input_file) as f:
+        slides = parse_slides(f.read())
+    
+    # 將幻燈片轉換為Marp格式並寫入輸出文件
+    return slides_to_marp(slides, output_file, theme)
 
-"""
-    
-    # 將幻燈片轉換為Marp格式
-    marp_content = marp_header + css_styles
-    
-    for i, slide in enumerate(slides):
-        slide = slide.strip()
-        if not slide:
-            continue
-            
-        # 處理幻燈片內容
-        lines = slide.split('\n')
-        
-        # 假設第一行是標題
-        if lines and lines[0]:
-            title = lines[0]
-            content_lines = lines[1:]
-            
-            # 將標題轉換為Markdown標題
-            if not title.startswith('#'):
-                title = f"# {title}"
-                
-            # 處理內容
-            content = "\n".join(content_lines)
-            
-            # 自動檢測列表項
-            content = re.sub(r'^(\d+)\.\s', r'\1. ', content, flags=re.MULTILINE)  # 有序列表
-            content = re.sub(r'^[-*]\s', '- ', content, flags=re.MULTILINE)  # 無序列表
-            
-            # 添加幻燈片分隔符
-            if i > 0:
-                marp_content += "\n---\n\n"
-                
-            marp_content += f"{title}\n\n{content}\n"
-    
-    # 寫入輸出文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(marp_content)
-        
+def txt_to_marp_stream(input_file, output_file=None, theme="default", chunk_size=STREAM_CHUNK_SIZE):
+    """
+    以串流方式將TXT文件轉換為Marp格式的Markdown文件
+    
+    逐塊讀取輸入，每切分出一張完整的幻燈片就立即寫入輸出，
+    內存佔用與輸入文件大小無關，適合數百MB的大文件
+    
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的Markdown文件路徑，如果為None則自動生成
+        theme: 使用的主題名稱
+        chunk_size: 每次讀取的字符數
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".md"
+    
+    with open_text(input_file) as src, \
+            open(output_file, 'w', encoding='utf-8') as dst:
+        write_marp(iter_slides(src, chunk_size), dst, theme)
+    
     return output_file
 
 def convert_to_pdf(md_file, output_dir=None):
@@ -178,8 +60,8 @@ def convert_to_pdf(md_file, output_dir=None):
     
     output_pdf = os.path.join(output_dir, os.path.splitext(os.path.basename(md_file))[0] + ".pdf")
     
-    # 使用Marp CLI轉換
-    os.system(f'marp {md_file} --pdf --output {output_pdf}')
+    # 使用Marp CLI轉換，以參數列表運行，路徑中的空格不需要轉義
+    run_exports([ExportJob(md_file, 'pdf', output_pdf)], use_npx=False, on_stderr=print_stderr)
     
     return output_pdf
 
@@ -194,8 +76,8 @@ def convert_to_pptx(md_file, output_dir=None):
     
     output_pptx = os.path.join(output_dir, os.path.splitext(os.path.basename(md_file))[0] + ".pptx")
     
-    # 使用Marp CLI轉換
-    os.system(f'marp {md_file} --pptx --output {output_pptx}')
+    # 使用Marp CLI轉換，以參數列表運行，路徑中的空格不需要轉義
+    run_exports([ExportJob(md_file, 'pptx', output_pptx)], use_npx=False, on_stderr=print_stderr)
     
     return output_pptx
 
@@ -206,22 +88,31 @@ def main():
     parser.add_argument('-t', '--theme', default='default', help='使用的主題名稱')
     parser.add_argument('--pdf', action='store_true', help='同時生成PDF文件')
     parser.add_argument('--pptx', action='store_true', help='同時生成PPTX文件')
+    parser.add_argument('--stream', action='store_true', help='以串流模式轉換大文件，內存佔用保持恆定')
     
     args = parser.parse_args()
     
     # 轉換為Marp格式
-    md_file = txt_to_marp(args.input_file, args.output, args.theme)
-    print(f"已生成Marp格式文件: {md_file}")
-    
-    # 轉換為PDF
-    if args.pdf:
-        pdf_file = convert_to_pdf(md_file)
-        print(f"已生成PDF文件: {pdf_file}")
-    
-    # 轉換為PPTX
-    if args.pptx:
-        pptx_file = convert_to_pptx(md_file)
-        print(f"已生成PPTX文件: {pptx_file}")
+    if args.stream:
+        start = time.perf_counter()
+        md_file = txt_to_marp_stream(args.input_file, args.output, args.theme)
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(split_archive_path(args.input_file)[0]) / (1024 * 1024)
+        print(f"已生成Marp格式文件: {md_file}")
+        print(f"串流轉換 {size_mb:.1f} MB，耗時 {elapsed:.2f} 秒，{size_mb / max(elapsed, 1e-9):.1f} MB/s")
+    else:
+        md_file = txt_to_marp(args.input_file, args.output, args.theme)
+        print(f"已生成Marp格式文件: {md_file}")
+    
+    # 轉換為PDF和PPTX，兩種格式同時導出
+    formats = [fmt for fmt, wanted in (('pdf', args.pdf), ('pptx', args.pptx)) if wanted]
+    if formats:
+        outputs = dict(zip(formats, run_exports([ExportJob(md_file, fmt) for fmt in formats],
+                                                use_npx=False, on_stderr=print_stderr)))
+        if args.pdf:
+            print(f"已生成PDF文件: {outputs['pdf']}")
+        if args.pptx:
+            print(f"已生成PPTX文件: {outputs['pptx']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import struct
+import shutil
+import tempfile
+
+from slide_ir import SLIDE_SEPARATOR, parse_slides
+from marp_markdown import CSS_STYLES, SLIDE_BREAK, marp_header, render_slide
+from text_input import open_text, output_base
+from profiling import stage
+
+# 每個分片至少包含的幻燈片數，分片太小時進程啟動和合併的開銷大於並行的收益
+MIN_SHARD_SLIDES = 500
+
+# 分片中間文件的記錄頭
+_MEMBER = struct.Struct('<III')  # PPTX成員：壓縮後長度、CRC32、原始大小
+_LENGTH = struct.Struct('<I')  # PDF頁面：內容流對象長度
+
+def plan_shards(blocks, shards):
+    """
+    按字符數將幻燈片文本均勻地分成連續的若干組
+
+    Args:
+        blocks: 非空的幻燈片文本列表
+        shards: 分片數
+
+    Returns:
+        (起始序號, 結束序號) 列表，保持幻燈片原有順序
+    """
+    total = sum(len(block) for block in blocks)
+    ranges = []
+    start = 0
+    size = 0
+    for i, block in enumerate(blocks):
+        size += len(block)
+        # 第 k 個分片在累計字符數達到總數的 k/shards 時結束
+        if size * shards >= total * (len(ranges) + 1) and len(ranges) < shards - 1:
+            ranges.append((start, i + 1))
+            start = i + 1
+    if start < len(blocks):
+        ranges.append((start, len(blocks)))
+    return ranges
+
+def _write_member(f, member):
+    data, crc, size = member
+    f.write(_MEMBER.pack(len(data), crc, size))
+    f.write(data)
+
+def _read_member(f):
+    header = f.read(_MEMBER.size)
+    if not header:
+        return None
+    length, crc, size = _MEMBER.unpack(header)
+    return f.read(length), crc, size
+
+def _render_shard(job):
+    """
+    在工作進程中渲染一個分片，結果寫入中間文件
+
+    Returns:
+        (分片序號, 幻燈片數, 引用的圖片列表)
+    """
+    index, text, first_page, work_dir, formats, theme_name, base_dir, output_dir, cjk_font = job
+    from image_assets import ImageResolver
+    images = ImageResolver(base_dir, output_dir=output_dir)
+    slides = parse_slides(text)
+    del text
+    images.prepare(slides)
+
+    if 'md' in formats:
+        with open(os.path.join(work_dir, f"{index}.md"), 'w', encoding='utf-8') as f:
+            f.write(SLIDE_BREAK.join(render_slide(slide, images) for slide in slides))
+
+    assets = {}
+    if 'pptx' in formats:
+        from pptx import Presentation
+        from txt_to_pptx import SlideEmitter, deflate_member
+        emitter = SlideEmitter(Presentation(), images)
+        plain_rels = deflate_member(emitter.rels_xml())
+        with open(os.path.join(work_dir, f"{index}.pptx.bin"), 'wb') as f:
+            for slide in slides:
+                xml, slide_assets = emitter.slide_parts(slide)
+                _write_member(f, deflate_member(xml))
+                if slide_assets:
+                    _write_member(f, deflate_member(emitter.rels_xml(slide_assets)))
+                    for asset in slide_assets:
+                        assets.setdefault(asset.digest, asset)
+                else:
+                    _write_member(f, plain_rels)
+
+    if 'pdf' in formats:
+        from pdf_render import page_stream
+        with open(os.path.join(work_dir, f"{index}.pdf.bin"), 'wb') as f:
+            for page_number, slide in enumerate(slides, first_page):
+                stream = page_stream(slide, page_number)
+                f.write(_LENGTH.pack(len(stream)))
+                f.write(stream)
+
+    return index, len(slides), list(assets.values())
+
+def _merge_markdown(output_file, parts, theme_name, styles):
+    with open(output_file, 'w', encoding='utf-8') as dst:
+        dst.write(marp_header(theme_name))
+        dst.write(styles)
+        for i, path in enumerate(parts):
+            if i:
+                dst.write(SLIDE_BREAK)
+            with open(path, 'r', encoding='utf-8') as src:
+                shutil.copyfileobj(src, dst)
+
+def _merge_pptx(output_file, parts, assets, images):
+    from txt_to_pptx import StreamingPptxWriter
+    with StreamingPptxWriter(output_file, images) as writer:
+        for asset in assets:
+            writer.write_media(asset)
+        for path in parts:
+            with open(path, 'rb') as f:
+                while True:
+                    slide = _read_member(f)
+                    if slide is None:
+                        break
+                    writer.add_deflated(slide, _read_member(f))
+
+def _merge_pdf(output_file, parts, cjk_font):
+    from pdf_render import PdfDeckWriter
+    with open(output_file, 'wb') as dst:
+        writer = PdfDeckWriter(dst, cjk_font)
+        for path in parts:
+            with open(path, 'rb') as f:
+                while True:
+                    header = f.read(_LENGTH.size)
+                    if not header:
+                        break
+                    writer.add_stream(f.read(_LENGTH.unpack(header)[0]))
+        writer.close()
+
+def convert_sharded(input_file, output_file=None, theme="default", shards=None, pptx=False, pdf=False,
+                    themes=None, cjk_font=None, min_shard_slides=MIN_SHARD_SLIDES):
+    """
+    將一份很大的簡報在幻燈片邊界切分，用多個進程並行渲染後合併為一個輸出
+
+    每個分片在工作進程中解析並生成Markdown、原生PPTX的幻燈片XML（已壓縮）和
+    原生PDF的頁面內容流，寫入臨時目錄；主進程按順序把它們拼接成最終文件，
+    不再重新渲染或壓縮。頁碼和幻燈片順序與單進程轉換相同：Markdown和PDF與單進程轉換的
+    輸出逐字節相同；PPTX通過 StreamingPptxWriter 寫入，圖片文件名、關係部件和
+    [Content_Types].xml 與 python-pptx 生成的不同，幻燈片內容等價
+
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的Markdown文件路徑，如果為None則自動生成；
+            PPTX和PDF與其同名，擴展名不同
+        theme: 使用的主題名稱
+        shards: 分片（工作進程）數，如果為None則使用CPU核心數
+        pptx: 是否同時生成原生PPTX（見 txt_to_pptx）
+        pdf: 是否同時在進程內渲染PDF（見 pdf_render）
+        themes: theme_registry.ThemeRegistry，指定時Markdown只以名稱引用外部主題文件
+        cjk_font: PDF使用的CJK字體，如果為None則使用 pdf_render 的默認字體
+        min_shard_slides: 每個分片至少包含的幻燈片數，幻燈片較少時減少分片數
+
+    Returns:
+        格式（'md'、'pptx'、'pdf'）到輸出文件路徑的字典
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".md"
+    base = os.path.splitext(output_file)[0]
+    formats = ['md'] + (['pptx'] if pptx else []) + (['pdf'] if pdf else [])
+    if pdf and cjk_font is None:
+        from pdf_render import DEFAULT_CJK_FONT
+        cjk_font = DEFAULT_CJK_FONT
+    if themes is None:
+        theme_name, styles = theme, CSS_STYLES
+    else:
+        theme_name, styles = themes.name(theme), ""
+
+    with stage('split'):
+        with open_text(input_file) as f:
+            content = f.read()
+        blocks = [block for block in SLIDE_SEPARATOR.split(content) if block.strip()]
+        del content
+        if shards is None:
+            shards = os.cpu_count() or 1
+        shards = max(1, min(shards, len(blocks) // max(min_shard_slides, 1)))
+        ranges = plan_shards(blocks, shards)
+
+    from image_assets import ImageResolver
+    images = ImageResolver.for_input(input_file).for_output(output_file)
+    outputs = {'md': output_file}
+    with tempfile.TemporaryDirectory(prefix='txt-to-marp-shards-') as work_dir:
+        jobs = []
+        for index, (start, end) in enumerate(ranges):
+            jobs.append((index, "\n\n".join(blocks[start:end]), start + 1, work_dir, formats, theme_name,
+                         images.base_dir, images.output_dir, cjk_font))
+        del blocks
+
+        with stage('render'):
+            if len(jobs) <= 1:
+                results = [_render_shard(job) for job in jobs]
+            else:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+                    results = list(executor.map(_render_shard, jobs))
+        del jobs
+
+        with stage('merge'):
+            indexes = [index for index, _, _ in results]
+            _merge_markdown(output_file, [os.path.join(work_dir, f"{i}.md") for i in indexes],
+                            theme_name, styles)
+            if pptx:
+                assets = {}
+                for _, _, shard_assets in results:
+                    for asset in shard_assets:
+                        assets.setdefault(asset.digest, asset)
+                outputs['pptx'] = base + ".pptx"
+                _merge_pptx(outputs['pptx'], [os.path.join(work_dir, f"{i}.pptx.bin") for i in indexes],
+                            list(assets.values()), images)
+            if pdf:
+                outputs['pdf'] = base + ".pdf"
+                _merge_pdf(outputs['pdf'], [os.path.join(work_dir, f"{i}.pdf.bin") for i in indexes],
+                           cjk_font)
+    return outputs
@@ -0,0 +1,324 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+from slide_ir import IMAGE_PREFIX, read_slides
+from marp_markdown import split_heading
+from text_input import BUFFER_SIZE, open_binary, split_archive_path
+
+# 索引內容的提取方式改變時遞增，使已索引的文件重新索引
+INDEX_VERSION = 1
+
+# FTS行號 = 簡報ID << _PAGE_BITS | 頁碼，刪除一份簡報只需按行號範圍刪除
+_PAGE_BITS = 24
+
+# 中日文字符逐字作為詞元，查詢時按短語匹配相鄰的字，任意長度的詞都能找到；
+# 編譯這兩個模式需要數毫秒，由re模塊在第一次使用時編譯並緩存，不影響命令行的啟動時間
+_CJK = '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])'
+_CJK_SPACE = ' ?(\x02?[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]\x03?) ?'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decks (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    digest TEXT NOT NULL,
+    slides INTEGER NOT NULL,
+    indexed REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS slide_text USING fts5(title, body, heading UNINDEXED);
+"""
+
+def default_index_path():
+    """默認的索引文件路徑，可通過環境變量 TXT_TO_MARP_INDEX 覆蓋"""
+    return os.environ.get('TXT_TO_MARP_INDEX') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'txt_to_marp_index.sqlite')
+
+def file_digest(input_file):
+    """
+    計算輸入內容的哈希，用於判斷文件是否需要重新索引
+
+    Args:
+        input_file: 輸入的TXT文件路徑，可以是壓縮文件或zip成員，按解壓後的內容計算
+    """
+    import hashlib
+    digest = hashlib.sha256()
+    f = open_binary(input_file)[0]
+    with f:
+        while True:
+            chunk = f.read(BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return f"{INDEX_VERSION}:{digest.hexdigest()}"
+
+def _segment(text):
+    return re.sub(_CJK, r' \1 ', text)
+
+def _snippet_text(snippet):
+    """
+    將FTS5返回的摘要還原為可讀文本
+
+    摘要中的匹配詞元前後是控制字符STX和ETX；相鄰的匹配合併為一段，去掉切分中日文時插入的空格，
+    換行合併為空格，匹配部分以方括號標出
+    """
+    snippet = re.sub(r'\x03(\s*)\x02', r'\1', snippet)
+    snippet = " ".join(re.sub(_CJK_SPACE, r'\1', snippet).split())
+    return snippet.replace('\x02', '[').replace('\x03', ']')
+
+def slide_records(slides):
+    """
+    返回幻燈片的 (標題, 正文) 列表
+
+    標題去掉Markdown標題符號，正文為去掉列表標記的內容行，圖片以說明文字代替
+    """
+    records = []
+    for slide in slides:
+        body = slide.body
+        if IMAGE_PREFIX in slide.prefixes:
+            body = "\n".join(paragraph.image[0] if paragraph.prefix == IMAGE_PREFIX else paragraph.text
+                             for paragraph in slide.paragraphs)
+        records.append((split_heading(slide.title)[1], body))
+    return records
+
+def _match_query(query):
+    """將用戶輸入轉換為FTS5查詢：每個詞作為短語，多個詞同時出現才匹配"""
+    phrases = []
+    for term in query.split():
+        tokens = _segment(term).split()
+        if tokens:
+            phrases.append('"' + " ".join(tokens).replace('"', '""') + '"')
+    return " ".join(phrases)
+
+class SearchHit:
+    """一條搜索結果"""
+    __slots__ = ('deck', 'page', 'title', 'snippet', 'score')
+
+    def __init__(self, deck, page, title, snippet, score):
+        self.deck = deck
+        self.page = page
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+
+    def to_dict(self):
+        return {
+            'deck': self.deck,
+            'page': self.page,
+            'title': self.title,
+            'snippet': self.snippet,
+            'score': round(self.score, 6),
+        }
+
+class SlideIndex:
+    """
+    簡報的SQLite FTS5全文索引
+
+    每張幻燈片的標題和正文作為一行索引，行號編碼了簡報ID和頁碼。
+    每份簡報記錄輸入內容的哈希，內容未改變時跳過，改變時按行號範圍刪除舊行後重新插入，
+    同一文件重複轉換不會重複索引。中日文按字切分，查詢時按短語匹配，
+    不需要分詞也能找到任意長度的詞
+
+    用法：
+
+        with SlideIndex() as index:
+            index.index_file("talk.txt")
+            for hit in index.search("機器學習"):
+                print(hit.deck, hit.page, hit.title)
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: 索引文件路徑，如果為None則使用 default_index_path()
+        """
+        import sqlite3
+        self.path = path or default_index_path()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        # 批量轉換時每個文件一個事務，WAL模式下不需要每次都同步到磁盤
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            self._db.executescript(_SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._db.close()
+            raise RuntimeError(f"當前的SQLite不支持FTS5全文索引: {e}") from e
+
+    @staticmethod
+    def deck_key(input_file):
+        """索引中記錄的簡報路徑"""
+        return os.path.abspath(input_file)
+
+    def digest(self, input_file):
+        """返回已索引內容的哈希，沒有索引過時返回None"""
+        row = self._db.execute("SELECT digest FROM decks WHERE path = ?",
+                               (self.deck_key(input_file),)).fetchone()
+        return row[0] if row else None
+
+    def update(self, input_file, digest, records):
+        """
+        寫入一份簡報的幻燈片
+
+        Args:
+            input_file: 輸入的TXT文件路徑
+            digest: file_digest() 的結果
+            records: slide_records() 的結果
+
+        Returns:
+            是否寫入了索引；哈希與已索引的相同時返回False
+        """
+        key = self.deck_key(input_file)
+        if len(records) >= 1 << _PAGE_BITS:
+            raise ValueError(f"幻燈片過多，無法索引: {input_file}")
+        with self._db:
+            row = self._db.execute("SELECT id, digest FROM decks WHERE path = ?", (key,)).fetchone()
+            if row is not None and row[1] == digest:
+                return False
+            if row is None:
+                deck_id = self._db.execute(
+                    "INSERT INTO decks (path, digest, slides, indexed) VALUES (?, ?, ?, ?)",
+                    (key, digest, len(records), time.time())).lastrowid
+            else:
+                deck_id = row[0]
+                self._delete_slides(deck_id)
+                self._db.execute("UPDATE decks SET digest = ?, slides = ?, indexed = ? WHERE id = ?",
+                                 (digest, len(records), time.time(), deck_id))
+            base = deck_id << _PAGE_BITS
+            self._db.executemany(
+                "INSERT INTO slide_text (rowid, title, body, heading) VALUES (?, ?, ?, ?)",
+                ((base + page, _segment(title), _segment(body), title)
+                 for page, (title, body) in enumerate(records, 1)))
+        return True
+
+    def index_file(self, input_file, slides=None):
+        """
+        索引一個輸入文件，內容未改變時不重新解析
+
+        Args:
+            input_file: 輸入的TXT文件路徑
+            slides: 已經解析好的幻燈片，如果為None則在需要時讀取
+
+        Returns:
+            是否寫入了索引
+        """
+        digest = file_digest(input_file)
+        if digest == self.digest(input_file):
+            return False
+        if slides is None:
+            slides = read_slides(input_file)
+        return self.update(input_file, digest, slide_records(slides))
+
+    def _delete_slides(self, deck_id):
+        base = deck_id << _PAGE_BITS
+        self._db.execute("DELETE FROM slide_text WHERE rowid >= ? AND rowid < ?",
+                         (base, base + (1 << _PAGE_BITS)))
+
+    def remove(self, input_file):
+        """從索引中刪除一份簡報，返回是否存在"""
+        with self._db:
+            row = self._db.execute("SELECT id FROM decks WHERE path = ?",
+                                   (self.deck_key(input_file),)).fetchone()
+            if row is None:
+                return False
+            self._delete_slides(row[0])
+            self._db.execute("DELETE FROM decks WHERE id = ?", (row[0],))
+        return True
+
+    def prune(self):
+        """刪除源文件已經不存在的簡報，返回刪除的數量"""
+        paths = [path for path, in self._db.execute("SELECT path FROM decks")]
+        missing = [path for path in paths if not os.path.exists(split_archive_path(path)[0])]
+        for path in missing:
+            self.remove(path)
+        return len(missing)
+
+    def search(self, query, limit=20):
+        """
+        搜索幻燈片
+
+        Args:
+            query: 以空白分隔的詞，所有詞都出現的幻燈片才匹配；標題中的匹配權重較高
+            limit: 最多返回的結果數
+
+        Returns:
+            SearchHit 列表，按相關度排序
+        """
+        match = _match_query(query)
+        if not match:
+            return []
+        rows = self._db.execute(
+            "SELECT decks.path, slide_text.rowid, heading, "
+            "snippet(slide_text, 1, char(2), char(3), '…', 24), bm25(slide_text, 5.0, 1.0) AS score "
+            "FROM slide_text JOIN decks ON decks.id = (slide_text.rowid >> ?) "
+            "WHERE slide_text MATCH ? ORDER BY score LIMIT ?",
+            (_PAGE_BITS, match, limit))
+        return [SearchHit(deck, rowid & ((1 << _PAGE_BITS) - 1), heading,
+                          _snippet_text(snippet), -score)
+                for deck, rowid, heading, snippet, score in rows]
+
+    def stats(self):
+        """返回 (簡報數, 幻燈片數)"""
+        return self._db.execute("SELECT COUNT(*), COALESCE(SUM(slides), 0) FROM decks").fetchone()
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def add_arguments(parser):
+    """為轉換命令添加 --index 參數"""
+    parser.add_argument('--index', nargs='?', const='', metavar='DB',
+                        help='將幻燈片的標題和正文寫入全文索引，默認為 ~/.cache/txt_to_marp_index.sqlite')
+
+def from_arguments(args):
+    """根據命令行參數打開SlideIndex，沒有指定 --index 時返回None"""
+    if args.index is None:
+        return None
+    return SlideIndex(args.index or None)
+
+def main():
+    parser = argparse.ArgumentParser(description='在已轉換簡報的全文索引中搜索幻燈片')
+    parser.add_argument('query', nargs='*', help='搜索詞，以空白分隔，所有詞都出現的幻燈片才匹配')
+    parser.add_argument('--index', metavar='DB', help='索引文件路徑，默認為 ~/.cache/txt_to_marp_index.sqlite')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='最多顯示的結果數')
+    parser.add_argument('--add', nargs='+', metavar='FILE', help='索引（或更新）指定的TXT文件')
+    parser.add_argument('--prune', action='store_true', help='刪除源文件已不存在的簡報')
+    parser.add_argument('--json', action='store_true', help='以JSON輸出搜索結果')
+
+    args = parser.parse_args()
+    if not (args.query or args.add or args.prune):
+        parser.error("請指定搜索詞、--add 或 --prune")
+
+    with SlideIndex(args.index) as index:
+        for input_file in args.add or ():
+            updated = index.index_file(input_file)
+            print(f"{'已索引' if updated else '未改變'}: {input_file}")
+        if args.prune:
+            print(f"已刪除 {index.prune()} 份不存在的簡報")
+        if not args.query:
+            return
+
+        start = time.perf_counter()
+        hits = index.search(" ".join(args.query), args.limit)
+        elapsed = time.perf_counter() - start
+        if args.json:
+            import json
+            json.dump([hit.to_dict() for hit in hits], sys.stdout, ensure_ascii=False, indent=2)
+            print()
+            return
+        for hit in hits:
+            print(f"{hit.deck}#{hit.page}  {hit.title}")
+            if hit.snippet:
+                print(f"    {hit.snippet}")
+        decks, slides = index.stats()
+        print(f"找到 {len(hits)} 條結果（共 {decks} 份簡報、{slides} 張幻燈片），耗時 {elapsed * 1000:.1f} 毫秒")
+
+if __name__ == "__main__":
+    main()
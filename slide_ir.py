@@ -0,0 +1,247 @@
+import re
+import sys
+
+from text_input import open_text
+from profiling import stage
+
+# 幻燈片分隔符：至少兩個連續的換行符
+SLIDE_SEPARATOR = re.compile(r'\n{2,}')
+
+# 列表項的匹配模式：縮進、列表標記、標記後的一個空白字符
+LIST_ITEM = re.compile(r'([ \t]*)([-*]|\d+\.)\s')
+
+# 可能以列表標記開頭的首字符，用於跳過大多數普通文本行
+_LIST_LEAD = frozenset(' \t-*0123456789')
+
+# 圖片行：Markdown圖片語法 ![說明](路徑)，或只有一個圖片文件路徑（不含空白）的行
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+_IMAGE_LINE = re.compile(r'[ \t]*!\[([^\]\n]*)\]\(\s*<?([^)>\n]+?)>?\s*\)[ \t]*$')
+_IMAGE_PATH = re.compile(r'[ \t]*(\S+\.(?:png|jpe?g|gif|bmp|webp))[ \t]*$', re.IGNORECASE)
+_IMAGE_TEXT = re.compile(r'\[([^\]\n]*)\]\((.*)\)$')
+
+# 圖片行可能的末字符（包括行尾空白），用於跳過大多數普通文本行
+_IMAGE_TAIL = frozenset(')gGpPfF \t')
+
+# 串流模式每次讀取的字符數
+STREAM_CHUNK_SIZE = 1 << 20
+
+# 段落類型
+PLAIN = 0
+BULLET = 1
+ORDERED = 2
+IMAGE = 3
+
+# 無序列表統一使用的標記
+BULLET_MARKER = sys.intern('-')
+
+# 圖片段落的前綴，文本保存為 [說明](路徑)，與前綴拼接後正好是Markdown圖片語法
+IMAGE_PREFIX = sys.intern('!')
+
+
+class Paragraph:
+    """
+    幻燈片中的一個段落（內容行）
+
+    prefix 是經過駐留(intern)的列表前綴，例如 '- '、'1. '，普通段落為空字符串，
+    圖片段落為 IMAGE_PREFIX，相同的前綴在整份文檔中只保存一份
+    """
+    __slots__ = ('prefix', 'text')
+
+    def __init__(self, prefix, text):
+        self.prefix = prefix
+        self.text = text
+
+    @property
+    def marker(self):
+        """列表標記，例如 '-' 或 '1.'，普通段落為空字符串"""
+        return self.prefix.strip()
+
+    @property
+    def indent(self):
+        """列表項前的縮進"""
+        return self.prefix[:len(self.prefix) - len(self.prefix.lstrip())]
+
+    @property
+    def kind(self):
+        """段落類型：PLAIN、BULLET、ORDERED 或 IMAGE"""
+        marker = self.marker
+        if not marker:
+            return PLAIN
+        if marker == IMAGE_PREFIX:
+            return IMAGE
+        return BULLET if marker == BULLET_MARKER else ORDERED
+
+    @property
+    def image(self):
+        """圖片段落的 (說明, 路徑)，其他段落為None"""
+        if self.prefix != IMAGE_PREFIX:
+            return None
+        match = _IMAGE_TEXT.match(self.text)
+        return match.group(1), match.group(2)
+
+    def __repr__(self):
+        return f"Paragraph({self.prefix!r}, {self.text!r})"
+
+
+class Slide:
+    """
+    一張幻燈片的緊湊中間表示
+
+    內容不保存為字符串列表，而是一個以換行符連接的 body 字符串，
+    加上每行對應的駐留前綴元組，Paragraph 對象只在遍歷時按需創建
+    """
+    __slots__ = ('title', 'prefixes', 'body')
+
+    def __init__(self, title, prefixes=(), body=""):
+        self.title = title
+        self.prefixes = prefixes
+        self.body = body
+
+    @property
+    def paragraphs(self):
+        """按順序返回幻燈片的段落"""
+        if not self.prefixes:
+            return []
+        return [Paragraph(prefix, text)
+                for prefix, text in zip(self.prefixes, self.body.split('\n'))]
+
+    @property
+    def images(self):
+        """按順序返回幻燈片中圖片的 (說明, 路徑) 列表"""
+        if IMAGE_PREFIX not in self.prefixes:
+            return []
+        return [paragraph.image for paragraph in self.paragraphs if paragraph.prefix == IMAGE_PREFIX]
+
+    def __repr__(self):
+        return f"Slide({self.title!r}, {len(self.prefixes)} paragraphs)"
+
+
+def match_image(line):
+    """圖片行返回規範化的 [說明](路徑) 文本，其他行返回None"""
+    stripped = line.rstrip()
+    if stripped.endswith(')'):
+        match = _IMAGE_LINE.match(line)
+        if match:
+            return f"[{match.group(1)}]({match.group(2).strip()})"
+    elif stripped[-5:].lower().endswith(IMAGE_EXTENSIONS):
+        match = _IMAGE_PATH.match(line)
+        if match:
+            return f"[]({match.group(1)})"
+    return None
+
+def parse_slide(block):
+    """
+    將一段幻燈片文本解析為Slide
+
+    Args:
+        block: 幻燈片的原始文本（已按空行切分）
+
+    Returns:
+        Slide，空白文本返回None
+    """
+    block = block.strip()
+    if not block:
+        return None
+
+    # 假設第一行是標題
+    lines = block.split('\n')
+    title = lines[0]
+    content_lines = lines[1:]
+
+    prefixes = []
+    has_list = False
+    for i, line in enumerate(content_lines):
+        # 自動檢測列表項
+        match = LIST_ITEM.match(line) if line[:1] in _LIST_LEAD else None
+        if match is None:
+            image = match_image(line) if line[-1:] in _IMAGE_TAIL else None
+            if image is None:
+                prefixes.append("")
+            else:
+                prefixes.append(IMAGE_PREFIX)
+                content_lines[i] = image
+                has_list = True
+            continue
+        indent, marker = match.group(1), match.group(2)
+        if marker == '*':
+            marker = BULLET_MARKER
+        prefixes.append(sys.intern(f"{indent}{marker} "))
+        content_lines[i] = line[match.end():]
+        has_list = True
+
+    body = "\n".join(content_lines) if has_list else block[len(title) + 1:]
+    return Slide(title, tuple(prefixes), body)
+
+
+def iter_slide_blocks(f, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    從文件對象中逐塊讀取，增量地切分出幻燈片文本
+
+    切分結果與 re.split(r'\n{2,}', f.read()) 相同，但內存只保留當前未完成的幻燈片
+
+    Args:
+        f: 以文本模式打開的文件對象
+        chunk_size: 每次讀取的字符數
+    """
+    pending = ""
+    scan_from = 0
+    while True:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        pending += chunk
+
+        start = 0
+        for match in SLIDE_SEPARATOR.finditer(pending, scan_from):
+            # 位於緩衝區末尾的換行符可能在下一塊繼續，等待更多數據
+            if not eof and match.end() == len(pending):
+                break
+            yield pending[start:match.start()]
+            start = match.end()
+
+        pending = pending[start:]
+        if eof:
+            yield pending
+            return
+
+        # 只需從末尾的換行符開始重新掃描
+        scan_from = len(pending.rstrip('\n'))
+
+
+def iter_slides(f, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    從文件對象中以串流方式逐張解析幻燈片
+
+    Args:
+        f: 以文本模式打開的文件對象
+        chunk_size: 每次讀取的字符數
+    """
+    for block in iter_slide_blocks(f, chunk_size):
+        slide = parse_slide(block)
+        if slide is not None:
+            yield slide
+
+
+def parse_slides(content):
+    """
+    將完整的文本內容解析為幻燈片列表
+
+    Args:
+        content: TXT文件的全部內容
+    """
+    slides = []
+    for block in SLIDE_SEPARATOR.split(content):
+        slide = parse_slide(block)
+        if slide is not None:
+            slides.append(slide)
+    return slides
+
+
+def read_slides(input_file):
+    """
+    讀取TXT文件並解析為幻燈片列表
+
+    Args:
+        input_file: 輸入的TXT文件路徑，可以是壓縮文件或zip成員（見 text_input.open_text）
+    """
+    with stage('parse'), open_text(input_file) as f:
+        return list(iter_slides(f))
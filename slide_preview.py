@@ -0,0 +1,326 @@
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+from slide_ir import BULLET, IMAGE, ORDERED, SLIDE_SEPARATOR, parse_slide
+from text_input import open_text, split_archive_path
+
+# 縮略圖尺寸（16:9）和間距，單位為像素
+THUMB_WIDTH = 192
+THUMB_HEIGHT = 108
+THUMB_GAP = 12
+
+# 縮略圖中最多顯示的正文行數和每行的寬度（半角字符數，全角字符計為2）
+BODY_LINES = 6
+LINE_WIDTH = 40
+
+# 檢查源文件是否改變的間隔（毫秒）
+POLL_INTERVAL = 500
+
+# 主題 -> (背景色, 文字顏色, 標題顏色)，近似Marp內置主題的配色
+THEME_COLORS = {
+    'default': ('#ffffff', '#24292f', '#24292f'),
+    'gaia': ('#fff8e1', '#455a64', '#0288d1'),
+    'uncover': ('#fdfcff', '#202228', '#202228'),
+}
+
+_TITLE_FONT = ('Arial', 9, 'bold')
+_BODY_FONT = ('Arial', 7)
+
+# 解析結果緩存中表示「沒有記錄」，與空白幻燈片的None區分
+_MISSING = object()
+
+def _clip(text, width):
+    """按顯示寬度截斷文本，全角字符計為2"""
+    used = 0
+    for i, char in enumerate(text):
+        used += 2 if ord(char) >= 0x2E80 else 1
+        if used > width:
+            return text[:i] + "…"
+    return text
+
+def _preview_lines(slide):
+    """返回縮略圖中顯示的正文行"""
+    lines = []
+    for paragraph in slide.paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        kind = paragraph.kind
+        if kind == IMAGE:
+            alt, path = paragraph.image
+            text = f"[圖片] {alt or os.path.basename(path)}"
+        elif kind == ORDERED:
+            text = f"{paragraph.marker} {text}"
+        elif kind == BULLET:
+            text = f"• {text}"
+        lines.append(_clip(paragraph.indent + text, LINE_WIDTH))
+        if len(lines) == BODY_LINES:
+            break
+    return lines
+
+class IncrementalParser:
+    """
+    增量解析幻燈片文本
+
+    以每張幻燈片的原始文本為鍵保存上一次的解析結果，源文件改變後只有新出現或
+    改動過的幻燈片需要重新解析。未改變的幻燈片沿用同一個 Slide 對象，
+    預覽據此只重繪內容改變了的縮略圖
+    """
+
+    def __init__(self):
+        self._cache = {}  # 幻燈片文本 -> Slide（空白文本為None）
+        self.slides = []
+
+    def update(self, content):
+        """
+        解析新的文本內容
+
+        Args:
+            content: 源文件的全部內容
+
+        Returns:
+            (幻燈片列表, 重新解析的幻燈片數)
+        """
+        previous = self._cache
+        cache = {}
+        slides = []
+        parsed = 0
+        for block in SLIDE_SEPARATOR.split(content):
+            slide = previous.get(block, _MISSING)
+            if slide is _MISSING:
+                slide = cache.get(block, _MISSING)
+                if slide is _MISSING:
+                    slide = parse_slide(block)
+                    parsed += 1
+            cache[block] = slide
+            if slide is not None:
+                slides.append(slide)
+        self._cache = cache
+        self.slides = slides
+        return slides, parsed
+
+def _source_stat(path):
+    """返回用於判斷源文件是否改變的 (修改時間, 大小)，文件不存在時返回None"""
+    try:
+        st = os.stat(split_archive_path(path)[0])
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+class PreviewPane(ttk.Frame):
+    """
+    以縮略圖網格顯示幻燈片的預覽面板
+
+    畫布只包含可見範圍內的縮略圖：滾動時移動已有的縮略圖，刪除移出視圖的，
+    只為新進入視圖的幻燈片創建畫布項目，因此繪製開銷與幻燈片總數無關。
+    縮略圖的座標相對於視圖頂端，不依賴畫布的滾動區域，數萬張幻燈片也不會超出座標範圍。
+
+    源文件每 POLL_INTERVAL 毫秒檢查一次，改變時在後台線程中讀取並增量解析
+    （見 IncrementalParser），解析完成後只重繪內容改變了的可見縮略圖
+
+    用法：
+
+        preview = PreviewPane(parent)
+        preview.pack(fill=tk.BOTH, expand=True)
+        preview.set_source("talk.txt")
+    """
+
+    def __init__(self, master, theme="default"):
+        """
+        Args:
+            master: 父控件
+            theme: 縮略圖配色使用的主題名稱，見 THEME_COLORS
+        """
+        super().__init__(master)
+        self.slides = []
+        self.top = 0  # 視圖頂端在整個網格中的像素位置
+        self.colors = THEME_COLORS.get(theme, THEME_COLORS['default'])
+        self._columns = 1
+        self._drawn = {}  # 幻燈片序號 -> 繪製時的 Slide
+        self._source = None
+        self._stat = None
+        self._parser = IncrementalParser()
+        self._loading = False
+        self._results = queue.Queue()
+
+        self.info_var = tk.StringVar(value="沒有預覽")
+        ttk.Label(self, textvariable=self.info_var, anchor=tk.W).pack(side=tk.TOP, fill=tk.X)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self, background='#d0d0d0', highlightthickness=0,
+                                width=THUMB_WIDTH * 2 + THUMB_GAP * 3)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', self._on_resize)
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda event: self._scroll_to(self.top - self._row_height))
+        self.canvas.bind('<Button-5>', lambda event: self._scroll_to(self.top + self._row_height))
+        self._poll_id = self.after(POLL_INTERVAL, self._poll)
+
+    @property
+    def _row_height(self):
+        return THUMB_HEIGHT + THUMB_GAP
+
+    @property
+    def _total_height(self):
+        rows = -(-len(self.slides) // self._columns)
+        return rows * self._row_height + THUMB_GAP
+
+    def _view_height(self):
+        return max(self.canvas.winfo_height(), 1)
+
+    def _visible_range(self):
+        """返回可見幻燈片的序號範圍 [start, end)"""
+        # 底邊在視圖頂端之下的第一行
+        first_row = max(0, (self.top - THUMB_GAP - THUMB_HEIGHT) // self._row_height + 1)
+        last_row = (self.top + self._view_height()) // self._row_height
+        return (min(first_row * self._columns, len(self.slides)),
+                min((last_row + 1) * self._columns, len(self.slides)))
+
+    def _position(self, index):
+        """返回縮略圖左上角相對於視圖的座標"""
+        row, column = divmod(index, self._columns)
+        return (THUMB_GAP + column * (THUMB_WIDTH + THUMB_GAP),
+                THUMB_GAP + row * self._row_height - self.top)
+
+    def _draw(self, index):
+        slide = self.slides[index]
+        background, color, title_color = self.colors
+        x, y = self._position(index)
+        tags = ('thumb', f's{index}')
+        canvas = self.canvas
+        canvas.create_rectangle(x, y, x + THUMB_WIDTH, y + THUMB_HEIGHT,
+                                fill=background, outline='#a0a0a0', tags=tags)
+        canvas.create_text(x + 8, y + 6, anchor=tk.NW, text=_clip(slide.title.lstrip('#').strip(), 34),
+                           fill=title_color, font=_TITLE_FONT, tags=tags)
+        for i, line in enumerate(_preview_lines(slide)):
+            canvas.create_text(x + 8, y + 24 + i * 12, anchor=tk.NW, text=line,
+                               fill=color, font=_BODY_FONT, tags=tags)
+        canvas.create_text(x + THUMB_WIDTH - 6, y + THUMB_HEIGHT - 4, anchor=tk.SE, text=str(index + 1),
+                           fill='#808080', font=_BODY_FONT, tags=tags)
+        self._drawn[index] = slide
+
+    def _redraw(self):
+        """刪除不再可見或內容已改變的縮略圖，補畫新進入視圖的縮略圖"""
+        start, end = self._visible_range()
+        slides = self.slides
+        for index, slide in list(self._drawn.items()):
+            if not start <= index < end or slides[index] is not slide:
+                self.canvas.delete(f's{index}')
+                del self._drawn[index]
+        for index in range(start, end):
+            if index not in self._drawn:
+                self._draw(index)
+        total = self._total_height
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self._view_height()) / total))
+
+    def _clear(self):
+        self.canvas.delete('thumb')
+        self._drawn.clear()
+
+    def _scroll_to(self, top):
+        top = int(max(0, min(top, self._total_height - self._view_height())))
+        if top != self.top:
+            # 已有的縮略圖整體移動，不重新創建
+            self.canvas.move('thumb', 0, self.top - top)
+            self.top = top
+        self._redraw()
+
+    def _yview(self, *args):
+        """滾動條的回調，參數與 Canvas.yview 相同"""
+        if args[0] == 'moveto':
+            self._scroll_to(float(args[1]) * self._total_height)
+        elif args[0] == 'scroll':
+            step = self._view_height() if args[2] == 'pages' else self._row_height
+            self._scroll_to(self.top + int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        # Windows的delta以120為一格，macOS為較小的整數
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self._scroll_to(self.top - steps * self._row_height)
+
+    def _on_resize(self, event):
+        columns = max(1, (event.width - THUMB_GAP) // (THUMB_WIDTH + THUMB_GAP))
+        if columns != self._columns:
+            # 列數改變時保持視圖頂端的幻燈片不變
+            first = (self.top // self._row_height) * self._columns
+            self._columns = columns
+            self.top = (first // columns) * self._row_height
+            self._clear()
+        self._scroll_to(self.top)
+
+    def set_source(self, path):
+        """
+        設置預覽的源文件，None表示清空預覽
+
+        Args:
+            path: TXT文件路徑，可以是壓縮文件或zip成員（見 text_input.open_text）
+        """
+        if path == self._source:
+            return
+        self._source = path
+        self._stat = None
+        # 正在進行的解析使用舊的解析器，結果會因路徑不同而被丟棄
+        self._parser = IncrementalParser()
+        self._apply([], "沒有預覽" if path is None else "正在讀取...")
+
+    def set_theme(self, theme):
+        """改變縮略圖的配色"""
+        colors = THEME_COLORS.get(theme, THEME_COLORS['default'])
+        if colors != self.colors:
+            self.colors = colors
+            self._clear()
+            self._redraw()
+
+    def _apply(self, slides, info):
+        self.slides = slides
+        self.info_var.set(info)
+        self._scroll_to(self.top)
+
+    def _load(self, path, parser):
+        """
+        在後台線程中讀取並增量解析源文件
+
+        任何異常都作為結果傳回，否則 _loading 不會被重置，之後不再重新讀取：
+        截斷的 .xz/.bz2 文件拋出 EOFError，損壞的zip包拋出 zipfile.BadZipFile
+        """
+        try:
+            with open_text(path) as f:
+                content = f.read()
+            slides, parsed = parser.update(content)
+            self._results.put((path, slides, parsed, None))
+        except Exception as e:
+            self._results.put((path, None, 0, e))
+
+    def _poll(self):
+        try:
+            while True:
+                path, slides, parsed, error = self._results.get_nowait()
+                self._loading = False
+                if path != self._source:
+                    continue
+                if error is not None:
+                    self._apply([], f"無法預覽: {error}")
+                else:
+                    self._apply(slides, f"{len(slides)} 張幻燈片（重新解析 {parsed} 張）")
+        except queue.Empty:
+            pass
+
+        if self._source is not None and not self._loading:
+            stat = _source_stat(self._source)
+            if stat != self._stat:
+                self._stat = stat
+                if stat is None:
+                    self._apply([], "找不到源文件")
+                else:
+                    self._loading = True
+                    threading.Thread(target=self._load, args=(self._source, self._parser),
+                                     daemon=True).start()
+        self._poll_id = self.after(POLL_INTERVAL, self._poll)
+
+    def destroy(self):
+        self.after_cancel(self._poll_id)
+        super().destroy()
@@ -0,0 +1,53 @@
+"""
+測試用的假Marp伺服器，代替 marp --server
+
+用法與Marp相同：fake_marp_server.py --server 目錄，端口通過環境變量 PORT 傳遞。
+GET /路徑?格式 返回 "格式:" 加上文件內容；文件內容包含 FAIL 時返回500；
+以相對路徑引用的圖片（![](路徑)）在Markdown所在目錄中不存在時返回404，與Marp渲染出缺圖的頁面不同，
+測試可以直接發現；
+環境變量 FAKE_MARP_CRASH_ONCE 指向的文件存在時刪除它並立即退出，用於測試崩潰後重啟
+"""
+import os
+import re
+import sys
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+def main():
+    root = sys.argv[sys.argv.index('--server') + 1]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, fmt = self.path.partition('?')
+            if path == '/':
+                return self._reply(200, b'ok')
+            crash_file = os.environ.get('FAKE_MARP_CRASH_ONCE')
+            if crash_file and os.path.exists(crash_file):
+                os.remove(crash_file)
+                os._exit(1)
+            md_file = os.path.join(root, urllib.parse.unquote(path.lstrip('/')))
+            try:
+                with open(md_file, 'rb') as f:
+                    content = f.read()
+            except OSError:
+                return self._reply(404, b'not found')
+            if b'FAIL' in content:
+                return self._reply(500, b'render failed')
+            for image in re.findall(rb'!\[[^\]]*\]\(([^)\s:]+)\)', content):
+                if not os.path.exists(os.path.join(os.path.dirname(md_file), image.decode('utf-8'))):
+                    return self._reply(404, b'image not found: ' + image)
+            self._reply(200, fmt.encode('ascii') + b':' + content)
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    HTTPServer(('127.0.0.1', int(os.environ['PORT'])), Handler).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from image_assets import ASSET_DIR, AssetCache, ImageResolver
+
+class ImageAssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.dir, 'src')
+        os.makedirs(os.path.join(self.source, 'img'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _image(self, name, size=1000):
+        # 無法解碼的圖片原樣放入緩存，不需要Pillow
+        path = os.path.join(self.source, 'img', name)
+        with open(path, 'wb') as f:
+            f.write(name.encode('ascii') * (size // len(name)))
+        return path
+
+    def _cache(self, max_bytes=1 << 30):
+        return AssetCache(os.path.join(self.dir, 'cache'), max_size=None, workers=1, max_bytes=max_bytes)
+
+    def test_markdown_references_copy_next_to_output(self):
+        self._image('a.png')
+        output_dir = os.path.join(self.dir, 'out')
+        images = ImageResolver(self.source, self._cache()).for_output(os.path.join(output_dir, 'deck.md'))
+        reference = images.marp_path('img/a.png')
+        self.assertTrue(reference.startswith(ASSET_DIR + "/"))
+        self.assertFalse(os.path.isabs(reference))
+        with open(os.path.join(output_dir, reference), 'rb') as f:
+            self.assertTrue(f.read().startswith(b'a.png'))
+        self.assertEqual(images.marp_path('img/missing.png'), 'img/missing.png')
+        self.assertEqual(images.marp_path('https://example.com/a.png'), 'https://example.com/a.png')
+
+    def test_evicts_least_recently_used(self):
+        paths = [self._image(f"{name}.png") for name in 'abc']
+        cache = self._cache()
+        assets = [cache.get(path) for path in paths]
+        for age, asset in zip((30, 20, 10), assets):
+            stamp = time.time() - age
+            os.utime(asset.path, (stamp, stamp))
+
+        # 新的緩存對象不持有任何圖片，清理時從最舊的開始刪除
+        small = self._cache(max_bytes=2000)
+        small.evict()
+        self.assertEqual([os.path.exists(asset.path) for asset in assets], [False, True, True])
+
+    def test_evict_keeps_images_in_use(self):
+        cache = self._cache(max_bytes=0)
+        asset = cache.get(self._image('a.png'))
+        self.assertTrue(os.path.exists(asset.path))
+        other = self._cache(max_bytes=0)
+        other.evict()
+        self.assertFalse(os.path.exists(asset.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from build_cache import BuildCache
+from incremental_pdf import export_pdf_incremental, split_marp, stamps_like_marp
+from pdf_merge import PdfReader
+
+def _write_pdf(path, pages):
+    """寫入每頁只有一條註釋的PDF，註釋是該頁Markdown的第一行，用於核對頁面順序"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (3 + 2 * i) for i in range(len(pages))), len(pages))]
+    for i, page in enumerate(pages):
+        content = b"% " + page.split("\n")[0].encode('utf-8')
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 1280 720] /Contents %d 0 R >>"
+                       % (4 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+class StubRenderer:
+    """代替Marp CLI的渲染函數，記錄每次渲染的Markdown文件和頁數"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, md_file, pdf_file):
+        with open(md_file, encoding='utf-8') as f:
+            _, pages = split_marp(f.read())
+        self.calls.append((md_file, len(pages)))
+        _write_pdf(pdf_file, pages)
+
+class IncrementalPdfTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = BuildCache(os.path.join(self.dir, 'cache'))
+        self.renderer = StubRenderer()
+        self.md_file = os.path.join(self.dir, 'deck.md')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _export(self, theme="default", paginate=True, titles=("# 一", "# 二", "# 三"), theme_set=()):
+        with open(self.md_file, 'w', encoding='utf-8') as f:
+            f.write(f"---\nmarp: true\ntheme: {theme}\npaginate: {'true' if paginate else 'false'}\n---\n\n")
+            f.write("\n\n---\n\n".join(titles) + "\n")
+        return export_pdf_incremental(self.md_file, cache=self.cache, renderer=self.renderer,
+                                      theme_set=theme_set)
+
+    def _read_output(self):
+        with open(os.path.splitext(self.md_file)[0] + ".pdf", 'rb') as f:
+            return f.read()
+
+    def test_renders_only_changed_slides(self):
+        self.assertEqual(self._export()[1:], (3, 3))
+        self.assertEqual(self._export(titles=("# 一", "# 改", "# 三"))[1:], (1, 3))
+        self.assertEqual(self.renderer.calls[-1][1], 1)
+        data = self._read_output()
+        self.assertEqual(len(PdfReader(data).pages), 3)
+        self.assertLess(data.index("% # 一".encode('utf-8')), data.index("% # 改".encode('utf-8')))
+        # 頁碼在合併時蓋印
+        for label in (b"(1) Tj", b"(2) Tj", b"(3) Tj"):
+            self.assertIn(label, data)
+
+    def test_other_themes_render_whole_deck(self):
+        for theme in ("gaia", "uncover"):
+            self.assertEqual(self._export(theme)[1:], (3, 3))
+            self.assertEqual(self.renderer.calls[-1], (self.md_file, 3))
+            self.assertNotIn(b"(1) Tj", self._read_output())
+
+    def test_theme_set_renders_whole_deck(self):
+        css = os.path.join(self.dir, 'custom.css')
+        with open(css, 'w', encoding='utf-8') as f:
+            f.write("/* @theme custom */\nsection::after { color: red; }\n")
+        self._export("custom", theme_set=[css])
+        self.assertEqual(self.renderer.calls[-1], (self.md_file, 3))
+
+    def test_other_themes_without_pagination_stay_incremental(self):
+        self._export("gaia", paginate=False)
+        self.assertEqual(self._export("gaia", paginate=False, titles=("# 一", "# 改", "# 三"))[1:], (1, 3))
+
+    def test_stamps_like_marp(self):
+        self.assertTrue(stamps_like_marp("---\nmarp: true\npaginate: true\n---\n\n"))
+        self.assertTrue(stamps_like_marp("---\ntheme: default\n---\n\n"))
+        self.assertFalse(stamps_like_marp("---\ntheme: gaia\n---\n\n"))
+        self.assertFalse(stamps_like_marp("---\ntheme: default\n---\n\n", ["custom.css"]))
+        self.assertFalse(stamps_like_marp("---\ntheme: default\n---\n\n<style>\nsection::after { top: 0; }\n</style>\n\n"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+from marp_export import _export_with_worker
+from marp_worker import MarpWorker, MarpWorkerError
+
+FAKE_SERVER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_marp_server.py')]
+
+class MarpWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.worker = MarpWorker(command=FAKE_SERVER, startup_timeout=10, request_timeout=10)
+
+    def tearDown(self):
+        self.worker.close()
+        os.environ.pop('FAKE_MARP_CRASH_ONCE', None)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_export(self):
+        output = self.worker.export(self._write('deck.md', '# Hello'), 'pdf')
+        self.assertEqual(output, os.path.join(self.dir, 'deck.pdf'))
+        self.assertEqual(self._read(output), b'pdf:# Hello')
+
+    def test_cjk_and_space_names(self):
+        for name in ('簡報.md', 'a b.md', 'x%20y#1.md'):
+            output = self.worker.export(self._write(name, '# 標題'), 'pptx')
+            self.assertEqual(self._read(output), 'pptx:# 標題'.encode('utf-8'))
+
+    def test_relative_assets(self):
+        os.makedirs(os.path.join(self.dir, 'assets'))
+        self._write(os.path.join('assets', 'abc.png'), 'png')
+        content = '# 圖\n\n![](assets/abc.png)\n'
+        output = self.worker.export(self._write('deck.md', content), 'pdf')
+        self.assertEqual(self._read(output), ('pdf:' + content).encode('utf-8'))
+
+    def test_missing_asset_fails(self):
+        with self.assertRaises(MarpWorkerError):
+            self.worker.export(self._write('deck.md', '![](assets/missing.png)\n'), 'pdf')
+
+    def test_restart_after_crash(self):
+        # 伺服器啟動時繼承環境變量，第一次導出之後才創建標記文件
+        os.environ['FAKE_MARP_CRASH_ONCE'] = os.path.join(self.dir, 'crash')
+        md_file = self._write('deck.md', '# Hello')
+        self.worker.export(md_file, 'pdf')
+        self._write('crash', '')
+        self.assertEqual(self._read(self.worker.export(md_file, 'pdf')), b'pdf:# Hello')
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_failure_keeps_cause(self):
+        with self.assertRaises(MarpWorkerError) as context:
+            self.worker.export(self._write('bad.md', 'FAIL'), 'pdf')
+        self.assertIsNotNone(context.exception.__cause__)
+
+    def test_export_with_worker_chains_error(self):
+        md_file = self._write('bad.md', 'FAIL')
+        with self.assertRaises(Exception) as context:
+            _export_with_worker([md_file], ['pdf'], self.worker)
+        self.assertIsInstance(context.exception.__cause__, MarpWorkerError)
+        self.assertIn('500', str(context.exception))
+
+    def test_idle_timeout(self):
+        self.worker.idle_timeout = 0.2
+        self.worker.export(self._write('deck.md', '# Hello'), 'pdf')
+        self.assertTrue(self.worker.running)
+        deadline = time.monotonic() + 5
+        while self.worker.running and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(self.worker.running)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+import io
+import re
+import zlib
+import unittest
+
+from pdf_merge import PdfMerger, PdfReader, Ref, Stream, _unpredict
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+def _png_encode(data, width, kinds):
+    """以PNG預測器編碼，逐行輪流使用 kinds 中的過濾類型（bpp為1）"""
+    out = bytearray()
+    previous = bytearray(width)
+    for n, start in enumerate(range(0, len(data), width)):
+        row = data[start:start + width]
+        kind = kinds[n % len(kinds)]
+        encoded = bytearray()
+        for i, value in enumerate(row):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            upper_left = previous[i - 1] if i else 0
+            if kind == 1:
+                predicted = left
+            elif kind == 2:
+                predicted = up
+            elif kind == 3:
+                predicted = (left + up) // 2
+            elif kind == 4:
+                p = left + up - upper_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - upper_left)
+                predicted = left if pa <= pb and pa <= pc else up if pb <= pc else upper_left
+            else:
+                predicted = 0
+            encoded.append((value - predicted) & 0xff)
+        out.append(kind)
+        out += encoded
+        previous = bytearray(row)
+    return bytes(out)
+
+def build_pdf(objects, root=1, xref_stream=False, predictor=False):
+    """
+    由 {編號: 對象內容} 生成PDF
+
+    Args:
+        objects: 對象編號到 obj ... endobj 之間內容的字典
+        root: 目錄對象的編號
+        xref_stream: 使用交叉引用流代替交叉引用表
+        predictor: 交叉引用流使用PNG預測器（Predictor 12）
+    """
+    out = bytearray(b"%PDF-1.7\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(out)
+    size = max(objects) + 2 if xref_stream else max(objects) + 1
+    if not xref_stream:
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+        for number in range(1, size):
+            out += (b"%010d 00000 n \n" % offsets[number]) if number in offsets else b"0000000000 00000 f \n"
+        out += b"trailer\n<< /Size %d /Root %d 0 R >>\n" % (size, root)
+    else:
+        offsets[size - 1] = xref
+        rows = b"".join(bytes([1 if number in offsets else 0]) + offsets.get(number, 0).to_bytes(4, 'big')
+                        + b"\0\0" for number in range(size))
+        parms = b""
+        if predictor:
+            rows = _png_encode(rows, 7, (0, 1, 2, 3, 4))
+            parms = b" /DecodeParms << /Predictor 12 /Columns 7 >>"
+        data = zlib.compress(rows)
+        out += (b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root %d 0 R /Filter /FlateDecode%s /Length %d >>\n"
+                b"stream\n" % (size - 1, size, root, parms, len(data)) + data + b"\nendstream\nendobj\n")
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(out)
+
+def _content(text):
+    data = b"BT /F1 24 Tf 40 400 Td (" + text + b") Tj ET"
+    return b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data)
+
+def simple_pdf(count=3, **kwargs):
+    """每頁一段文字的PDF，MediaBox和Resources放在頁面樹上由頁面繼承"""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Count %d /Kids [%s] /MediaBox [0 0 960 540] /Resources << /Font << /F1 3 0 R >> >> >>"
+           % (count, b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(count))),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i in range(count):
+        objects[4 + 2 * i] = b"<< /Type /Page /Parent 2 0 R /Contents %d 0 R >>" % (5 + 2 * i)
+        objects[5 + 2 * i] = _content(b"Page %d" % (i + 1))
+    return build_pdf(objects, **kwargs)
+
+def merge(pages, labels=False):
+    """合併 [(PdfReader, 頁序號)]，返回輸出的字節"""
+    buffer = io.BytesIO()
+    merger = PdfMerger(buffer)
+    for number, (reader, index) in enumerate(pages, 1):
+        merger.add_page(reader, index, str(number) if labels else None)
+    merger.close()
+    return buffer.getvalue()
+
+def page_texts(data):
+    """按順序返回每頁各內容流（未壓縮）中 Tj 顯示的文字，連在一起"""
+    reader = PdfReader(data)
+    texts = []
+    for _, page in reader.pages:
+        contents = reader.resolve(page[b'Contents'])
+        streams = contents if isinstance(contents, list) else [page[b'Contents']]
+        content = b"".join(reader.resolve(stream).data for stream in streams)
+        texts.append(b"".join(re.findall(rb'\(([^)]*)\) Tj', content)))
+    return texts
+
+class UnpredictTest(unittest.TestCase):
+    def test_all_row_filters(self):
+        data = bytes(range(256)) * 3 + bytes(reversed(range(256))) * 2
+        for kinds in ((0,), (1,), (2,), (3,), (4,), (0, 1, 2, 3, 4)):
+            encoded = _png_encode(data, 8, kinds)
+            self.assertEqual(_unpredict(encoded, {b'Predictor': 12, b'Columns': 8}), data)
+
+class PdfReaderTest(unittest.TestCase):
+    def test_xref_table(self):
+        reader = PdfReader(simple_pdf())
+        self.assertEqual(len(reader.pages), 3)
+
+    def test_xref_stream_with_predictor(self):
+        reader = PdfReader(simple_pdf(xref_stream=True, predictor=True))
+        self.assertEqual([number for number, _ in reader.pages], [4, 6, 8])
+
+    def test_inherited_attributes(self):
+        _, page = PdfReader(simple_pdf()).pages[0]
+        self.assertEqual(page[b'MediaBox'], [0, 0, 960, 540])
+        self.assertIn(b'Resources', page)
+
+    def test_rebuild_broken_startxref(self):
+        for kwargs in ({}, {'xref_stream': True}):
+            data = simple_pdf(**kwargs)
+            position = data.rindex(b'startxref')
+            broken = data[:position] + b"startxref\n99999\n%%EOF\n"
+            self.assertEqual(len(PdfReader(broken).pages), 3)
+
+class PdfMergerTest(unittest.TestCase):
+    def test_merge_order_and_inherited_stamp(self):
+        first = PdfReader(simple_pdf())
+        second = PdfReader(simple_pdf(2, xref_stream=True, predictor=True))
+        data = merge([(first, 2), (second, 0), (first, 0)], labels=True)
+        # 原有文字之後是蓋印的頁碼
+        self.assertEqual(page_texts(data), [b"Page 31", b"Page 12", b"Page 13"])
+        reader = PdfReader(data)
+        for _, page in reader.pages:
+            # 繼承的MediaBox和Resources寫入每個頁面，頁碼字體加入頁面自己的資源字典副本
+            self.assertEqual(page[b'MediaBox'], [0, 0, 960, 540])
+            fonts = reader.resolve(reader.resolve(page[b'Resources'])[b'Font'])
+            self.assertIn(b'F1', fonts)
+            self.assertIn(b'TxtToMarpPageNumber', fonts)
+        # 頁碼按頁面高度縮放：540 / 720
+        self.assertIn(b"18.00 Tf", data)
+
+    def test_shared_objects_written_once(self):
+        reader = PdfReader(simple_pdf())
+        data = merge([(reader, 0), (reader, 1), (reader, 2)])
+        self.assertEqual(data.count(b"/BaseFont /Helvetica"), 1)
+
+    def test_circular_references(self):
+        objects = {
+            1: b"<< /Type /Catalog /Pages 2 0 R >>",
+            2: b"<< /Type /Pages /Count 1 /Kids [3 0 R] >>",
+            3: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 960 540] /Contents 4 0 R "
+               b"/Resources << /XObject << /A 5 0 R >> >> /Annots [7 0 R] >>",
+            4: _content(b"Loop"),
+            # 兩個表單互相引用
+            5: b"<< /Type /XObject /Subtype /Form /BBox [0 0 1 1] /Resources << /XObject << /B 6 0 R >> >> "
+               b"/Length 0 >>\nstream\n\nendstream",
+            6: b"<< /Type /XObject /Subtype /Form /BBox [0 0 1 1] /Resources << /XObject << /A 5 0 R >> >> "
+               b"/Length 0 >>\nstream\n\nendstream",
+            # 註釋指回所在的頁面
+            7: b"<< /Type /Annot /Subtype /Text /Rect [0 0 10 10] /P 3 0 R >>",
+        }
+        data = merge([(PdfReader(build_pdf(objects)), 0)])
+        reader = PdfReader(data)
+        number, page = reader.pages[0]
+        form_a = reader.resolve(page[b'Resources'])[b'XObject'][b'A']
+        form_b = reader.resolve(form_a).dict[b'Resources'][b'XObject'][b'B']
+        self.assertIsInstance(reader.resolve(form_b), Stream)
+        self.assertEqual(reader.resolve(form_b).dict[b'Resources'][b'XObject'][b'A'], form_a)
+        annotation = reader.resolve(reader.resolve(page[b'Annots'])[0])
+        self.assertEqual(annotation[b'P'], Ref(number))
+
+@unittest.skipIf(pymupdf is None, "需要pymupdf生成對象流")
+class PymupdfFixtureTest(unittest.TestCase):
+    def _document(self, count):
+        document = pymupdf.open()
+        for i in range(count):
+            page = document.new_page(width=960, height=540)
+            page.insert_text((40, 80), f"Slide {i + 1}", fontsize=30)
+        # 與Chromium輸出一樣使用對象流和交叉引用流
+        return document.tobytes(use_objstms=1, deflate=1, garbage=3)
+
+    def test_object_streams(self):
+        data = self._document(3)
+        self.assertIn(b"/ObjStm", data)
+        reader = PdfReader(data)
+        self.assertTrue(reader._compressed)
+        merged = merge([(reader, 2), (reader, 0), (reader, 1)], labels=True)
+        with pymupdf.open(stream=merged, filetype='pdf') as document:
+            texts = [page.get_text() for page in document]
+        self.assertEqual([text.split()[:2] for text in texts], [["Slide", "3"], ["Slide", "1"], ["Slide", "2"]])
+        for number, text in enumerate(texts, 1):
+            self.assertIn(str(number), text.split()[2:])
+
+    def test_object_streams_with_broken_startxref(self):
+        data = self._document(2)
+        position = data.rindex(b'startxref')
+        reader = PdfReader(data[:position] + b"startxref\n1\n%%EOF\n")
+        self.assertEqual(len(reader.pages), 2)
+        with pymupdf.open(stream=merge([(reader, 1), (reader, 0)]), filetype='pdf') as document:
+            self.assertEqual([page.get_text().split() for page in document], [["Slide", "2"], ["Slide", "1"]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import zlib
+import struct
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+import image_assets
+from pdf_render import txt_to_pdf
+from shard_convert import convert_sharded
+from txt_to_marp_ppt import txt_to_marp
+from txt_to_pptx import txt_to_pptx
+
+def _png(color):
+    """生成一張2x2的單色PNG，不需要Pillow"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = b"".join(b"\0" + bytes(color) * 2 for _ in range(2))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b'IHDR', struct.pack('>IIBBBBB', 2, 2, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+class ShardConvertTest(unittest.TestCase):
+    SLIDES = 14
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # 工作進程繼承環境變量，圖片緩存寫在臨時目錄中
+        self._assets_env = os.environ.get('TXT_TO_MARP_ASSETS')
+        os.environ['TXT_TO_MARP_ASSETS'] = os.path.join(self.dir, 'cache')
+        image_assets._default_cache = None
+
+        os.makedirs(os.path.join(self.dir, 'img'))
+        for name, color in (('red.png', (255, 0, 0)), ('blue.png', (0, 0, 255))):
+            with open(os.path.join(self.dir, 'img', name), 'wb') as f:
+                f.write(_png(color))
+        blocks = []
+        for i in range(self.SLIDES):
+            lines = [f"第 {i + 1} 頁", f"- 要點 {i + 1}", "1. 步驟"]
+            # 同一張圖片出現在多個分片中
+            if i % 3 == 0:
+                lines.append("![紅](img/red.png)")
+            if i % 5 == 4:
+                lines.append("img/blue.png")
+            blocks.append("\n".join(lines))
+        self.input_file = os.path.join(self.dir, 'deck.txt')
+        with open(self.input_file, 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(blocks) + "\n")
+
+    def tearDown(self):
+        if self._assets_env is None:
+            os.environ.pop('TXT_TO_MARP_ASSETS', None)
+        else:
+            os.environ['TXT_TO_MARP_ASSETS'] = self._assets_env
+        image_assets._default_cache = None
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _path(self, name):
+        return os.path.join(self.dir, 'out', name)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _pptx_slides(self, path):
+        from pptx import Presentation
+        slides = []
+        for slide in Presentation(path).slides:
+            texts = [shape.text_frame.text for shape in slide.shapes if shape.has_text_frame]
+            pictures = [shape.image.sha1 for shape in slide.shapes if shape.shape_type == 13]
+            slides.append((texts, pictures))
+        return slides
+
+    def test_sharded_output_matches_single_process(self):
+        os.makedirs(os.path.join(self.dir, 'out'))
+        txt_to_marp(self.input_file, self._path('single.md'))
+        txt_to_pptx(self.input_file, self._path('single.pptx'))
+        txt_to_pdf(self.input_file, self._path('single.pdf'))
+
+        # 14張幻燈片、每片至少3張：切分為4個分片
+        outputs = convert_sharded(self.input_file, self._path('sharded.md'), shards=4, pptx=True, pdf=True,
+                                  min_shard_slides=3)
+
+        # Markdown和PDF逐字節相同，包括幻燈片順序和頁碼
+        self.assertEqual(self._read(outputs['md']), self._read(self._path('single.md')))
+        self.assertEqual(self._read(outputs['pdf']), self._read(self._path('single.pdf')))
+
+        # PPTX的包結構不同，幻燈片內容等價
+        sharded = self._pptx_slides(outputs['pptx'])
+        self.assertEqual(len(sharded), self.SLIDES)
+        self.assertEqual(sharded, self._pptx_slides(self._path('single.pptx')))
+        self.assertEqual(sharded[3][0][0], "第 4 頁")
+        self.assertEqual(len(sharded[0][1]), 1)
+
+        # 多個分片引用的同一張圖片只寫入一次
+        with zipfile.ZipFile(outputs['pptx']) as zf:
+            media = [name for name in zf.namelist() if name.startswith('ppt/media/')]
+        self.assertEqual(len(media), 2)
+
+    def test_single_shard_when_deck_is_small(self):
+        outputs = convert_sharded(self.input_file, os.path.join(self.dir, 'small.md'), shards=4,
+                                  min_shard_slides=self.SLIDES)
+        reference = txt_to_marp(self.input_file, os.path.join(self.dir, 'reference.md'))
+        self.assertEqual(self._read(outputs['md']), self._read(reference))
+
+if __name__ == '__main__':
+    unittest.main()
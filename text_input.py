@@ -0,0 +1,236 @@
+import io
+import os
+import codecs
+
+# zip壓縮包中成員的寫法：bundle.zip!目錄/講稿.txt
+ARCHIVE_SEPARATOR = '!'
+
+# 用於檢測編碼的前綴長度
+SNIFF_SIZE = 64 * 1024
+
+# 讀取壓縮文件時的緩衝區大小，較大的緩衝區可以減少Python層的調用次數
+BUFFER_SIZE = 1 << 20
+
+# 沒有BOM時依次嘗試的編碼，都無法解碼時退回 latin-1
+SNIFF_ENCODINGS = ('utf-8', 'cp950', 'gb18030')
+
+# BOM與對應的編碼，UTF-32 LE 的BOM以 UTF-16 LE 的BOM開頭，需要先檢查
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 壓縮格式的文件頭
+_GZIP_MAGIC = b'\x1f\x8b'
+_BZ2_MAGIC = b'BZh'
+_XZ_MAGIC = b'\xfd7zXZ\x00'
+_LZMA_MAGIC = b'\x5d\x00\x00'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_ZIP_MAGIC = b'PK\x03\x04'
+
+# 壓縮文件的擴展名，生成默認輸出路徑時會去掉
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz', '.lzma', '.zst')
+
+def split_archive_path(path):
+    """
+    將 bundle.zip!成員 形式的路徑拆分為 (壓縮包路徑, 成員名)
+
+    普通路徑（包括真實存在、名稱中含有 ! 的文件）返回 (path, None)
+    """
+    marker = '.zip' + ARCHIVE_SEPARATOR
+    index = path.lower().find(marker)
+    if index < 0 or os.path.exists(path):
+        return path, None
+    split = index + len('.zip')
+    return path[:split], path[split + 1:]
+
+def list_archive_members(archive):
+    """
+    返回zip壓縮包中所有文件成員的路徑（bundle.zip!成員 形式），按壓縮包中的順序
+
+    Args:
+        archive: zip文件路徑
+    """
+    import zipfile
+    with zipfile.ZipFile(archive) as zf:
+        return [f"{archive}{ARCHIVE_SEPARATOR}{info.filename}"
+                for info in zf.infolist() if not info.is_dir()]
+
+def _open_zip_member(archive, member):
+    import zipfile
+    zf = zipfile.ZipFile(archive)
+    try:
+        if member is None:
+            # 沒有指定成員時，壓縮包中只能有一個文件
+            names = [info.filename for info in zf.infolist() if not info.is_dir()]
+            if len(names) != 1:
+                raise ValueError(f"壓縮包中有 {len(names)} 個文件，請使用 "
+                                 f"{archive}{ARCHIVE_SEPARATOR}成員 指定要轉換的文件")
+            member = names[0]
+        f = zf.open(member)
+    except BaseException:
+        zf.close()
+        raise
+    # ZipExtFile 關閉時不會關閉 ZipFile，ZipFile 在沒有打開的成員後關閉底層文件
+    zf.close()
+    return f
+
+def _open_zstd(path):
+    try:
+        from compression import zstd
+    except ImportError:
+        pass
+    else:
+        return zstd.ZstdFile(path)
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("讀取 .zst 文件需要安裝 zstandard：pip install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+def open_binary(input_file):
+    """
+    以二進制模式打開輸入，透明地解壓gzip、bz2、xz/lzma、zstd和zip成員
+
+    壓縮格式根據文件頭判斷，與擴展名無關，解壓是逐塊進行的，不會在磁盤上生成臨時文件
+
+    Args:
+        input_file: 文件路徑，或 bundle.zip!成員 形式的zip成員路徑
+
+    Returns:
+        (二進制文件對象, 是否經過解壓)
+    """
+    path, member = split_archive_path(input_file)
+    if member is not None:
+        return _open_zip_member(path, member), True
+
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(_GZIP_MAGIC):
+        import gzip
+        return gzip.GzipFile(path), True
+    if magic.startswith(_BZ2_MAGIC):
+        import bz2
+        return bz2.BZ2File(path), True
+    if magic.startswith(_XZ_MAGIC) or (magic.startswith(_LZMA_MAGIC) and path.endswith('.lzma')):
+        import lzma
+        return lzma.LZMAFile(path), True
+    if magic.startswith(_ZSTD_MAGIC):
+        return _open_zstd(path), True
+    if magic.startswith(_ZIP_MAGIC):
+        return _open_zip_member(path, None), True
+    return open(path, 'rb'), False
+
+def detect_encoding(prefix, final=False):
+    """
+    根據BOM或文本前綴判斷編碼
+
+    有BOM時使用對應的Unicode編碼（解碼時去掉BOM）；沒有BOM時，
+    大量NUL字節視為UTF-16，否則返回 SNIFF_ENCODINGS 中第一個能無錯解碼前綴的編碼
+
+    Args:
+        prefix: 文件開頭的字節
+        final: prefix 是否已經是完整的內容；否則末尾被截斷的多字節字符不視為錯誤
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # 沒有BOM的UTF-16：ASCII字符的高位字節為0
+    sample = prefix[:4096]
+    if sample.count(0) * 4 > len(sample):
+        return 'utf-16-le' if sample[1::2].count(0) > sample[0::2].count(0) else 'utf-16-be'
+
+    for encoding in SNIFF_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return 'latin-1'
+
+class _PrefixedReader(io.RawIOBase):
+    """先返回已讀取的前綴，再從原文件對象繼續讀取，用於不能回退的解壓流"""
+
+    def __init__(self, prefix, f):
+        self._prefix = prefix
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._f.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+def open_text(input_file, encoding=None):
+    """
+    以文本模式打開輸入文件，用於替代 open(input_file, 'r', encoding='utf-8')
+
+    支持壓縮文件和zip成員（見 open_binary），編碼由 detect_encoding 自動判斷，
+    換行符的處理與文本模式的 open() 相同。解碼是增量進行的，內存佔用與文件大小無關
+
+    Args:
+        input_file: 文件路徑，或 bundle.zip!成員 形式的zip成員路徑
+        encoding: 指定編碼，如果為None則自動檢測
+    """
+    f, compressed = open_binary(input_file)
+    try:
+        if encoding is None:
+            prefix = f.read(SNIFF_SIZE)
+            encoding = detect_encoding(prefix, final=len(prefix) < SNIFF_SIZE)
+            if compressed:
+                f = io.BufferedReader(_PrefixedReader(prefix, f), BUFFER_SIZE)
+            else:
+                f.seek(0)
+        return io.TextIOWrapper(f, encoding=encoding)
+    except BaseException:
+        f.close()
+        raise
+
+def decode_text(data, encoding=None):
+    """
+    將整個輸入的字節解碼為文本，編碼判斷和換行符處理與 open_text 一致
+
+    Args:
+        data: 解壓後的字節
+        encoding: 指定編碼，如果為None則自動檢測
+    """
+    if encoding is None:
+        encoding = detect_encoding(data[:SNIFF_SIZE], final=len(data) <= SNIFF_SIZE)
+    return data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+
+def read_bytes(input_file):
+    """讀取輸入解壓後的全部字節"""
+    f = open_binary(input_file)[0]
+    with f:
+        return f.read()
+
+def output_base(input_file):
+    """
+    返回默認輸出文件的路徑（不含擴展名）
+
+    去掉壓縮擴展名和原擴展名：talk.txt.gz -> talk；
+    zip成員輸出到壓縮包所在目錄：bundle.zip!講稿/第一講.txt -> 第一講
+    """
+    path, member = split_archive_path(input_file)
+    if member is not None:
+        path = os.path.join(os.path.dirname(path), os.path.basename(member))
+    stem, extension = os.path.splitext(path)
+    if extension.lower() in COMPRESSED_SUFFIXES:
+        stem = os.path.splitext(stem)[0]
+    return stem
@@ -0,0 +1,160 @@
+import os
+import re
+
+from marp_markdown import CSS_STYLES
+
+# 生成的主題名稱前綴，避免與Marp內置主題（default、gaia、uncover）衝突
+THEME_PREFIX = "txt-to-marp-"
+
+# Marp主題CSS開頭的名稱聲明：/* @theme 名稱 */
+_THEME_DIRECTIVE = re.compile(r'/\*\s*@theme\s+(\S+)\s*\*/')
+
+# 壓縮CSS用的模式
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};])\s*')
+_CSS_SEPARATOR = re.compile(r'([:,]) ')
+
+def default_theme_dir():
+    """默認的主題文件目錄，可通過環境變量 TXT_TO_MARP_THEMES 覆蓋"""
+    return os.environ.get('TXT_TO_MARP_THEMES') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'txt_to_marp_themes')
+
+def compile_css(css):
+    """
+    將內嵌樣式壓縮為主題文件使用的CSS
+
+    去掉 <style> 標籤、註釋和多餘的空白，不改變選擇器和屬性的含義
+    """
+    css = css.replace('<style>', '').replace('</style>', '')
+    css = _CSS_COMMENT.sub('', css)
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    return _CSS_SEPARATOR.sub(r'\1', css).strip()
+
+def theme_name_of(css):
+    """返回主題CSS中聲明的名稱，沒有聲明時返回None"""
+    match = _THEME_DIRECTIVE.search(css)
+    return match.group(1) if match else None
+
+def _write_if_changed(path, text):
+    """內容不同時才以原子方式寫入，已有的相同文件保持不變"""
+    data = text.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    import tempfile
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class ThemeRegistry:
+    """
+    以名稱引用的外部主題文件
+
+    不再把 CSS_STYLES 內嵌到每個Markdown文件中：每個基礎主題（Marp內置的
+    default、gaia、uncover）只生成一次 txt-to-marp-<主題>.css，內容是壓縮後的樣式
+    加上 @import 基礎主題，Markdown頭部只寫主題名稱，導出時通過Marp的 --theme-set
+    傳入主題文件。主題文件保存在共享目錄中，內容未改變時不會重寫，
+    同一批次和之後的轉換都直接使用已有文件，Marp每個進程只解析一次主題。
+
+    也可以用 add() 登記自帶 /* @theme 名稱 */ 聲明的CSS文件，以該名稱作為主題使用
+
+    用法：
+
+        themes = ThemeRegistry()
+        name = themes.name("default")        # 'txt-to-marp-default'
+        theme_set = themes.theme_set(["default"])  # 傳給Marp的主題文件列表
+    """
+
+    def __init__(self, theme_dir=None, css=CSS_STYLES):
+        """
+        Args:
+            theme_dir: 生成的主題文件目錄，如果為None則使用 default_theme_dir()
+            css: 加到基礎主題上的樣式，默認為 CSS_STYLES
+        """
+        self.theme_dir = theme_dir or default_theme_dir()
+        self.css = compile_css(css)
+        self._external = {}  # 名稱 -> 用戶登記的主題文件
+        self._generated = {}  # 基礎主題 -> 已生成的主題文件
+
+    def add(self, css_file):
+        """
+        登記一個外部主題文件
+
+        Args:
+            css_file: 主題CSS文件路徑，文件中需要有 /* @theme 名稱 */ 聲明
+
+        Returns:
+            主題名稱
+        """
+        with open(css_file, 'r', encoding='utf-8') as f:
+            name = theme_name_of(f.read())
+        if name is None:
+            raise ValueError(f"主題文件缺少 /* @theme 名稱 */ 聲明: {css_file}")
+        self._external[name] = os.path.abspath(css_file)
+        return name
+
+    def name(self, theme):
+        """Markdown頭部使用的主題名稱：登記過的外部主題保持原名，其餘為生成的主題"""
+        return theme if theme in self._external else THEME_PREFIX + theme
+
+    def theme_css(self, theme):
+        """
+        返回主題文件的內容
+
+        Args:
+            theme: 基礎主題或已登記的外部主題名稱
+        """
+        if theme in self._external:
+            with open(self._external[theme], 'r', encoding='utf-8') as f:
+                return f.read()
+        return f"/* @theme {THEME_PREFIX}{theme} */\n@import '{theme}';\n{self.css}\n"
+
+    def path(self, theme):
+        """返回主題文件的路徑，生成的主題文件在第一次使用時寫入"""
+        if theme in self._external:
+            return self._external[theme]
+        path = self._generated.get(theme)
+        if path is None:
+            path = os.path.join(self.theme_dir, f"{THEME_PREFIX}{theme}.css")
+            _write_if_changed(path, self.theme_css(theme))
+            self._generated[theme] = path
+        return path
+
+    def theme_set(self, themes=()):
+        """
+        返回傳給Marp --theme-set 的主題文件列表
+
+        Args:
+            themes: 需要預先生成的主題，生成後連同所有登記和已生成的主題文件一起返回
+        """
+        for theme in themes:
+            self.path(theme)
+        return list(dict.fromkeys(list(self._external.values()) + list(self._generated.values())))
+
+def add_arguments(parser):
+    """為命令行添加 --theme-set 和 --theme-dir 參數"""
+    parser.add_argument('--theme-set', nargs='*', metavar='CSS',
+                        help='使用外部主題文件代替內嵌樣式，可以列出額外的主題CSS文件（以其 @theme 名稱使用）')
+    parser.add_argument('--theme-dir', help='生成的主題文件目錄，默認為 ~/.cache/txt_to_marp_themes')
+
+def from_arguments(args):
+    """根據命令行參數創建ThemeRegistry，沒有指定 --theme-set 時返回None"""
+    if args.theme_set is None:
+        return None
+    themes = ThemeRegistry(args.theme_dir)
+    for css_file in args.theme_set:
+        themes.add(css_file)
+    return themes
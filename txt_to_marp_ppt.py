@@ -1,12 +1,25 @@
 import os
-import re
+import time
 import argparse
-from pathlib import Path
-import tkinter as tk
-from tkinter import filedialog, ttk, messagebox
+
+from slide_ir import STREAM_CHUNK_SIZE, iter_slides, parse_slides, read_slides
+from marp_markdown import CSS_STYLES, slides_to_marp, write_marp
+from export_executor import DEFAULT_TIMEOUT, ExportJob, print_stderr, run_exports
+from text_input import open_text, output_base, split_archive_path
+from image_assets import ImageResolver
+import profiling
+import theme_registry
+import slide_index
 # 移除 subprocess 導入，因為不再需要
+# tkinter、python-pptx 等較重的模塊只在需要時導入，使命令行模式啟動更快
+
+def _theme_header(theme, themes):
+    """返回Markdown頭部使用的主題名稱和內嵌樣式"""
+    if themes is None:
+        return theme, CSS_STYLES
+    return themes.name(theme), ""
 
-def txt_to_marp(input_file, output_file=None, theme="default"):
+def txt_to_marp(input_file, output_file=None, theme="default", themes=None):
     """
     將TXT文件轉換為Marp格式的Markdown文件
     
@@ -14,163 +27,50 @@ def txt_to_marp(input_file, output_file=None, theme="default"):
         input_file: 輸入的TXT文件路徑
         output_file: 輸出的Markdown文件路徑，如果為None則自動生成
         theme: 使用的主題名稱
+        themes: theme_registry.ThemeRegistry，指定時不內嵌樣式，只以名稱引用外部主題文件
     """
     if output_file is None:
-        output_file = os.path.splitext(input_file)[0] + ".md"
+        output_file = output_base(input_file) + ".md"
     
-    # 讀取TXT文件
-    with open(input_file, 'r', encoding='utf-8') as f:
+    # 讀取並解析TXT文件
+    # 假設每個幻燈片由至少兩個連續的換行符分隔
+    with profiling.stage('read'), open_text(input_file) as f:
         content = f.read()
+    with profiling.stage('parse'):
+        slides = parse_slides(content)
     
-    # 分割內容為幻燈片
-    # 假設每個幻燈片由至少兩個連續的換行符分隔
-    slides = re.split(r'\n{2,}', content)
-    
-    # 創建Marp頭部
-    marp_header = f"""---
-marp: true
-theme: {theme}
-paginate: true
-backgroundColor: #fff
----
-
-"""
-    
-    # 創建CSS樣式
-    css_styles = """
-<style>
-/* 全局樣式 */
-section {
-    font-family: 'Arial', sans-serif;
-    padding: 40px;
-}
-
-/* 標題樣式 */
-h1 {
-    color: #2c3e50;
-    font-size: 2.5em;
-    margin-bottom: 0.5em;
-}
-
-h2 {
-    color: #3498db;
-    font-size: 2em;
-    margin-bottom: 0.5em;
-}
-
-/* 列表樣式 */
-ul, ol {
-    margin-left: 1.5em;
-    line-height: 1.6;
-}
-
-li {
-    margin-bottom: 0.5em;
-}
-
-/* 強調文本 */
-strong {
-    color: #e74c3c;
-}
+    # 將幻燈片轉換為Marp格式並寫入輸出文件，圖片改為引用複製到輸出目錄中的處理後文件
+    theme, styles = _theme_header(theme, themes)
+    return slides_to_marp(slides, output_file, theme, ImageResolver.for_input(input_file), styles)
 
-em {
-    color: #27ae60;
-}
-
-/* 代碼塊 */
-code {
-    background-color: #f8f8f8;
-    border-radius: 3px;
-    padding: 0.2em 0.4em;
-    font-family: 'Courier New', monospace;
-}
-
-/* 引用塊 */
-blockquote {
-    border-left: 5px solid #3498db;
-    padding-left: 1em;
-    color: #7f8c8d;
-    font-style: italic;
-}
-
-/* 表格樣式 */
-table {
-    border-collapse: collapse;
-    width: 100%;
-    margin: 1em 0;
-}
-
-th, td {
-    border: 1px solid #ddd;
-    padding: 8px 12px;
-    text-align: left;
-}
-
-th {
-    background-color: #f2f2f2;
-    font-weight: bold;
-}
-
-/* 圖片樣式 */
-img {
-    max-width: 100%;
-    height: auto;
-    display: block;
-    margin: 0 auto;
-}
-
-/* 頁腳樣式 */
-footer {
-    position: absolute;
-    bottom: 20px;
-    right: 20px;
-    font-size: 0.8em;
-    color: #95a5a6;
-}
-</style>
-
-"""
+def txt_to_marp_stream(input_file, output_file=None, theme="default", chunk_size=STREAM_CHUNK_SIZE,
+                       themes=None):
+    """
+    以串流方式將TXT文件轉換為Marp格式的Markdown文件
     
-    # 將幻燈片轉換為Marp格式
-    marp_content = marp_header + css_styles
+    逐塊讀取輸入，每切分出一張完整的幻燈片就立即寫入輸出，
+    內存佔用與輸入文件大小無關，適合數百MB的大文件
+    
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的Markdown文件路徑，如果為None則自動生成
+        theme: 使用的主題名稱
+        chunk_size: 每次讀取的字符數
+        themes: theme_registry.ThemeRegistry，見 txt_to_marp
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".md"
+    
+    theme, styles = _theme_header(theme, themes)
+    with profiling.stage('convert'), open_text(input_file) as src, \
+            open(output_file, 'w', encoding='utf-8') as dst:
+        write_marp(iter_slides(src, chunk_size), profiling.timed_writes(dst), theme,
+                   ImageResolver.for_input(input_file).for_output(output_file), styles)
     
-    for i, slide in enumerate(slides):
-        slide = slide.strip()
-        if not slide:
-            continue
-            
-        # 處理幻燈片內容
-        lines = slide.split('\n')
-        
-        # 假設第一行是標題
-        if lines and lines[0]:
-            title = lines[0]
-            content_lines = lines[1:]
-            
-            # 將標題轉換為Markdown標題
-            if not title.startswith('#'):
-                title = f"# {title}"
-                
-            # 處理內容
-            content = "\n".join(content_lines)
-            
-            # 自動檢測列表項
-            content = re.sub(r'^(\d+)\.\s', r'\1. ', content, flags=re.MULTILINE)  # 有序列表
-            content = re.sub(r'^[-*]\s', '- ', content, flags=re.MULTILINE)  # 無序列表
-            
-            # 添加幻燈片分隔符
-            if i > 0:
-                marp_content += "\n---\n\n"
-                
-            marp_content += f"{title}\n\n{content}\n"
-    
-    # 寫入輸出文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(marp_content)
-        
     return output_file
 
-def convert_to_pdf(md_file, output_dir=None, node_path=None):
+def convert_to_pdf(md_file, output_dir=None, node_path=None, timeout=DEFAULT_TIMEOUT, incremental=False,
+                   cache=None, theme_set=()):
     """
     使用Marp CLI將Markdown文件轉換為PDF
     
@@ -181,29 +81,29 @@ def convert_to_pdf(md_file, output_dir=None, node_path=None):
         md_file: Markdown文件路徑
         output_dir: 輸出目錄，如果為None則使用Markdown文件所在目錄
         node_path: Node.js可執行文件路徑，如果為None則使用系統PATH中的node
+        timeout: 導出超時時間（秒），超時後終止Marp並拋出 export_executor.ExportTimeout
+        incremental: 是否逐頁增量導出，只重新渲染改變了的幻燈片（見 incremental_pdf）
+        cache: 增量導出使用的 build_cache.BuildCache，如果為None則使用默認緩存目錄
+        theme_set: 傳給Marp --theme-set 的主題文件列表
     """
     if output_dir is None:
         output_dir = os.path.dirname(md_file)
     
     output_pdf = os.path.join(output_dir, os.path.splitext(os.path.basename(md_file))[0] + ".pdf")
     
-    # 構建命令
-    if node_path and os.path.exists(node_path):
-        npx_path = os.path.join(os.path.dirname(node_path), "npx")
-        cmd = f'"{npx_path}" @marp-team/marp-cli {md_file} --pdf --output {output_pdf}'
-    else:
-        cmd = f'npx @marp-team/marp-cli {md_file} --pdf --output {output_pdf}'
-    
-    # 使用npx運行Marp CLI轉換
-    result = os.system(cmd)
+    if incremental:
+        from incremental_pdf import export_pdf_incremental
+        return export_pdf_incremental(md_file, output_pdf, cache, node_path=node_path, theme_set=theme_set,
+                                      timeout=timeout)[0]
     
-    # 檢查命令是否成功執行
-    if result != 0:
-        raise Exception("轉換PDF失敗，請確保已安裝Node.js和npm")
+    # 以參數列表運行Marp CLI，路徑中的空格不需要轉義，錯誤輸出轉發到stderr
+    with profiling.stage('marp pdf'):
+        run_exports([ExportJob(md_file, 'pdf', output_pdf)], node_path=node_path, theme_set=theme_set,
+                    timeout=timeout, on_stderr=print_stderr)
     
     return output_pdf
 
-def convert_to_pptx(md_file, output_dir=None, node_path=None):
+def convert_to_pptx(md_file, output_dir=None, node_path=None, timeout=DEFAULT_TIMEOUT):
     """
     使用Marp CLI將Markdown文件轉換為PPTX
     
@@ -214,33 +114,31 @@ def convert_to_pptx(md_file, output_dir=None, node_path=None):
         md_file: Markdown文件路徑
         output_dir: 輸出目錄，如果為None則使用Markdown文件所在目錄
         node_path: Node.js可執行文件路徑，如果為None則使用系統PATH中的node
+        timeout: 導出超時時間（秒），超時後終止Marp並拋出 export_executor.ExportTimeout
     """
     if output_dir is None:
         output_dir = os.path.dirname(md_file)
     
     output_pptx = os.path.join(output_dir, os.path.splitext(os.path.basename(md_file))[0] + ".pptx")
     
-    # 構建命令
-    if node_path and os.path.exists(node_path):
-        npx_path = os.path.join(os.path.dirname(node_path), "npx")
-        cmd = f'"{npx_path}" @marp-team/marp-cli {md_file} --pptx --output {output_pptx}'
-    else:
-        cmd = f'npx @marp-team/marp-cli {md_file} --pptx --output {output_pptx}'
-    
-    # 使用npx運行Marp CLI轉換
-    result = os.system(cmd)
-    
-    # 檢查命令是否成功執行
-    if result != 0:
-        raise Exception("轉換PPTX失敗，請確保已安裝Node.js和npm")
+    # 以參數列表運行Marp CLI，路徑中的空格不需要轉義，錯誤輸出轉發到stderr
+    with profiling.stage('marp pptx'):
+        run_exports([ExportJob(md_file, 'pptx', output_pptx)], node_path=node_path, timeout=timeout,
+                    on_stderr=print_stderr)
     
     return output_pptx
 
 def create_gui():
     """創建GUI介面"""
+    import queue
+    import tkinter as tk
+    from tkinter import filedialog, ttk, messagebox
+    from conversion_worker import ConversionJob, ConversionWorker
+    from slide_preview import PreviewPane
+    
     root = tk.Tk()
     root.title("TXT 轉 Marp 簡報轉換器")
-    root.geometry("600x450")  # 增加高度以容納新的設置
+    root.geometry("1120x600")  # 右側為幻燈片預覽
     root.resizable(True, True)
     
     # 設置樣式
@@ -249,9 +147,17 @@ def create_gui():
     style.configure('TLabel', font=('Arial', 10))
     style.configure('TCheckbutton', font=('Arial', 10))
     
+    # 左側為轉換設置，右側為預覽，中間可以拖動調整寬度
+    panes = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
+    panes.pack(fill=tk.BOTH, expand=True)
+    
     # 創建主框架
-    main_frame = ttk.Frame(root, padding="20")
-    main_frame.pack(fill=tk.BOTH, expand=True)
+    main_frame = ttk.Frame(panes, padding="20")
+    panes.add(main_frame, weight=1)
+    
+    # 預覽輸入文件（選擇多個文件時預覽第一個），源文件改變時自動更新
+    preview = PreviewPane(panes)
+    panes.add(preview, weight=1)
     
     # 輸入文件選擇
     input_frame = ttk.Frame(main_frame)
@@ -263,19 +169,29 @@ def create_gui():
     input_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
     
     def browse_input():
-        filename = filedialog.askopenfilename(
-            title="選擇TXT文件",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        filenames = filedialog.askopenfilenames(
+            title="選擇TXT文件（可多選）",
+            filetypes=[("Text files", "*.txt *.txt.gz *.txt.bz2 *.txt.xz *.txt.zst *.zip"), ("All files", "*.*")]
         )
-        if filename:
-            input_var.set(filename)
-            # 自動設置輸出文件名
+        if not filenames:
+            return
+        input_var.set(os.pathsep.join(filenames))
+        # 只選擇一個文件時自動設置輸出文件名，多個文件輸出到各自的目錄
+        if len(filenames) == 1:
             if not output_var.get():
-                output_path = os.path.splitext(filename)[0] + ".md"
+                output_path = output_base(filenames[0]) + ".md"
                 output_var.set(output_path)
+        else:
+            output_var.set("")
     
     ttk.Button(input_frame, text="瀏覽...", command=browse_input).pack(side=tk.RIGHT)
     
+    def update_preview(*_):
+        input_files = [f for f in input_var.get().split(os.pathsep) if f]
+        preview.set_source(input_files[0] if input_files else None)
+    
+    input_var.trace_add('write', update_preview)
+    
     # 輸出文件選擇
     output_frame = ttk.Frame(main_frame)
     output_frame.pack(fill=tk.X, pady=5)
@@ -305,6 +221,7 @@ def create_gui():
     theme_combo = ttk.Combobox(theme_frame, textvariable=theme_var, 
                               values=["default", "gaia", "uncover"])
     theme_combo.pack(side=tk.LEFT, padx=5)
+    theme_var.trace_add('write', lambda *_: preview.set_theme(theme_var.get()))
     
     # 輸出格式選項
     format_frame = ttk.Frame(main_frame)
@@ -324,62 +241,262 @@ def create_gui():
     pptx_check = ttk.Checkbutton(format_frame, text="PPTX", variable=pptx_var)
     pptx_check.pack(side=tk.LEFT, padx=5)
     
+    # Node.js路徑
+    node_frame = ttk.Frame(main_frame)
+    node_frame.pack(fill=tk.X, pady=5)
+    
+    ttk.Label(node_frame, text="Node.js路徑:").pack(side=tk.LEFT)
+    node_path_var = tk.StringVar()
+    ttk.Entry(node_frame, textvariable=node_path_var, width=40).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+    
+    # 任務隊列
+    queue_frame = ttk.Frame(main_frame)
+    queue_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+    
+    ttk.Label(queue_frame, text="任務隊列:").pack(anchor=tk.W)
+    queue_list = tk.Listbox(queue_frame, height=6)
+    queue_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    queue_scroll = ttk.Scrollbar(queue_frame, orient=tk.VERTICAL, command=queue_list.yview)
+    queue_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    queue_list.configure(yscrollcommand=queue_scroll.set)
+    
+    # 進度條
+    progress_var = tk.DoubleVar(value=0)
+    progress_bar = ttk.Progressbar(main_frame, variable=progress_var, maximum=1)
+    progress_bar.pack(fill=tk.X, pady=5)
+    
     # 轉換按鈕
     button_frame = ttk.Frame(main_frame)
-    button_frame.pack(fill=tk.X, pady=20)
+    button_frame.pack(fill=tk.X, pady=10)
+    
+    # 後台轉換：工作線程的事件經由隊列轉交給Tk主線程
+    events = queue.Queue()
+    # 常駐的Marp進程讓同一會話中的後續導出不必重新啟動Node和Chromium
+    # 分析只在階段邊界計時，開銷可以忽略，完成時在狀態欄顯示各階段的耗時和內存峰值
+    worker = ConversionWorker(lambda event, job: events.put((event, job)), persistent=True, profile=True)
+    rows = {}  # 任務在列表中的行號
+    rows_stages = {}  # 未結束任務已完成的階段數
+    progress = {'total': 0, 'done': 0}
+    
+    def refresh_progress():
+        progress_bar.configure(maximum=max(progress['total'], 1))
+        progress_var.set(progress['done'])
+    
+    def process_events():
+        while True:
+            try:
+                event, job = events.get_nowait()
+            except queue.Empty:
+                break
+            row = rows.get(id(job))
+            if row is not None:
+                queue_list.delete(row)
+                queue_list.insert(row, job.describe())
+            
+            if event in ('done', 'error', 'cancelled'):
+                # 未完成的階段也計入進度，使進度條在任務結束時前進到位
+                progress['done'] += job.stage_count - rows_stages.pop(id(job), 0)
+                if event == 'error':
+                    status_var.set(f"轉換失敗: {job.input_file}")
+                elif event == 'cancelled':
+                    status_var.set("已取消")
+                else:
+                    status_var.set(f"已完成: {', '.join(job.outputs)}"
+                                   + (f"（{job.profile.summary()}）" if job.profile else ""))
+            elif event == 'stage':
+                completed = len(job.timings)
+                progress['done'] += completed - rows_stages.get(id(job), 0)
+                rows_stages[id(job)] = completed
+                status_var.set(job.describe())
+            else:
+                status_var.set(job.describe())
+            refresh_progress()
+        root.after(100, process_events)
     
     def convert():
-        input_file = input_var.get()
+        input_files = [f for f in input_var.get().split(os.pathsep) if f]
         output_file = output_var.get() if output_var.get() else None
         theme = theme_var.get()
         node_path = node_path_var.get() if node_path_var.get() else None
+        formats = [fmt for fmt, var in (('pdf', pdf_var), ('pptx', pptx_var)) if var.get()]
         
-        if not input_file:
+        if not input_files:
             messagebox.showerror("錯誤", "請選擇輸入文件")
             return
         
-        try:
-            # 轉換為Marp格式
-            status_var.set("正在生成Markdown文件...")
-            root.update()
-            md_file = txt_to_marp(input_file, output_file, theme)
-            messagebox.showinfo("成功", f"已生成Marp格式文件: {md_file}")
-            
-            # 轉換為PDF
-            if pdf_var.get():
-                status_var.set("正在生成PDF文件...")
-                root.update()
-                try:
-                    pdf_file = convert_to_pdf(md_file, node_path=node_path)
-                    messagebox.showinfo("成功", f"已生成PDF文件: {pdf_file}")
-                except Exception as e:
-                    messagebox.showerror("錯誤", f"PDF轉換失敗: {str(e)}")
-            
-            # 轉換為PPTX
-            if pptx_var.get():
-                status_var.set("正在生成PPTX文件...")
-                root.update()
-                try:
-                    pptx_file = convert_to_pptx(md_file, node_path=node_path)
-                    messagebox.showinfo("成功", f"已生成PPTX文件: {pptx_file}")
-                except Exception as e:
-                    messagebox.showerror("錯誤", f"PPTX轉換失敗: {str(e)}")
-                    
-            status_var.set("就绪")
-                
-        except Exception as e:
-            messagebox.showerror("錯誤", f"轉換過程中發生錯誤: {str(e)}")
-            status_var.set("轉換失敗")
-    
-    ttk.Button(button_frame, text="轉換", command=convert, width=20).pack(side=tk.RIGHT)
+        # 所有任務都只是加入隊列，界面不會被阻塞
+        for input_file in input_files:
+            job = ConversionJob(input_file, output_file if len(input_files) == 1 else None,
+                                theme, formats, node_path)
+            queue_list.insert(tk.END, job.describe())
+            rows[id(job)] = queue_list.size() - 1
+            rows_stages[id(job)] = 0
+            progress['total'] += job.stage_count
+            worker.submit(job)
+        refresh_progress()
+        status_var.set(f"已加入 {len(input_files)} 個任務")
+    
+    def cancel():
+        worker.cancel()
+        status_var.set("正在取消...")
+    
+    def clear_finished():
+        if rows_stages:
+            status_var.set("仍有任務在進行中")
+            return
+        queue_list.delete(0, tk.END)
+        rows.clear()
+        progress['total'] = progress['done'] = 0
+        refresh_progress()
+    
+    ttk.Button(button_frame, text="轉換", command=convert, width=12).pack(side=tk.RIGHT)
+    ttk.Button(button_frame, text="取消", command=cancel, width=12).pack(side=tk.RIGHT, padx=5)
+    ttk.Button(button_frame, text="清空列表", command=clear_finished, width=12).pack(side=tk.LEFT)
     
     # 狀態欄
     status_var = tk.StringVar(value="就绪")
     status_bar = ttk.Label(root, textvariable=status_var, relief=tk.SUNKEN, anchor=tk.W)
     status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
+    root.after(100, process_events)
+    
+    def on_close():
+        worker.cancel()
+        worker.close()
+        root.destroy()
+    
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    
     return root
 
+def _export_incremental_pdf(md_file, args, themes):
+    """逐頁增量導出PDF，只重新渲染新增或改變了的幻燈片"""
+    from build_cache import BuildCache
+    from incremental_pdf import export_pdf_incremental
+    theme_set = themes.theme_set([args.theme]) if themes is not None else ()
+    cache = BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    pdf_file, rendered, total = export_pdf_incremental(md_file, cache=cache, node_path=args.node_path,
+                                                       theme_set=theme_set, timeout=args.export_timeout)
+    print(f"已生成PDF文件: {pdf_file}（重新渲染 {rendered}/{total} 張幻燈片）")
+
+def _convert_cli(args):
+    """命令行模式：轉換一個輸入文件並按參數導出其他格式"""
+    # 進程內生成的格式不再通過Marp導出，兩者寫入同一個文件
+    formats = [fmt for fmt, wanted in (('pdf', args.pdf and not args.native_pdf),
+                                       ('pptx', args.pptx and not args.native_pptx)) if wanted]
+    themes = theme_registry.from_arguments(args)
+    incremental_pdf = args.incremental_pdf and 'pdf' in formats
+    if incremental_pdf:
+        # PDF逐頁增量導出，不經過整份文件的緩存和導出
+        formats.remove('pdf')
+    
+    index = slide_index.from_arguments(args)
+    index_digest = None
+    if index is not None:
+        # 按內容哈希判斷，未改變的文件不重新解析；改變時與轉換共用同一次解析，轉換之後再寫入
+        index_digest = slide_index.file_digest(args.input_file)
+        if index_digest == index.digest(args.input_file):
+            index.close()
+            print(f"全文索引未改變: {index.path}")
+            index = None
+    slides = None
+    
+    if args.native_pdf and args.shards is None:
+        # 直接從TXT渲染PDF，與Markdown的生成方式無關
+        from pdf_render import txt_to_pdf
+        pdf_file = txt_to_pdf(args.input_file, (os.path.splitext(args.output)[0] if args.output else output_base(args.input_file)) + ".pdf")
+        print(f"已生成PDF文件: {pdf_file}")
+    
+    if args.html:
+        from html_render import txt_to_html
+        html_file = txt_to_html(args.input_file, (os.path.splitext(args.output)[0] if args.output else output_base(args.input_file)) + ".html")
+        print(f"已生成HTML文件: {html_file}")
+    
+    if args.shards is None and not (args.stream or args.native_pptx or args.no_cache):
+        # 使用構建緩存，未改變的輸入只需哈希檢查和文件複製
+        from build_cache import BuildCache, convert_cached
+        cache = BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        if index is not None:
+            slides = read_slides(args.input_file)
+        md_file, outputs, hits = convert_cached(args.input_file, args.output, args.theme, formats,
+                                                node_path=args.node_path, cache=cache, themes=themes,
+                                                slides=slides)
+        print(f"已生成Marp格式文件: {md_file}" + ("（使用緩存）" if ".md" in hits else ""))
+        if 'pdf' in formats:
+            print(f"已生成PDF文件: {outputs['pdf']}" + ("（使用緩存）" if ".pdf" in hits else ""))
+        if 'pptx' in formats:
+            print(f"已生成PPTX文件: {outputs['pptx']}" + ("（使用緩存）" if ".pptx" in hits else ""))
+        if incremental_pdf:
+            _export_incremental_pdf(md_file, args, themes)
+        _update_index(index, args.input_file, index_digest, slides)
+        return
+    
+    if args.shards is not None:
+        # 在幻燈片邊界切分，多個進程並行生成Markdown以及原生PPTX/PDF後合併
+        from shard_convert import convert_sharded
+        outputs = convert_sharded(args.input_file, args.output, args.theme, args.shards or None,
+                                  pptx=args.native_pptx, pdf=args.native_pdf, themes=themes)
+        md_file = outputs['md']
+        print(f"已生成Marp格式文件: {md_file}")
+        if 'pptx' in outputs:
+            print(f"已生成PPTX文件: {outputs['pptx']}")
+        if 'pdf' in outputs:
+            print(f"已生成PDF文件: {outputs['pdf']}")
+    elif args.stream:
+        start = time.perf_counter()
+        md_file = txt_to_marp_stream(args.input_file, args.output, args.theme, themes=themes)
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(split_archive_path(args.input_file)[0]) / (1024 * 1024)
+        print(f"已生成Marp格式文件: {md_file}")
+        print(f"串流轉換 {size_mb:.1f} MB，耗時 {elapsed:.2f} 秒，{size_mb / max(elapsed, 1e-9):.1f} MB/s")
+    elif args.native_pptx or index is not None:
+        # 只解析一次，Markdown、PPTX和全文索引共用
+        slides = read_slides(args.input_file)
+        images = ImageResolver.for_input(args.input_file)
+        theme, styles = _theme_header(args.theme, themes)
+        md_file = slides_to_marp(slides, args.output or output_base(args.input_file) + ".md", theme, images, styles)
+        print(f"已生成Marp格式文件: {md_file}")
+        if args.native_pptx:
+            from txt_to_pptx import slides_to_pptx
+            pptx_file = slides_to_pptx(slides, os.path.splitext(md_file)[0] + ".pptx", images)
+            print(f"已生成PPTX文件: {pptx_file}")
+    else:
+        md_file = txt_to_marp(args.input_file, args.output, args.theme, themes)
+        print(f"已生成Marp格式文件: {md_file}")
+    
+    # 轉換為PDF和PPTX，兩種格式同時導出
+    if formats:
+        theme_set = themes.theme_set([args.theme]) if themes is not None else ()
+        with profiling.stage('marp'):
+            outputs = dict(zip(formats, run_exports([ExportJob(md_file, fmt) for fmt in formats],
+                                                    node_path=args.node_path, theme_set=theme_set,
+                                                    timeout=args.export_timeout, on_stderr=print_stderr)))
+        if 'pdf' in formats:
+            print(f"已生成PDF文件: {outputs['pdf']}")
+        if 'pptx' in formats:
+            print(f"已生成PPTX文件: {outputs['pptx']}")
+    if incremental_pdf:
+        _export_incremental_pdf(md_file, args, themes)
+    _update_index(index, args.input_file, index_digest, slides)
+
+def _update_index(index, input_file, digest, slides):
+    """
+    轉換完成後寫入全文索引並關閉索引
+
+    Args:
+        index: slide_index.SlideIndex，內容未改變或沒有指定 --index 時為None
+        input_file: 輸入的TXT文件路徑
+        digest: 轉換前計算的 slide_index.file_digest()
+        slides: 轉換時解析的幻燈片，串流和分片轉換不保留幻燈片時為None，此時重新讀取
+    """
+    if index is None:
+        return
+    with index:
+        if slides is None:
+            slides = read_slides(input_file)
+        index.update(input_file, digest, slide_index.slide_records(slides))
+    print(f"已更新全文索引: {index.path}")
+
 def main():
     parser = argparse.ArgumentParser(description='將TXT文件轉換為Marp格式的簡報')
     parser.add_argument('input_file', nargs='?', help='輸入的TXT文件路徑')
@@ -387,29 +504,57 @@ def main():
     parser.add_argument('-t', '--theme', default='default', help='使用的主題名稱')
     parser.add_argument('--pdf', action='store_true', help='同時生成PDF文件')
     parser.add_argument('--pptx', action='store_true', help='同時生成PPTX文件')
+    parser.add_argument('--native-pdf', action='store_true', help='在進程內直接渲染PDF，不需要Node.js和Chromium')
+    parser.add_argument('--incremental-pdf', action='store_true',
+                        help='逐頁增量導出PDF：緩存每張幻燈片的頁面，只重新渲染改變了的幻燈片')
+    parser.add_argument('--html', action='store_true', help='同時生成可離線瀏覽的自包含HTML簡報')
+    parser.add_argument('--stream', action='store_true', help='以串流模式轉換大文件，內存佔用保持恆定')
+    parser.add_argument('--native-pptx', action='store_true', help='使用python-pptx直接生成PPTX，與Markdown共用同一次解析')
+    parser.add_argument('--shards', type=int, nargs='?', const=0, metavar='N',
+                        help='將大文件切分為N個分片並行生成Markdown和原生PPTX/PDF，默認為CPU核心數')
     parser.add_argument('--gui', action='store_true', help='啟動GUI介面')
     parser.add_argument('--node-path', help='指定Node.js可執行文件路徑')
+    parser.add_argument('--export-timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SECONDS',
+                        help='每次Marp導出的超時時間（秒）')
+    parser.add_argument('--watch', nargs='*', metavar='FILE', help='監視輸入文件（及額外列出的文件），改變時自動重建')
+    parser.add_argument('--no-marp-server', action='store_true', help='監視模式下每次導出都重新啟動Marp，不使用常駐進程')
+    parser.add_argument('--no-cache', action='store_true', help='不使用構建緩存')
+    parser.add_argument('--cache-dir', help='構建緩存目錄，默認為 ~/.cache/txt_to_marp')
+    parser.add_argument('--cache-size', type=int, default=512, help='構建緩存大小上限(MB)')
+    theme_registry.add_arguments(parser)
+    slide_index.add_arguments(parser)
+    profiling.add_arguments(parser)
     
     args = parser.parse_args()
     
+    # 監視模式
+    if args.watch is not None and not args.gui:
+        from watch_mode import watch_and_convert
+        from build_cache import BuildCache
+        watch_files = ([args.input_file] if args.input_file else []) + args.watch
+        if not watch_files:
+            parser.error("--watch 需要至少一個輸入文件")
+        formats = [fmt for fmt, wanted in (('pdf', args.pdf), ('pptx', args.pptx)) if wanted]
+        output_files = {args.input_file: args.output} if args.input_file and args.output else None
+        cache = BuildCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        watch_and_convert(watch_files, args.theme, formats, args.node_path, cache=cache,
+                          output_files=output_files, persistent=not args.no_marp_server,
+                          themes=theme_registry.from_arguments(args))
+        return
+    
     # 如果指定了--gui參數或沒有提供輸入文件，則啟動GUI
     if args.gui or not args.input_file:
         root = create_gui()
         root.mainloop()
     else:
         # 命令行模式
-        md_file = txt_to_marp(args.input_file, args.output, args.theme)
-        print(f"已生成Marp格式文件: {md_file}")
-        
-        # 轉換為PDF
-        if args.pdf:
-            pdf_file = convert_to_pdf(md_file, node_path=args.node_path)
-            print(f"已生成PDF文件: {pdf_file}")
-        
-        # 轉換為PPTX
-        if args.pptx:
-            pptx_file = convert_to_pptx(md_file, node_path=args.node_path)
-            print(f"已生成PPTX文件: {pptx_file}")
+        profiler = profiling.from_arguments(args)
+        if profiler is None:
+            _convert_cli(args)
+        else:
+            with profiler:
+                _convert_cli(args)
+            profiling.report(profiler, args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
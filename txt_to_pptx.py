@@ -1,97 +1,763 @@
 import os
 import re
+import json
+import time
+import struct
+import zlib
+import hashlib
+import zipfile
 import argparse
-from pathlib import Path
+from xml.etree import ElementTree
 from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
+from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.oxml import parse_xml
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.serialized import _ContentTypesItem
+from pptx.parts.slide import SlidePart
+from pptx.parts.image import ImagePart
 
-def txt_to_pptx(input_file, output_file=None):
+from slide_ir import BULLET, IMAGE, IMAGE_PREFIX, ORDERED, iter_slides, read_slides
+from text_input import open_text, output_base
+from image_assets import PPTX_FORMATS, ImageResolver
+import profiling
+
+# 增量模式下記錄每張幻燈片哈希的附屬文件後綴
+SLIDE_HASH_SUFFIX = ".slides.json"
+
+# 幻燈片渲染方式改變時遞增，使舊的哈希記錄失效
+RENDER_VERSION = 3
+
+_NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+_NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+# 正文字號（百分之一磅），通過佈局的列表樣式繼承，而不是逐個文字塊設置
+BODY_FONT_SIZE = 1800
+
+# 串流寫入時在清單中標記幻燈片條目插入位置的佔位符
+_SLIDES_SLOT = "{{SLIDES}}"
+
+# 原型中用於標記填充位置的文本
+_TITLE_SLOT = "{{TITLE}}"
+_BODY_SLOT = "{{BODY}}"
+
+# 圖片之間以及圖片與正文之間的間距（EMU）
+IMAGE_GAP = 152400
+
+# XML中不允許的控制字符，與python-pptx一樣轉義為 _xHHHH_
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0B-\x1F]')
+
+def _escape_text(text):
+    """轉義XML特殊字符和控制字符"""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if _CONTROL_CHARS.search(text):
+        text = _CONTROL_CHARS.sub(lambda m: "_x%04X_" % ord(m.group()), text)
+    return text
+
+def _runs_xml(text):
+    """將文本轉換為 a:r 元素，垂直制表符轉換為換行 a:br"""
+    parts = text.split("\v")
+    return "<a:br/>".join(f"<a:r><a:t>{_escape_text(part)}</a:t></a:r>" if part else "" for part in parts)
+
+def _escape_attr(text):
+    return _escape_text(text).replace('"', "&quot;")
+
+def _picture_xml(shape_id, rId, descr, x, y, cx, cy):
+    """返回一個圖片形狀 p:pic 的XML"""
+    return (f'<p:pic><p:nvPicPr><p:cNvPr id="{shape_id}" name="Picture {shape_id - 1}" descr="{_escape_attr(descr)}"/>'
+            f'<p:cNvPicPr><a:picLocks noChangeAspect="1"/></p:cNvPicPr><p:nvPr/></p:nvPicPr>'
+            f'<p:blipFill><a:blip r:embed="{rId}"/><a:stretch><a:fillRect/></a:stretch></p:blipFill>'
+            f'<p:spPr><a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr></p:pic>')
+
+def _fit(size, box_width, box_height):
+    """按比例將 (寬, 高) 像素縮放到框內，返回 (寬, 高) EMU"""
+    if not size or not size[0] or not size[1]:
+        return box_width, box_height
+    scale = min(box_width / size[0], box_height / size[1])
+    return int(size[0] * scale), int(size[1] * scale)
+
+def media_name(asset):
+    """圖片在 ppt/media 中的文件名，由內容哈希決定，不同進程生成的幻燈片也能引用同一個文件"""
+    return f"image-{asset.digest[:16]}.{asset.ext}"
+
+def deflate_member(data):
     """
-    將TXT文件直接轉換為PPTX格式
-    
+    以ZIP成員使用的原始deflate格式壓縮數據，可以在其他進程中提前完成
+
     Args:
-        input_file: 輸入的TXT文件路徑
-        output_file: 輸出的PPTX文件路徑，如果為None則自動生成
+        data: 字符串（按UTF-8編碼）或字節
+
+    Returns:
+        (壓縮後的字節, CRC32, 原始大小)，見 StreamingPptxWriter.add_deflated
     """
-    if output_file is None:
-        output_file = os.path.splitext(input_file)[0] + ".pptx"
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(), zlib.crc32(data), len(data)
+
+def _level1_font_size(element):
+    """讀取元素下第一級段落的默認字號"""
+    if element is None:
+        return None
+    def_rpr = element.find(f'{{{_NS_A}}}lvl1pPr/{{{_NS_A}}}defRPr')
+    return def_rpr.get('sz') if def_rpr is not None else None
+
+class SlideEmitter:
+    """
+    以原型克隆方式快速生成幻燈片
     
-    # 讀取TXT文件
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+    第一次使用時通過python-pptx創建一張標準的「標題和內容」幻燈片作為原型，
+    序列化後切分成模板。之後每張幻燈片只需拼接轉義後的文本並解析一次XML，
+    直接創建幻燈片部件，不經過python-pptx的形狀和段落包裝對象。
+    正文字號寫入佈局佔位符的列表樣式，由所有幻燈片繼承。
     
-    # 分割內容為幻燈片
-    # 假設每個幻燈片由至少兩個連續的換行符分隔
-    slides = re.split(r'\n{2,}', content)
+    圖片段落通過 images（image_assets.ImageResolver）解析為緩存中的圖片，
+    在內容區域中按比例排成一行；有正文時正文佔左半邊、圖片佔右半邊。
+    內容相同的圖片在整個演示文稿中只保存一份
+    """
     
-    # 創建演示文稿
-    prs = Presentation()
+    def __init__(self, prs, images=None):
+        self.prs = prs
+        self.layout = prs.slide_layouts[1]  # 使用標題和內容佈局
+        self.images = images
+        self._image_parts = {}  # 圖片內容哈希 -> ImagePart
+        self._template = None
+        self._rels = None
+        self._empty_paragraph = "<a:p/>"
+        self._count = len(prs.slides)
+        self._sldIdLst = prs.slides._sldIdLst
+        self._next_id = self._sldIdLst._next_id
     
-    for slide in slides:
-        slide = slide.strip()
-        if not slide:
-            continue
-            
-        # 處理幻燈片內容
-        lines = slide.split('\n')
+    def _body_placeholder(self, shapes):
+        for shape in shapes:
+            if shape.is_placeholder and shape.placeholder_format.idx == 1:
+                return shape
+        raise ValueError("佈局中沒有內容佔位符")
+    
+    def _build_template(self):
+        layout_body = self._body_placeholder(self.layout.placeholders)
         
-        # 假設第一行是標題
-        if lines and lines[0]:
-            title = lines[0]
-            content_lines = lines[1:]
-            
-            # 創建幻燈片
-            slide_layout = prs.slide_layouts[1]  # 使用標題和內容佈局
-            slide = prs.slides.add_slide(slide_layout)
-            
-            # 設置標題
-            title_shape = slide.shapes.title
-            title_shape.text = title
-            
-            # 設置內容
-            content = "\n".join(content_lines)
-            content_shape = slide.placeholders[1]
-            
-            # 處理列表項
-            text_frame = content_shape.text_frame
-            text_frame.text = ""  # 清空預設文本
+        # 清空預設文本留下的空段落原本繼承母版字號，顯式保留它，使版面保持不變
+        inherited = (_level1_font_size(layout_body._element.txBody.find(f'{{{_NS_A}}}lstStyle'))
+                     or _level1_font_size(self.layout.slide_master._element.find(
+                         f'.//{{{_NS_P}}}bodyStyle')))
+        if inherited:
+            self._empty_paragraph = f'<a:p><a:endParaRPr sz="{inherited}"/></a:p>'
+        
+        # 正文字號由佈局的列表樣式提供
+        tx_body = layout_body._element.txBody
+        lst_style = tx_body.find(f'{{{_NS_A}}}lstStyle')
+        if lst_style is None:
+            lst_style = tx_body.makeelement(f'{{{_NS_A}}}lstStyle', {})
+            tx_body.insert(1, lst_style)
+        lvl1 = lst_style.find(f'{{{_NS_A}}}lvl1pPr')
+        if lvl1 is None:
+            lvl1 = lst_style.makeelement(f'{{{_NS_A}}}lvl1pPr', {})
+            lst_style.insert(0, lvl1)
+        def_rpr = lvl1.find(f'{{{_NS_A}}}defRPr')
+        if def_rpr is None:
+            def_rpr = lvl1.makeelement(f'{{{_NS_A}}}defRPr', {})
+            lvl1.append(def_rpr)
+        def_rpr.set('sz', str(BODY_FONT_SIZE))
+        
+        # 在臨時演示文稿中生成原型，避免在輸出中留下多餘的幻燈片
+        scratch = Presentation()
+        slide = scratch.slides.add_slide(scratch.slide_layouts[1])
+        slide.shapes.title.text_frame.text = _TITLE_SLOT
+        self._body_placeholder(slide.placeholders).text_frame.text = _BODY_SLOT
+        xml = slide.part.blob.decode('utf-8')
+        
+        head, rest = xml.split(f"<a:p><a:r><a:t>{_TITLE_SLOT}</a:t></a:r></a:p>")
+        mid, tail = rest.split(f"<a:p><a:r><a:t>{_BODY_SLOT}</a:t></a:r></a:p>")
+        self._template = (head, mid, tail)
+        
+        # 圖片排在內容佔位符的區域中
+        self._body_box = (layout_body.left, layout_body.top, layout_body.width, layout_body.height)
+        # 同時有正文和圖片時，正文佔位符縮小到左半邊
+        left, top, width, height = self._body_box
+        half = (width - IMAGE_GAP) // 2
+        self._mid_with_images = mid.replace(
+            "<p:spPr/>", f'<p:spPr><a:xfrm><a:off x="{left}" y="{top}"/>'
+                         f'<a:ext cx="{half}" cy="{height}"/></a:xfrm></p:spPr>', 1)
+    
+    def slide_images(self, item):
+        """
+        返回幻燈片中可以嵌入的圖片：[(說明, 路徑, Asset)]，無法解析的圖片以文本顯示
+        """
+        if self.images is None or IMAGE_PREFIX not in item.prefixes:
+            return []
+        result = []
+        for alt, path in item.images:
+            asset = self.images.resolve(path)
+            if asset is not None and asset.content_type:
+                result.append((alt, path, asset))
+        return result
+    
+    def _pictures_xml(self, pictures, has_text):
+        """pictures 為 [(說明, Asset, rId)]"""
+        left, top, width, height = self._body_box
+        if has_text:
+            half = (width - IMAGE_GAP) // 2
+            left, width = left + half + IMAGE_GAP, width - half - IMAGE_GAP
+        count = len(pictures)
+        cell = (width - IMAGE_GAP * (count - 1)) // count
+        parts = []
+        for i, (descr, asset, rId) in enumerate(pictures):
+            cx, cy = _fit(asset.size, cell, height)
+            x = left + i * (cell + IMAGE_GAP) + (cell - cx) // 2
+            y = top + (height - cy) // 2
+            parts.append(_picture_xml(4 + i, rId, descr or os.path.basename(asset.path), x, y, cx, cy))
+        return "".join(parts)
+    
+    def _body_xml(self, item, embedded=()):
+        parts = [self._empty_paragraph]
+        for paragraph in item.paragraphs:
+            text = paragraph.text.strip()
+            if not text:
+                continue
             
-            for line in content_lines:
-                line = line.strip()
-                if not line:
+            # 檢測是否為列表項
+            kind = paragraph.kind
+            if kind == IMAGE:
+                alt, path = paragraph.image
+                if path in embedded:
                     continue
-                
-                p = text_frame.add_paragraph()
-                
-                # 檢測是否為列表項
-                if re.match(r'^\d+\.\s', line):  # 有序列表
-                    p.level = 0
-                    p.text = line
-                elif re.match(r'^[-*]\s', line):  # 無序列表
-                    p.level = 0
-                    p.text = line.replace('-', '•').replace('*', '•')
-                else:
-                    p.text = line
-                
-                # 設置字體
-                for run in p.runs:
-                    run.font.size = Pt(18)
+                # 無法嵌入的圖片顯示為說明文字或路徑
+                parts.append(f"<a:p>{_runs_xml(alt or path)}</a:p>")
+            elif kind == ORDERED:  # 有序列表
+                parts.append(f"<a:p><a:pPr/>{_runs_xml(paragraph.marker + ' ' + text)}</a:p>")
+            elif kind == BULLET:  # 無序列表
+                parts.append(f"<a:p><a:pPr/>{_runs_xml('• ' + text)}</a:p>")
+            else:
+                parts.append(f"<a:p>{_runs_xml(text)}</a:p>")
+        return "".join(parts)
+    
+    def slide_parts(self, item):
+        """
+        返回一張幻燈片的完整XML和其中嵌入的圖片
+        
+        Returns:
+            (XML字符串, Asset 列表)；第 i 張圖片的關係ID為 rId{i + 2}，rId1 是佈局
+        """
+        if self._template is None:
+            self._build_template()
+        head, mid, tail = self._template
+        title = f"{head}<a:p>{_runs_xml(item.title)}</a:p>"
+        images = self.slide_images(item)
+        if not images:
+            return f"{title}{mid}{self._body_xml(item)}{tail}", []
+        
+        # 同一張圖片在幻燈片中出現多次時共用一個關係
+        assets = {}
+        for _, _, asset in images:
+            assets.setdefault(asset.digest, asset)
+        rIds = {digest: f"rId{i + 2}" for i, digest in enumerate(assets)}
+        body = self._body_xml(item, {path for _, path, _ in images})
+        has_text = body != self._empty_paragraph
+        pictures = self._pictures_xml([(alt, asset, rIds[asset.digest]) for alt, _, asset in images],
+                                      has_text)
+        if has_text:
+            mid = self._mid_with_images
+        tail = tail.replace("</p:spTree>", pictures + "</p:spTree>", 1)
+        return f"{title}{mid}{body}{tail}", list(assets.values())
+    
+    def slide_xml(self, item):
+        """返回一張幻燈片的完整XML"""
+        return self.slide_parts(item)[0]
+    
+    def rels_xml(self, assets=()):
+        """
+        返回幻燈片關係部件的XML，用於不經過python-pptx直接寫入的幻燈片
+        
+        Args:
+            assets: slide_parts() 返回的圖片，圖片以 media_name() 命名
+        """
+        if self._rels is None:
+            target = self.layout.part.partname.relative_ref("/ppt/slides")
+            self._rels = serialize_part_xml(parse_xml(
+                f'<Relationships xmlns="{_NS_PKG_REL}"><Relationship Id="rId1" '
+                f'Type="{RT.SLIDE_LAYOUT}" Target="{target}"/></Relationships>')).decode('utf-8')
+        if not assets:
+            return self._rels
+        # 圖片關係接在佈局關係之後
+        rels = [self._rels.rsplit('</Relationships>', 1)[0]]
+        for i, asset in enumerate(assets):
+            rels.append(f'<Relationship Id="rId{i + 2}" Type="{RT.IMAGE}" '
+                        f'Target="../media/{media_name(asset)}"/>')
+        rels.append('</Relationships>')
+        return "".join(rels)
+    
+    def _image_part(self, asset):
+        """返回圖片對應的部件，內容相同的圖片共用一個部件"""
+        part = self._image_parts.get(asset.digest)
+        if part is None:
+            partname = PackURI(f"/ppt/media/image{len(self._image_parts) + 1}.{asset.ext}")
+            part = ImagePart(partname, asset.content_type, self.prs.part.package, asset.read(),
+                             os.path.basename(asset.path))
+            self._image_parts[asset.digest] = part
+        return part
+    
+    def add(self, item):
+        """
+        將一張幻燈片添加到演示文稿末尾
+        
+        Args:
+            item: slide_ir.Slide
+        
+        Returns:
+            新建的幻燈片部件
+        """
+        xml, assets = self.slide_parts(item)
+        element = parse_xml(xml.encode('utf-8'))
+        self._count += 1
+        partname = PackURI(f"/ppt/slides/slide{self._count}.xml")
+        slide_part = SlidePart(partname, CT.PML_SLIDE, self.prs.part.package, element)
+        slide_part.relate_to(self.layout.part, RT.SLIDE_LAYOUT)
+        for asset in assets:
+            slide_part.rels._add_relationship(RT.IMAGE, self._image_part(asset))
+        # 新部件不可能已有關係，直接添加，避免 relate_to 和 add_sldId 每次掃描全部幻燈片
+        rId = self.prs.part.rels._add_relationship(RT.SLIDE, slide_part)
+        self._sldIdLst._add_sldId(id=self._next_id, rId=rId)
+        self._next_id += 1
+        return slide_part
+
+def build_presentation(slides, images=None):
+    """
+    將幻燈片的中間表示轉換為python-pptx演示文稿對象
+    
+    Args:
+        slides: slide_ir.Slide 的可迭代對象
+        images: image_assets.ImageResolver，指定時嵌入圖片，否則圖片以文本顯示
+    """
+    # 創建演示文稿
+    prs = Presentation()
+    emitter = SlideEmitter(prs, images)
+    for item in slides:
+        emitter.add(item)
+    return prs
+
+def slides_to_pptx(slides, output_file, images=None):
+    """
+    將幻燈片的中間表示轉換為PPTX文件
+    
+    Args:
+        slides: slide_ir.Slide 的可迭代對象
+        output_file: 輸出的PPTX文件路徑
+        images: image_assets.ImageResolver，見 build_presentation
+    """
+    if images is not None and isinstance(slides, list):
+        with profiling.stage('images'):
+            images.prepare(slides)
+    with profiling.stage('build'):
+        prs = build_presentation(slides, images)
     
     # 保存PPTX文件
-    prs.save(output_file)
+    with profiling.stage('save'):
+        prs.save(output_file)
     return output_file
 
+class PptxTemplate:
+    """
+    串流寫入PPTX時與幻燈片無關的部分
+    
+    包括已經壓縮好的母版、佈局、主題等固定部件，以及三個清單部件中
+    幻燈片條目前後的文本。創建一次後可以被多個 StreamingPptxWriter 重複使用，
+    省去每次打開python-pptx默認模板、序列化和壓縮固定部件的時間。
+    創建之後不再修改，可以在多個線程中同時使用
+    """
+    
+    def __init__(self, images=None):
+        """
+        Args:
+            images: image_assets.ImageResolver，見 build_presentation
+        """
+        prs = Presentation()
+        self.emitter = SlideEmitter(prs, images)
+        self.emitter._build_template()  # 同時修改佈局的列表樣式，必須在序列化佈局之前
+        presentation_part = prs.part
+        self.slide_rels = self.emitter.rels_xml().encode('utf-8')
+        
+        # 幻燈片的關係ID接在已有關係之後
+        self.rId_base = max(int(rId[3:]) for rId in prs.part.rels if rId[3:].isdigit())
+        
+        package = prs.part.package
+        parts = list(package.iter_parts())
+        self.content_types = serialize_part_xml(_ContentTypesItem.xml_for(parts)).decode('utf-8')
+        self.members = [('_rels/.rels', deflate_member(package._rels.xml))]
+        for part in parts:
+            if part is presentation_part:
+                continue
+            self.members.append((part.partname.membername, deflate_member(part.blob)))
+            if len(part.rels):
+                self.members.append((part.partname.rels_uri.membername, deflate_member(part.rels.xml)))
+        
+        # presentation.xml：在幻燈片列表中放一個佔位條目，序列化後在該處寫入所有條目
+        self.first_id = self.emitter._next_id
+        self.emitter._sldIdLst._add_sldId(id=self.first_id, rId=_SLIDES_SLOT)
+        head, tail = presentation_part.blob.decode('utf-8').split(
+            f'<p:sldId id="{self.first_id}" r:id="{_SLIDES_SLOT}"/>')
+        self.presentation = (presentation_part.partname.membername, head, tail)
+        head, tail = presentation_part.rels.xml.decode('utf-8').rsplit('</Relationships>', 1)
+        self.presentation_rels = (presentation_part.partname.rels_uri.membername, head,
+                                  '</Relationships>' + tail)
+
+def _write_raw_member(zf, name, data, crc, size, compress_type=zipfile.ZIP_DEFLATED, date_time=None):
+    """
+    將已經壓縮好的數據作為一個成員寫入正在寫入的ZIP文件，不重新壓縮
+    
+    zipfile沒有寫入預壓縮數據的接口，按 ZipFile.writestr 的方式直接寫入本地文件頭和數據，
+    中央目錄仍由 ZipFile.close() 生成
+    
+    Args:
+        zf: 以 'w' 模式打開的 zipfile.ZipFile
+        name: 成員名稱
+        data: 壓縮後的字節
+        crc: 原始數據的CRC32
+        size: 原始數據的大小
+        compress_type: data 使用的壓縮方式
+        date_time: 成員的修改時間，如果為None則使用當前時間
+    """
+    info = zipfile.ZipInfo(name, date_time or time.localtime(time.time())[:6])
+    info.compress_type = compress_type
+    info.external_attr = 0o600 << 16
+    info.CRC, info.compress_size, info.file_size = crc, len(data), size
+    info.header_offset = zf.fp.tell()
+    zf.fp.write(info.FileHeader())
+    zf.fp.write(data)
+    zf.filelist.append(info)
+    zf.NameToInfo[name] = info
+    zf.start_dir = zf.fp.tell()
+    zf._didModify = True
+
+def _read_raw_member(zf, info):
+    """返回ZIP成員壓縮後的原始字節，不解壓"""
+    zf.fp.seek(info.header_offset)
+    header = zf.fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"無效的本地文件頭：{info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    zf.fp.seek(name_length + extra_length, os.SEEK_CUR)
+    return zf.fp.read(info.compress_size)
+
+class StreamingPptxWriter:
+    """
+    以串流方式直接寫入PPTX包
+    
+    母版、佈局、主題等固定部件在創建時立即寫入ZIP文件，之後每添加一張幻燈片
+    就寫入它的XML和關係部件，不在內存中保留幻燈片對象。
+    presentation.xml、它的關係部件和 [Content_Types].xml 需要列出所有幻燈片，
+    在 close() 時按序號重新生成條目並逐段寫入。
+    每張幻燈片只在內存中留下ZIP中央目錄的條目記錄（約1KB），不保留任何XML。
+    圖片在第一次被引用時寫入 ppt/media，內容相同的圖片只寫入一次。
+    add_deflated() 寫入在其他進程中生成並壓縮好的幻燈片（見 shard_convert）
+    
+    用法:
+        with StreamingPptxWriter("out.pptx") as writer:
+            for item in slides:
+                writer.add(item)
+    """
+    
+    def __init__(self, output_file, images=None, template=None):
+        """
+        Args:
+            output_file: 輸出的PPTX文件路徑，或以二進制模式打開的文件對象（例如 io.BytesIO，
+                由調用者負責關閉）
+            images: image_assets.ImageResolver，見 build_presentation
+            template: 重複使用的 PptxTemplate，指定時忽略 images
+        """
+        self.output_file = output_file
+        self.count = 0
+        self._media = set()  # 已寫入的圖片文件名
+        
+        if template is None:
+            template = PptxTemplate(images)
+        self.template = template
+        self._emitter = template.emitter
+        
+        self._owns_file = isinstance(output_file, (str, os.PathLike))
+        self._file = open(output_file, 'wb') if self._owns_file else output_file
+        self._zf = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_DEFLATED)
+        for name, member in template.members:
+            self._write_deflated(name, member)
+        self._file.flush()
+    
+    def add(self, item):
+        """
+        寫入一張幻燈片
+        
+        Args:
+            item: slide_ir.Slide
+        """
+        self.count += 1
+        xml, assets = self._emitter.slide_parts(item)
+        self._zf.writestr(f"ppt/slides/slide{self.count}.xml", xml)
+        if not assets:
+            self._zf.writestr(f"ppt/slides/_rels/slide{self.count}.xml.rels", self.template.slide_rels)
+            return
+        for asset in assets:
+            self.write_media(asset)
+        self._zf.writestr(f"ppt/slides/_rels/slide{self.count}.xml.rels", self._emitter.rels_xml(assets))
+    
+    def add_deflated(self, slide, rels):
+        """
+        寫入一張已經渲染並壓縮好的幻燈片，不在本進程中重新壓縮
+        
+        Args:
+            slide: 幻燈片XML經 deflate_member() 壓縮的結果
+            rels: 關係部件XML（SlideEmitter.rels_xml()）經 deflate_member() 壓縮的結果，
+                引用的圖片需要另外通過 write_media() 寫入
+        """
+        self.count += 1
+        self._write_deflated(f"ppt/slides/slide{self.count}.xml", slide)
+        self._write_deflated(f"ppt/slides/_rels/slide{self.count}.xml.rels", rels)
+    
+    def _write_deflated(self, name, member):
+        data, crc, size = member
+        _write_raw_member(self._zf, name, data, crc, size)
+    
+    def write_media(self, asset):
+        """寫入一張圖片，同名（同內容）的圖片只寫一次"""
+        name = media_name(asset)
+        if name not in self._media:
+            # 圖片本身已經壓縮，不再用deflate壓縮
+            self._zf.write(asset.path, f"ppt/media/{name}", zipfile.ZIP_STORED)
+            self._media.add(name)
+    
+    def _write_member(self, name, head, entries, tail):
+        with self._zf.open(name, 'w') as f:
+            f.write(head.encode('utf-8'))
+            for entry in entries:
+                f.write(entry.encode('utf-8'))
+            f.write(tail.encode('utf-8'))
+    
+    def close(self):
+        """寫入清單部件並關閉文件"""
+        if self._zf is None:
+            return
+        template = self.template
+        count, rId_base, first_id = self.count, template.rId_base, template.first_id
+        
+        self._write_member(*template.presentation[:2],
+                           (f'<p:sldId id="{first_id + i}" r:id="rId{rId_base + 1 + i}"/>'
+                            for i in range(count)), template.presentation[2])
+        self._write_member(*template.presentation_rels[:2],
+                           (f'<Relationship Id="rId{rId_base + i}" Type="{RT.SLIDE}" '
+                            f'Target="slides/slide{i}.xml"/>' for i in range(1, count + 1)),
+                           template.presentation_rels[2])
+        
+        # [Content_Types].xml：圖片按擴展名登記，已有登記的擴展名不能重複
+        head, tail = template.content_types.rsplit('</Types>', 1)
+        extensions = {name.rsplit('.', 1)[1] for name in self._media}
+        defaults = "".join(f'<Default Extension="{ext}" ContentType="{PPTX_FORMATS[ext]}"/>'
+                           for ext in sorted(extensions)
+                           if f'<Default Extension="{ext}"' not in template.content_types)
+        self._write_member('[Content_Types].xml', head + defaults,
+                           (f'<Override PartName="/ppt/slides/slide{i}.xml" ContentType="{CT.PML_SLIDE}"/>'
+                            for i in range(1, count + 1)),
+                           '</Types>' + tail)
+        
+        self._zf.close()
+        if self._owns_file:
+            self._file.close()
+        self._zf = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # 出錯時不留下不完整的PPTX文件
+        self._zf.close()
+        self._zf = None
+        if self._owns_file:
+            self._file.close()
+            os.remove(self.output_file)
+
+def slides_to_pptx_stream(slides, output_file, images=None):
+    """
+    以串流方式將幻燈片寫入PPTX文件，每張幻燈片生成後立即寫入磁盤
+    
+    Args:
+        slides: slide_ir.Slide 的可迭代對象，可以是生成器
+        output_file: 輸出的PPTX文件路徑
+        images: image_assets.ImageResolver，見 build_presentation
+    
+    Returns:
+        (輸出文件路徑, 幻燈片數量)
+    """
+    with profiling.stage('convert'), StreamingPptxWriter(output_file, images) as writer:
+        for item in slides:
+            writer.add(item)
+    return output_file, writer.count
+
+def slide_hash(item):
+    """計算一張幻燈片內容的哈希"""
+    digest = hashlib.sha1()
+    digest.update(item.title.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update("".join(item.prefixes).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(item.body.encode('utf-8'))
+    return digest.hexdigest()
+
+def _load_slide_hashes(output_file):
+    """
+    讀取上次生成時記錄的幻燈片哈希
+    
+    PPTX文件在此之後被其他程序修改過時返回None
+    """
+    try:
+        with open(output_file + SLIDE_HASH_SUFFIX, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        stat = os.stat(output_file)
+    except (OSError, ValueError):
+        return None
+    if (record.get('version') != RENDER_VERSION
+            or record.get('size') != stat.st_size
+            or record.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return record.get('slides')
+
+def _save_slide_hashes(output_file, hashes):
+    """記錄本次生成的幻燈片哈希"""
+    stat = os.stat(output_file)
+    record = {
+        'version': RENDER_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'slides': hashes,
+    }
+    with open(output_file + SLIDE_HASH_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+
+def _slide_partnames(zf):
+    """按放映順序返回PPTX包中幻燈片部件的名稱"""
+    rels = ElementTree.fromstring(zf.read('ppt/_rels/presentation.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{{{_NS_PKG_REL}}}Relationship')}
+    presentation = ElementTree.fromstring(zf.read('ppt/presentation.xml'))
+    return ['ppt/' + targets[sld_id.get(f'{{{_NS_REL}}}id')]
+            for sld_id in presentation.iter(f'{{{_NS_P}}}sldId')]
+
+def _splice_slides(output_file, replacements):
+    """
+    將重新生成的幻燈片部件替換進已有的PPTX包，其餘部件原樣複製
+    
+    只有替換的幻燈片需要壓縮，其餘成員直接複製壓縮後的字節（見 _write_raw_member），
+    幻燈片數量不變，清單部件也不需要重新生成
+    
+    Args:
+        output_file: 已有的PPTX文件路徑
+        replacements: 幻燈片序號到新幻燈片XML的字典
+    """
+    tmp_file = output_file + ".tmp"
+    with zipfile.ZipFile(output_file) as src:
+        partnames = _slide_partnames(src)
+        replaced = {partnames[index]: blob for index, blob in replacements.items()}
+        with zipfile.ZipFile(tmp_file, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                blob = replaced.get(info.filename)
+                if blob is not None:
+                    _write_raw_member(dst, info.filename, *deflate_member(blob))
+                else:
+                    _write_raw_member(dst, info.filename, _read_raw_member(src, info), info.CRC,
+                                      info.file_size, info.compress_type, info.date_time)
+    os.replace(tmp_file, output_file)
+
+def slides_to_pptx_incremental(slides, output_file, images=None):
+    """
+    增量生成PPTX：只重新生成內容改變的幻燈片
+    
+    每張幻燈片的內容哈希記錄在 output_file + '.slides.json' 中。
+    幻燈片數量不變時，只渲染改變的幻燈片並替換進已有的PPTX包；
+    沒有記錄、文件被外部修改、幻燈片數量改變或含有嵌入圖片時完整重建
+    （圖片部件和關係在整個包中共享，無法只替換單張幻燈片）
+    
+    Args:
+        slides: slide_ir.Slide 的列表
+        output_file: 輸出的PPTX文件路徑
+        images: image_assets.ImageResolver，見 build_presentation
+    
+    Returns:
+        (輸出文件路徑, 重新生成的幻燈片數量)
+    """
+    slides = list(slides)
+    with profiling.stage('hash'):
+        hashes = [slide_hash(item) for item in slides]
+    previous = _load_slide_hashes(output_file)
+    has_images = images is not None and any(IMAGE_PREFIX in item.prefixes for item in slides)
+    
+    if previous is None or len(previous) != len(hashes) or has_images:
+        slides_to_pptx(slides, output_file, images)
+        _save_slide_hashes(output_file, hashes)
+        return output_file, len(slides)
+    
+    changed = [i for i, (old, new) in enumerate(zip(previous, hashes)) if old != new]
+    if changed:
+        # 只為改變的幻燈片生成XML，它們與原幻燈片使用相同的佈局
+        with profiling.stage('build'):
+            emitter = SlideEmitter(Presentation())
+            replacements = {}
+            for index in changed:
+                xml = emitter.slide_xml(slides[index])
+                replacements[index] = serialize_part_xml(parse_xml(xml.encode('utf-8')))
+        with profiling.stage('save'):
+            _splice_slides(output_file, replacements)
+        _save_slide_hashes(output_file, hashes)
+    
+    return output_file, len(changed)
+
+def txt_to_pptx(input_file, output_file=None, incremental=False, stream=False):
+    """
+    將TXT文件直接轉換為PPTX格式
+    
+    Args:
+        input_file: 輸入的TXT文件路徑
+        output_file: 輸出的PPTX文件路徑，如果為None則自動生成
+        incremental: 是否只重新生成內容改變的幻燈片
+        stream: 是否以串流方式邊解析邊寫入，適合幻燈片數量極多的文件
+    """
+    if output_file is None:
+        output_file = output_base(input_file) + ".pptx"
+    
+    images = ImageResolver.for_input(input_file)
+    if stream:
+        with open_text(input_file) as f:
+            return slides_to_pptx_stream(iter_slides(f), output_file, images)[0]
+    
+    # 讀取並解析TXT文件
+    # 假設每個幻燈片由至少兩個連續的換行符分隔
+    slides = read_slides(input_file)
+    
+    if incremental:
+        return slides_to_pptx_incremental(slides, output_file, images)[0]
+    return slides_to_pptx(slides, output_file, images)
+
 def main():
     parser = argparse.ArgumentParser(description='將TXT文件轉換為PPTX格式的簡報')
     parser.add_argument('input_file', help='輸入的TXT文件路徑')
     parser.add_argument('-o', '--output', help='輸出的PPTX文件路徑')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', action='store_true', help='只重新生成內容改變的幻燈片')
+    mode.add_argument('--stream', action='store_true', help='以串流方式邊解析邊寫入，適合幻燈片數量極多的文件')
+    profiling.add_arguments(parser)
     
     args = parser.parse_args()
     
     # 轉換為PPTX格式
-    pptx_file = txt_to_pptx(args.input_file, args.output)
+    profiler = profiling.from_arguments(args)
+    if profiler is None:
+        pptx_file = txt_to_pptx(args.input_file, args.output, args.incremental, args.stream)
+    else:
+        with profiler:
+            pptx_file = txt_to_pptx(args.input_file, args.output, args.incremental, args.stream)
     print(f"已生成PPTX文件: {pptx_file}")
+    if profiler is not None:
+        profiling.report(profiler, args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+from build_cache import BuildCache, convert_cached
+from marp_export import export_batch
+from text_input import output_base
+
+# 默認的防抖時間：最後一次保存後等待這麼久再重建
+DEFAULT_DEBOUNCE = 0.2
+
+# 輪詢模式下檢查文件的間隔
+DEFAULT_POLL_INTERVAL = 0.5
+
+# inotify 事件
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+class InotifyWatcher:
+    """
+    使用Linux inotify監視文件
+
+    監視的是文件所在的目錄，這樣編輯器以「寫入臨時文件再重命名」的方式保存時也能收到通知
+    """
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+
+        self._paths = {os.path.abspath(path) for path in paths}
+        self._dirs = {}
+        for directory in {os.path.dirname(path) for path in self._paths}:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"無法監視目錄: {directory}")
+            self._dirs[wd] = directory
+
+    def wait(self, timeout):
+        """等待文件改變，返回在 timeout 秒內改變的文件集合"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        data = os.read(self._fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            path = os.path.join(self._dirs.get(wd, ''), os.fsdecode(name))
+            if path in self._paths:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+class PollingWatcher:
+    """通過定期比較修改時間和大小監視文件，在沒有inotify的平台上使用"""
+
+    def __init__(self, paths, interval=DEFAULT_POLL_INTERVAL):
+        self._interval = interval
+        self._state = {os.path.abspath(path): self._stat(path) for path in paths}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def wait(self, timeout):
+        """等待文件改變，返回在 timeout 秒內改變的文件集合"""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, old in self._state.items():
+                new = self._stat(path)
+                if new != old:
+                    self._state[path] = new
+                    changed.add(path)
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self._interval, remaining))
+
+    def close(self):
+        pass
+
+def create_watcher(paths, use_inotify=True, poll_interval=DEFAULT_POLL_INTERVAL):
+    """優先使用inotify，不可用時退回輪詢"""
+    if use_inotify and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths, poll_interval)
+
+def watch_files(paths, on_change, debounce=DEFAULT_DEBOUNCE, stop_event=None,
+                use_inotify=True, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    監視文件並在改變時回調
+
+    一連串的保存會被合併：收到第一個事件後，直到 debounce 秒內沒有新事件才調用 on_change
+
+    Args:
+        paths: 需要監視的文件路徑列表
+        on_change: 回調函數，參數為改變的文件絕對路徑集合
+        debounce: 防抖時間（秒）
+        stop_event: threading.Event，設置後停止監視
+        use_inotify: 是否嘗試使用inotify
+        poll_interval: 輪詢模式下檢查文件的間隔
+    """
+    watcher = create_watcher(paths, use_inotify, poll_interval)
+    try:
+        while stop_event is None or not stop_event.is_set():
+            changed = watcher.wait(0.5)
+            if not changed:
+                continue
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            on_change(changed)
+    finally:
+        watcher.close()
+
+class CoalescingExporter:
+    """
+    在後台線程中執行Marp導出，並合併排隊中的請求
+
+    導出進行時提交的文件只會被記錄下來，當前導出結束後一次性導出所有待處理文件，
+    因此快速連續的保存不會排起多次多餘的Chromium運行。
+    persistent 為True時使用常駐的Marp進程，每次保存後的導出不必重新啟動Node和Chromium
+    """
+
+    def __init__(self, formats, node_path=None, use_npx=True, on_done=None, persistent=False,
+                 theme_set=()):
+        self.formats = list(formats)
+        self.node_path = node_path
+        self.use_npx = use_npx
+        self.on_done = on_done
+        self.theme_set = list(theme_set)
+        self.worker = None
+        if persistent:
+            from marp_worker import MarpWorker
+            self.worker = MarpWorker(node_path, use_npx, theme_set=self.theme_set)
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, md_file):
+        """提交一個需要導出的Markdown文件"""
+        with self._condition:
+            if md_file not in self._pending:
+                self._pending.append(md_file)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                md_files, self._pending = self._pending, []
+
+            start = time.perf_counter()
+            try:
+                outputs = export_batch(md_files, self.formats, self.node_path, self.use_npx,
+                                       worker=self.worker, theme_set=self.theme_set)
+                error = None
+            except Exception as e:
+                outputs, error = {}, e
+            if self.on_done:
+                self.on_done(md_files, outputs, error, time.perf_counter() - start)
+
+    def close(self):
+        """處理完待導出的文件後停止後台線程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self.worker is not None:
+            self.worker.close()
+
+def _print_export(md_files, outputs, error, elapsed):
+    if error is not None:
+        print(f"Marp導出失敗: {error}")
+        return
+    for fmt, files in outputs.items():
+        for output in files:
+            print(f"已生成{fmt.upper()}文件: {output}")
+    print(f"Marp導出 {len(md_files)} 個文件，耗時 {elapsed:.2f} 秒")
+
+def watch_and_convert(input_files, theme="default", formats=(), node_path=None, use_npx=True,
+                      cache=None, debounce=DEFAULT_DEBOUNCE, stop_event=None, use_inotify=True,
+                      output_files=None, persistent=True, themes=None):
+    """
+    監視模式：輸入文件改變時增量重建輸出
+
+    Markdown在監視線程中立即重新生成（使用構建緩存，只有內容改變時才寫入），
+    只有Markdown真正改變的文件才會交給後台的 CoalescingExporter 導出PDF/PPTX
+
+    Args:
+        input_files: 需要監視的TXT文件路徑列表
+        theme: 使用的主題名稱
+        formats: 需要通過Marp導出的格式
+        node_path: Node.js可執行文件路徑
+        use_npx: 是否通過npx運行Marp CLI
+        cache: BuildCache，如果為None則使用默認緩存目錄
+        debounce: 防抖時間（秒）
+        stop_event: threading.Event，設置後停止監視
+        use_inotify: 是否嘗試使用inotify
+        output_files: 輸入文件到Markdown輸出路徑的字典，未指定的自動生成
+        persistent: 是否使用常駐的Marp進程導出
+        themes: theme_registry.ThemeRegistry，指定時使用外部主題文件代替內嵌樣式
+    """
+    if cache is None:
+        cache = BuildCache()
+    output_files = {os.path.abspath(k): v for k, v in (output_files or {}).items()}
+    theme_set = themes.theme_set([theme]) if themes is not None else ()
+    exporter = (CoalescingExporter(formats, node_path, use_npx, _print_export, persistent, theme_set)
+                if formats else None)
+
+    def rebuild(paths):
+        for path in sorted(paths):
+            if not os.path.exists(path):
+                continue
+            md_file = output_files.get(path) or output_base(path) + ".md"
+            before = _mtime_ns(md_file)
+            start = time.perf_counter()
+            try:
+                convert_cached(path, md_file, theme, cache=cache, themes=themes)
+            except Exception as e:
+                print(f"轉換失敗: {path}: {e}")
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            base = os.path.splitext(md_file)[0]
+            missing = any(not os.path.exists(f"{base}.{fmt}") for fmt in formats)
+            if _mtime_ns(md_file) == before and not missing:
+                print(f"內容未改變: {md_file}")
+                continue
+            print(f"已生成Marp格式文件: {md_file}（{elapsed:.1f} 毫秒）")
+            if exporter:
+                exporter.submit(md_file)
+
+    # 啟動時先完整構建一次
+    rebuild({os.path.abspath(path) for path in input_files})
+    print("正在監視文件變化，按 Ctrl+C 停止...")
+    try:
+        watch_files(input_files, rebuild, debounce, stop_event, use_inotify)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter:
+            exporter.close()
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None